@@ -0,0 +1,159 @@
+"""
+Compare the serializer and the fast path of the API list endpoints.
+
+Sets up a throwaway test database, fills it with statuses (with activities
+and attachments) and health logs (with records), and times unpaginated list
+requests for /api/statuses/ and /api/health/logs/ through the regular
+serializers and through the fast path. Both responses are checked to be
+identical.
+
+Usage, from the repository root:
+
+    python benchmarks/api_list.py [--rows 50 500 5000] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def populate(user, rows):
+    from moodyduck.health.models import HealthLog, HealthParameter, HealthRecord
+    from moodyduck.mood.models import Activity, Mood, Status, StatusActivity
+    from moodyduck.mood.models import StatusMedia
+
+    from django.utils import timezone
+
+    moods = [
+        Mood.objects.create(user=user, name=f"Mood {i}", value=i) for i in range(5)
+    ]
+    activities = [
+        Activity.objects.create(user=user, name=f"Activity {i}") for i in range(8)
+    ]
+    parameters = [
+        HealthParameter.objects.create(user=user, name=f"Parameter {i}")
+        for i in range(3)
+    ]
+    now = timezone.now()
+
+    statuses = Status.objects.bulk_create(
+        Status(
+            user=user,
+            mood=moods[i % 5],
+            title=f"Status {i}",
+            text="Lorem ipsum dolor sit amet " * 8,
+            timestamp=now - timedelta(hours=i),
+        )
+        for i in range(rows)
+    )
+    StatusActivity.objects.bulk_create(
+        StatusActivity(status=status, activity=activities[(i + j) % 8])
+        for i, status in enumerate(statuses)
+        for j in range(i % 3)
+    )
+    StatusMedia.objects.bulk_create(
+        StatusMedia(status=status, file=f"status/{status.pk}.png")
+        for status in statuses[::4]
+    )
+
+    logs = HealthLog.objects.bulk_create(
+        HealthLog(user=user, notes="Check-in", recorded_at=now - timedelta(hours=i))
+        for i in range(rows)
+    )
+    HealthRecord.objects.bulk_create(
+        HealthRecord(log=log, parameter=parameter, value=i)
+        for i, log in enumerate(logs)
+        for parameter in parameters
+    )
+
+
+def measure(view, request, repeat):
+    best, content = None, None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = view(request())
+        response.render()
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+        content = response.content
+
+    return best, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moodyduck.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from moodyduck.api import fastlist
+    from moodyduck.api.views import HealthLogViewSet, StatusViewSet
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    factory = APIRequestFactory()
+
+    try:
+        print(
+            f"{'endpoint':<20} {'rows':>6} {'serializer':>12} {'fast':>10} {'speedup':>8}"
+        )
+
+        for rows in args.rows:
+            user = get_user_model().objects.create_user(username=f"benchmark-{rows}")
+            populate(user, rows)
+
+            for path, viewset in (
+                ("/api/statuses/", StatusViewSet),
+                ("/api/health/logs/", HealthLogViewSet),
+            ):
+                view = viewset.as_view({"get": "list"}, pagination_class=None)
+
+                def request():
+                    request = factory.get(
+                        path,
+                        HTTP_ACCEPT="application/json",
+                        HTTP_HOST=settings.ALLOWED_HOSTS[0],
+                    )
+                    force_authenticate(request, user=user)
+                    return request
+
+                fast, fast_content = measure(view, request, args.repeat)
+                with mock.patch.object(
+                    fastlist, "Plan", side_effect=fastlist.Unsupported
+                ):
+                    regular, content = measure(view, request, args.repeat)
+
+                if content != fast_content:
+                    sys.exit(f"{path}: responses differ at {rows} rows")
+
+                print(
+                    f"{path:<20} {rows:>6} {regular * 1e3:>9.1f} ms"
+                    f" {fast * 1e3:>7.1f} ms {regular / fast:>7.1f}x"
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure what it costs a worker to start up.
+
+Runs a fresh interpreter with ``python -X importtime`` that sets up Django and
+resolves the URL configuration - what every worker does before serving its
+first request - and reports the total import time, the slowest top-level
+imports, the peak RSS and whether the plotting stack was loaded.
+
+Usage, from the repository root:
+
+    python benchmarks/importtime.py [--top N] [--render]
+
+With --render, a mood chart is rendered as well, for comparison.
+"""
+
+import argparse
+import os
+import re
+import resource
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PLOTTING = ("holoviews", "bokeh", "pandas")
+
+STARTUP = """
+import sys
+import django
+
+django.setup()
+
+from django.template import engines
+from django.urls import get_resolver
+
+get_resolver().url_patterns
+for engine in engines.all():
+    engine.engine.get_template_libraries(engine.engine.libraries)
+"""
+
+RENDER = """
+from moodyduck.common.templatetags.images import bkjson
+from moodyduck.mood.statistics import _pies
+
+bkjson(_pies([]))
+"""
+
+REPORT = """
+print("loaded:" + ",".join(m for m in %r if m in sys.modules))
+""" % (PLOTTING,)
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def run(render=False):
+    code = STARTUP + (RENDER if render else "") + REPORT
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="moodyduck.settings")
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT), env.get("PYTHONPATH")])
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode:
+        sys.exit(result.stderr)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        # Top-level imports are indented by a single space
+        if match and len(match.group(3)) == 1:
+            imports.append((int(match.group(2)), match.group(4)))
+
+    loaded = result.stdout.rsplit("loaded:", 1)[1].strip()
+    # ru_maxrss is in kilobytes on Linux
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    return imports, loaded, rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--render", action="store_true")
+    args = parser.parse_args()
+
+    imports, loaded, rss = run(args.render)
+
+    print(f"Total import time: {sum(t for t, _ in imports) / 1e6:.3f} s")
+    print(f"Peak RSS:          {rss:.1f} MiB")
+    print(f"Plotting stack:    {loaded or 'not loaded'}")
+    print()
+    print("Slowest top-level imports (cumulative):")
+
+    for cumulative, module in sorted(imports, reverse=True)[: args.top]:
+        print(f"  {cumulative / 1e3:10.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "moodyduck.api"
+
+    def ready(self):
+        # Record changes for the delta sync API
+        from . import handler  # noqa: F401
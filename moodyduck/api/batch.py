@@ -0,0 +1,123 @@
+"""
+In-process execution of batched API requests.
+
+Every operation of a batch is dispatched straight to the API view its path
+resolves to, as the user that was authenticated for the batch request itself.
+Only views of this app can be reached this way.
+"""
+
+import io
+import json
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+# Request headers describing the batch request body or its preconditions, which
+# must not leak into the operations
+_ENVELOPE_META = ("CONTENT_TYPE", "CONTENT_LENGTH", "HTTP_IF_")
+
+
+def resolve_operation(path):
+    """Return the resolver match of an API path, or None if it is not one."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return None
+
+    # Set by as_view() of DRF and of plain Django views respectively
+    view = getattr(match.func, "cls", None) or getattr(match.func, "view_class", None)
+    if (
+        view is None
+        or not view.__module__.startswith("moodyduck.api.")
+        or not getattr(view, "batchable", True)
+    ):
+        return None
+
+    return match
+
+
+def build_request(request, method, path, body=None):
+    """Build a request for one operation, authenticated like ``request``."""
+    parts = urlsplit(path)
+    content = b"" if body is None else json.dumps(body).encode()
+
+    operation = HttpRequest()
+    operation.method = method
+    operation.path = operation.path_info = parts.path
+    operation.GET = QueryDict(parts.query)
+    operation.COOKIES = request.COOKIES
+    operation.META = {
+        key: value
+        for key, value in request.META.items()
+        if not key.startswith(_ENVELOPE_META)
+    }
+    operation.META.update(
+        REQUEST_METHOD=method,
+        PATH_INFO=parts.path,
+        QUERY_STRING=parts.query,
+        CONTENT_TYPE="application/json",
+        CONTENT_LENGTH=str(len(content)),
+    )
+    operation._stream = io.BytesIO(content)
+    operation._read_started = False
+
+    if hasattr(request, "session"):
+        operation.session = request.session
+
+    # Picked up by rest_framework.request.Request instead of running the
+    # authentication classes again
+    operation.user = operation._force_auth_user = request.user
+    operation._force_auth_token = request.auth
+
+    return operation
+
+
+def response_body(response):
+    """Return the body of a response that has no DRF ``data``."""
+    if response.streaming or not response.content:
+        return None
+    if response.get("Content-Type", "").startswith("application/json"):
+        return json.loads(response.content)
+    return response.content.decode(response.charset)
+
+
+def run_operation(request, method, path, body=None):
+    """Run one operation, returning ``(status code, response data)``."""
+    match = resolve_operation(path)
+    if match is None:
+        return 404, {"detail": "Not found."}
+
+    response = match.func(
+        build_request(request, method, path, body), *match.args, **match.kwargs
+    )
+    if hasattr(response, "data"):
+        return response.status_code, response.data
+    return response.status_code, response_body(response)
+
+
+def run_batch(request, operations, atomic=False):
+    """Run operations in order and return ``(results, committed)``.
+
+    In atomic mode the batch stops at the first failing operation, and all
+    changes made by the batch are rolled back.
+    """
+    results = []
+
+    if not atomic:
+        for operation in operations:
+            status, data = run_operation(request, **operation)
+            results.append({"status": status, "body": data})
+        return results, True
+
+    with transaction.atomic():
+        for operation in operations:
+            status, data = run_operation(request, **operation)
+            results.append({"status": status, "body": data})
+
+            if status >= 400:
+                transaction.set_rollback(True)
+                return results, False
+
+    return results, True
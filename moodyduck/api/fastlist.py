@@ -0,0 +1,235 @@
+"""
+Serializer-free rendering of read-only list responses.
+
+A ``Plan`` is derived once per request from a serializer: it lists the
+columns to load with ``values()`` and, for every field, how to turn a row into
+the value the serializer would have produced. Scalar fields reuse the
+``to_representation`` of the serializer field, so the output is the same, but
+no model instances are created and DRF's per-field machinery is skipped.
+
+Supported are concrete model fields, primary key relations, nested
+serializers for forward and reverse foreign keys and, for method fields,
+whatever the serializer declares in ``fast_fields``:
+
+- ``Nested(lookup, serializer)`` for related objects reached through
+  ``lookup``, e.g. ``"statusactivity_set__activity"``;
+- a list of column names, to call the method on a model instance holding just
+  those columns.
+
+Anything else raises ``Unsupported`` when the plan is built.
+"""
+
+import json
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with ``dumps`` unless indentation is asked for."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class Unsupported(Exception):
+    pass
+
+
+class Nested:
+    def __init__(self, lookup, serializer):
+        self.lookup = lookup
+        self.serializer = serializer
+
+
+def dumps(data) -> bytes:
+    """Encode like DRF's compact JSONRenderer, with orjson if installed."""
+    if orjson is not None:
+        content = orjson.dumps(data)
+    else:
+        content = json.dumps(
+            data, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+
+    # Escaped by DRF as well, for compatibility with JavaScript
+    return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+        b"\xe2\x80\xa9", b"\\u2029"
+    )
+
+
+def _ordering(model):
+    return model._meta.ordering or ["pk"]
+
+
+def _scalar(column, convert):
+    def render(row):
+        value = row[column]
+        return None if value is None else convert(value)
+
+    return render
+
+
+class Plan:
+    def __init__(self, serializer, model):
+        self.model = model
+        self.pk = model._meta.pk.attname
+        self.columns = [self.pk]
+        self.fields = []
+        self.loaders = []
+
+        accessors = {
+            relation.get_accessor_name(): relation
+            for relation in model._meta.related_objects
+        }
+        fast_fields = getattr(serializer, "fast_fields", {})
+
+        if hasattr(serializer, "selected_fields"):
+            fields = serializer.selected_fields()
+        else:
+            fields = {field.field_name: field for field in serializer._readable_fields}
+
+        for name, field in fields.items():
+            if name in fast_fields:
+                render = self._fast_field(field, fast_fields[name], accessors)
+            elif isinstance(field, serializers.ListSerializer):
+                render = self._reverse(field.child, field.source, accessors)
+            elif isinstance(field, serializers.BaseSerializer):
+                render = self._forward(field, field.source)
+            elif (
+                isinstance(field, serializers.PrimaryKeyRelatedField)
+                and field.pk_field is None
+            ):
+                column = self._column(field.source, relation=True)
+                render = lambda row, column=column: row[column]  # noqa: E731
+            elif isinstance(field, serializers.Field) and field.source != "*":
+                column = self._column(field.source)
+                render = _scalar(column, field.to_representation)
+            else:
+                raise Unsupported(name)
+
+            self.fields.append((name, render))
+
+    def _model_field(self, name):
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+
+    def _column(self, source, relation=False):
+        field = self._model_field(source)
+        if not field.concrete or field.many_to_many or field.is_relation != relation:
+            raise Unsupported(source)
+
+        if field.attname not in self.columns:
+            self.columns.append(field.attname)
+        return field.attname
+
+    def _fast_field(self, field, spec, accessors):
+        if isinstance(spec, Nested):
+            return self._through(spec, accessors)
+
+        columns = [self._column(name) for name in spec]
+
+        def render(row):
+            instance = self.model(**{column: row[column] for column in columns})
+            instance.pk = row[self.pk]
+            return field.to_representation(instance)
+
+        return render
+
+    def _forward(self, serializer, source):
+        """A nested serializer for a foreign key."""
+        column = self._column(source, relation=True)
+        related = self._model_field(source).related_model
+        plan = Plan(serializer, related)
+        objects = {}
+
+        def load(rows):
+            ids = {row[column] for row in rows} - {None}
+            objects.update(plan.fetch(related.objects.filter(pk__in=ids), key=plan.pk))
+
+        self.loaders.append(load)
+        return lambda row: objects.get(row[column])
+
+    def _reverse(self, serializer, source, accessors):
+        """A nested list serializer for a reverse foreign key."""
+        if source not in accessors or accessors[source].many_to_many:
+            raise Unsupported(source)
+
+        relation = accessors[source]
+        related = relation.related_model
+        parent = relation.field.attname
+        plan = Plan(serializer, related)
+        children = defaultdict(list)
+
+        def load(rows):
+            queryset = related.objects.filter(
+                **{f"{parent}__in": [row[self.pk] for row in rows]}
+            ).order_by(*_ordering(related))
+            for key, item in plan.fetch(queryset, key=parent):
+                children[key].append(item)
+
+        self.loaders.append(load)
+        return lambda row: children.get(row[self.pk], [])
+
+    def _through(self, spec, accessors):
+        """Related objects behind a reverse foreign key and a forward one."""
+        source, _, target = spec.lookup.partition("__")
+        if source not in accessors or not target:
+            raise Unsupported(spec.lookup)
+
+        relation = accessors[source]
+        through = relation.related_model
+        parent = relation.field.attname
+        try:
+            target_field = through._meta.get_field(target)
+        except FieldDoesNotExist:
+            raise Unsupported(spec.lookup)
+
+        plan = Plan(spec.serializer(), target_field.related_model)
+        children = defaultdict(list)
+
+        def load(rows):
+            # One query, joining the related objects to the intermediate rows
+            prefix = f"{target}__"
+            links = list(
+                through.objects.filter(
+                    **{f"{parent}__in": [row[self.pk] for row in rows]}
+                )
+                .order_by(*_ordering(through))
+                .values(parent, *[prefix + column for column in plan.columns])
+            )
+            items = plan.build(
+                [
+                    {column: link[prefix + column] for column in plan.columns}
+                    for link in links
+                ]
+            )
+            for link, item in zip(links, items):
+                children[link[parent]].append(item)
+
+        self.loaders.append(load)
+        return lambda row: children.get(row[self.pk], [])
+
+    def build(self, rows):
+        """Return the representations of ``values()`` rows, in order."""
+        rows = list(rows)
+        for load in self.loaders:
+            load(rows)
+
+        return [{name: render(row) for name, render in self.fields} for row in rows]
+
+    def fetch(self, queryset, key):
+        """Load a queryset and return ``(row[key], representation)`` pairs."""
+        columns = self.columns + ([key] if key not in self.columns else [])
+        rows = list(queryset.values(*columns))
+        return zip([row[key] for row in rows], self.build(rows))
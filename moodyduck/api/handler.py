@@ -0,0 +1,165 @@
+"""Signal handlers recording changes for the delta sync API and conditional GETs."""
+
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from moodyduck.cbt.models import ThoughtRecord
+from moodyduck.common.versioning import bump_version
+from moodyduck.dreams.models import Dream, DreamMedia
+from moodyduck.habits.models import Habit, HabitLog
+from moodyduck.health.models import BasicMedicalInfo, HealthRecord
+from moodyduck.mood.models import Mood, Status, StatusActivity, StatusMedia
+from moodyduck.mood.signals import entries_encrypted
+from moodyduck.profiles.models import EmergencyAccessLog, UserProfile
+
+from . import sync
+from .mixins import version_scope
+
+# Models serialized as part of their parent, and the field pointing to it
+CHILDREN = {
+    StatusActivity: "status",
+    StatusMedia: "status",
+    HealthRecord: "log",
+    DreamMedia: "dream",
+}
+
+# Models only served by the API, not synced, and their version scopes
+UNSYNCED = {
+    UserProfile: "profile",
+    BasicMedicalInfo: "medical-info",
+    EmergencyAccessLog: "emergency-access-logs",
+}
+
+
+def _deleted_with(origin, *models):
+    """Whether a cascade started at an instance or queryset of ``models``."""
+    if isinstance(origin, QuerySet):
+        return issubclass(origin.model, models)
+    return isinstance(origin, models)
+
+
+def _owner(instance, origin=None):
+    if isinstance(instance, HabitLog):
+        if isinstance(origin, Habit):
+            return origin.user_id
+        return instance.habit.user_id
+    return instance.user_id
+
+
+def object_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    sync.record_changes(_owner(instance), sync.collection_for(sender), [instance.pk])
+
+
+def object_deleted(sender, instance, origin=None, **kwargs):
+    # The change log is going away together with the user
+    if _deleted_with(origin, get_user_model()):
+        return
+
+    sync.record_changes(
+        _owner(instance, origin),
+        sync.collection_for(sender),
+        [instance.pk],
+        deleted=True,
+    )
+
+
+def child_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    parent = getattr(instance, CHILDREN[sender])
+    sync.record_changes(_owner(parent), sync.collection_for(type(parent)), [parent.pk])
+
+
+def child_deleted(sender, instance, origin=None, **kwargs):
+    parent_model = sender._meta.get_field(CHILDREN[sender]).related_model
+
+    # The parent leaves a tombstone of its own
+    if _deleted_with(origin, get_user_model(), parent_model):
+        return
+
+    child_saved(sender, instance)
+
+
+def mood_deleting(sender, instance, origin=None, **kwargs):
+    # Entries are detached from the mood with an UPDATE, without signals
+    if _deleted_with(origin, get_user_model()):
+        return
+
+    for model in (Status, Dream):
+        sync.record_changes(
+            instance.user_id,
+            sync.collection_for(model),
+            model.objects.filter(mood=instance).values_list("pk", flat=True),
+        )
+
+
+def emotions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # post_clear does not tell which records lost the emotion
+        instance._sync_cleared_records = list(
+            sender.objects.filter(emotionrecord=instance).values_list(
+                "thoughtrecord_id", flat=True
+            )
+        )
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        records = [instance]
+    else:
+        if action == "post_clear":
+            pk_set = getattr(instance, "_sync_cleared_records", ())
+        records = ThoughtRecord.objects.filter(pk__in=pk_set).only("user")
+
+    for record in records:
+        sync.record_changes(record.user_id, "cbt-records", [record.pk])
+
+
+def entries_encrypted_changed(sender, user_id, pks, **kwargs):
+    # Written with bulk_update, without post_save
+    sync.record_changes(user_id, sync.collection_for(sender), pks)
+
+
+def unsynced_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleted_with(origin, get_user_model()):
+        return
+
+    bump_version(instance.user_id, version_scope(UNSYNCED[sender]))
+
+
+for model in sync.COLLECTIONS.values():
+    post_save.connect(object_saved, sender=model, dispatch_uid=f"sync-save-{model}")
+    post_delete.connect(
+        object_deleted, sender=model, dispatch_uid=f"sync-delete-{model}"
+    )
+
+for model in CHILDREN:
+    post_save.connect(child_saved, sender=model, dispatch_uid=f"sync-save-{model}")
+    post_delete.connect(
+        child_deleted, sender=model, dispatch_uid=f"sync-delete-{model}"
+    )
+
+for model in UNSYNCED:
+    post_save.connect(
+        unsynced_changed, sender=model, dispatch_uid=f"version-save-{model}"
+    )
+    post_delete.connect(
+        unsynced_changed, sender=model, dispatch_uid=f"version-delete-{model}"
+    )
+
+pre_delete.connect(mood_deleting, sender=Mood, dispatch_uid="sync-mood-deleting")
+entries_encrypted.connect(entries_encrypted_changed, dispatch_uid="sync-encrypted")
+
+for field in ("emotions", "emotions_now"):
+    m2m_changed.connect(
+        emotions_changed,
+        sender=getattr(ThoughtRecord, field).through,
+        dispatch_uid=f"sync-{field}",
+    )
@@ -0,0 +1,227 @@
+from hashlib import sha256
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from moodyduck.common.versioning import get_versions_modified
+
+from . import fastlist
+
+
+def cursor_fields(view):
+    """Names of the fields in the view's ``cursor_ordering``."""
+    ordering = getattr(view, "cursor_ordering", ())
+    if isinstance(ordering, str):
+        ordering = (ordering,)
+    return [name.lstrip("-") for name in ordering]
+
+
+def version_scope(name):
+    """Version scope of an API collection, bumped by ``handler.py``."""
+    return f"api-{name}"
+
+
+class ConditionalGetMixin:
+    """Conditional GET support for list and retrieve.
+
+    ``version_scopes`` names the API collections the response is built from.
+    Their version tokens make up a weak ETag and their last bump the
+    Last-Modified date, so a matching If-None-Match or If-Modified-Since is
+    answered with 304 Not Modified before anything else is queried.
+    """
+
+    version_scopes = ()
+
+    def conditional(self, request, handler, *args, **kwargs):
+        versions, modified = get_versions_modified(
+            request.user, *map(version_scope, self.version_scopes)
+        )
+        key = "|".join(
+            [str(request.user.pk), request.get_full_path(), request.accepted_renderer.format]
+            + [f"{scope}={version}" for scope, version in sorted(versions.items())]
+        )
+        etag = 'W/"%s"' % sha256(key.encode()).hexdigest()[:40]
+        last_modified = int(modified.timestamp()) if modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+
+def requested_fields(request, names):
+    """Return the subset of ``names`` selected by ``?fields=`` and ``?omit=``.
+
+    Returns None if the request does not ask for a subset.
+    """
+    if request is None or request.method != "GET":
+        return None
+
+    selected = request.query_params.get("fields")
+    omitted = request.query_params.get("omit")
+    if not selected and not omitted:
+        return None
+
+    names = set(names)
+    if selected:
+        names &= set(selected.split(","))
+    if omitted:
+        names -= set(omitted.split(","))
+    return names
+
+
+class SparseFieldsMixin:
+    """Serializer mixin leaving out fields not selected by the request.
+
+    Only the serializer created by the view is affected, not nested ones.
+    Fields whose source can not be derived (method fields) map to a model
+    field or relation in ``field_lookups``, for ``SparseQuerysetMixin``.
+    """
+
+    field_lookups = {}
+
+    def selected_fields(self):
+        """Return the readable fields to include in the representation."""
+        fields = {
+            name: field for name, field in self.fields.items() if not field.write_only
+        }
+
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+
+        names = requested_fields(self.context.get("request"), fields)
+        if names is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in names}
+
+    @property
+    def _readable_fields(self):
+        yield from self.selected_fields().values()
+
+
+class SparseQuerysetMixin:
+    """ViewSet mixin loading only what a ``SparseFieldsMixin`` serializer shows.
+
+    For GET requests with ``?fields=`` or ``?omit=`` the queryset is reduced
+    with ``only()`` to the columns of the selected fields, and prefetches of
+    relations that are not shown are dropped.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        if requested_fields(self.request, ()) is None:
+            return queryset
+
+        lookups = self.sparse_lookups(self.get_serializer(), queryset.model)
+        if lookups is None:
+            return queryset
+
+        columns, relations = lookups
+        select_related = queryset.query.select_related
+        if select_related is True:
+            return queryset
+        if select_related:
+            columns |= set(select_related)
+
+        # Read from the instances by the cursor pagination
+        columns |= set(cursor_fields(self)) - {"pk"}
+        columns.add(queryset.model._meta.pk.name)
+
+        prefetches = [
+            lookup
+            for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, "prefetch_to", lookup).split("__")[0] in relations
+        ]
+
+        return queryset.prefetch_related(None).prefetch_related(*prefetches).only(*columns)
+
+    @staticmethod
+    def sparse_lookups(serializer, model):
+        """Return the ``(columns, relations)`` read by the serializer's fields.
+
+        Returns None if a field can not be mapped to the model.
+        """
+        accessors = {
+            relation.get_accessor_name(): relation
+            for relation in model._meta.related_objects
+        }
+        columns, relations = set(), set()
+
+        for name, field in serializer.selected_fields().items():
+            source = getattr(serializer, "field_lookups", {}).get(name, field.source)
+            root = source.split(".")[0]
+
+            if root in accessors:
+                relations.add(root)
+                continue
+
+            try:
+                model_field = model._meta.get_field(root)
+            except FieldDoesNotExist:
+                return None
+
+            if model_field.many_to_many:
+                relations.add(root)
+            elif model_field.concrete:
+                columns.add(root)
+            else:
+                return None
+
+        return columns, relations
+
+
+class FastListMixin:
+    """ViewSet mixin rendering JSON list responses without the serializer.
+
+    Rows are loaded with ``values()`` and turned into the serializer's
+    representation by a ``fastlist.Plan`` and encoded by a faster renderer;
+    the response is byte for byte the same. Requests for other formats or
+    sparse fieldsets, and serializers the plan does not support, take the
+    regular path.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if (
+            request.accepted_renderer.format != "json"
+            or requested_fields(request, ()) is not None
+        ):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            plan = fastlist.Plan(self.get_serializer(), queryset.model)
+        except fastlist.Unsupported:
+            return super().list(request, *args, **kwargs)
+
+        # Read from the rows by the cursor pagination
+        ordering = cursor_fields(self)
+        rows = queryset.prefetch_related(None).values(
+            *dict.fromkeys(plan.columns + ordering)
+        )
+
+        request.accepted_renderer = fastlist.FastJSONRenderer()
+
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(plan.build(rows))
+        return self.get_paginated_response(plan.build(page))
@@ -1 +1,44 @@
-# Create your models here.
+from django.db import models
+from django.contrib.auth import get_user_model
+
+
+class SyncCounter(models.Model):
+    """Last change sequence number handed out for a user.
+
+    The row is locked while a change is recorded, so sequence numbers of a
+    user are strictly increasing in commit order. See ``moodyduck.api.sync``.
+    """
+
+    user = models.OneToOneField(get_user_model(), models.CASCADE, primary_key=True)
+    sequence = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user}: {self.sequence}"
+
+
+class SyncChange(models.Model):
+    """Latest change of an object exposed to the sync API.
+
+    There is one row per object, moved to the current sequence number on every
+    change. Rows of deleted objects are kept as tombstones.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "collection", "object_id"], name="unique_sync_change"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "sequence"], name="api_sync_user_seq_idx")
+        ]
+
+    user = models.ForeignKey(get_user_model(), models.CASCADE)
+    collection = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    sequence = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    def __str__(self):
+        action = "deleted" if self.deleted else "changed"
+        return f"{self.collection} {self.object_id} {action} at {self.sequence}"
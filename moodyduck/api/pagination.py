@@ -0,0 +1,50 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ApiCursorPagination(CursorPagination):
+    """Cursor pagination ordered by the view's ``cursor_ordering``.
+
+    Pages are selected relative to the last item of the previous page instead
+    of with an OFFSET, and no COUNT(*) is run, so deep pages cost the same as
+    the first one.
+    """
+
+    ordering = "-pk"
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+
+class ApiPagination(PageNumberPagination):
+    """Page number pagination, with opt-in cursor pagination.
+
+    Clients that pass ``?pagination=cursor`` (or follow a ``cursor`` link) get
+    cursor pagination instead; everybody else keeps the numbered pages.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def _cursor_paginator(self, request):
+        if (
+            request.query_params.get("pagination") == "cursor"
+            or CursorPagination.cursor_query_param in request.query_params
+        ):
+            return ApiCursorPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = self._cursor_paginator(request)
+
+        if self.cursor_paginator:
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
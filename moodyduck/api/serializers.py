@@ -1,9 +1,8 @@
 import logging
-import tempfile
 
-import gnupg
 from rest_framework import serializers
 
+from moodyduck.mood.aggregation import INTERVALS
 from moodyduck.mood.models import Activity, Mood, Status, StatusActivity, StatusMedia
 from moodyduck.habits.models import Habit, HabitLog
 from moodyduck.health.models import (
@@ -14,10 +13,14 @@ from moodyduck.health.models import (
     Vaccination,
 )
 from moodyduck.cbt.models import ThoughtRecord
+from moodyduck.common.keyring import KeyImportError, keyrings
 from moodyduck.dreams.models import Dream, DreamMedia
 from moodyduck.friends.models import Person
 from moodyduck.profiles.models import EmergencyAccessLog, UserProfile
 
+from .fastlist import Nested
+from .mixins import SparseFieldsMixin
+
 
 def encrypt_text_for_user(user, plaintext, object_label):
     pgp_key = getattr(user.userprofile, "pgp_key", "").strip()
@@ -26,33 +29,27 @@ def encrypt_text_for_user(user, plaintext, object_label):
             {"encrypt": "Add a PGP public key to your profile before encrypting."}
         )
 
-    with tempfile.TemporaryDirectory() as gnupghome:
-        gpg = gnupg.GPG(gnupghome=gnupghome)
-        gpg.encoding = "utf-8"
-        imported = gpg.import_keys(pgp_key)
-        if imported.count == 0:
-            logging.error("No public keys imported for user %s", user.pk)
-            raise serializers.ValidationError(
-                {"encrypt": "Your saved PGP key could not be imported."}
-            )
+    try:
+        with keyrings.keyring(pgp_key, user=user) as keyring:
+            encrypted = keyring.encrypt(plaintext)
+    except KeyImportError:
+        logging.error("No public keys imported for user %s", user.pk)
+        raise serializers.ValidationError(
+            {"encrypt": "Your saved PGP key could not be imported."}
+        )
 
-        encrypted = gpg.encrypt(
-            plaintext,
-            recipients=[imported.fingerprints[0]],
-            always_trust=True,
+    if not encrypted.ok:
+        logging.error(
+            "Error encrypting %s for user %s: %s",
+            object_label,
+            user.pk,
+            encrypted.status,
+        )
+        raise serializers.ValidationError(
+            {"encrypt": f"Error encrypting {object_label}: {encrypted.status}"}
         )
-        if not encrypted.ok:
-            logging.error(
-                "Error encrypting %s for user %s: %s",
-                object_label,
-                user.pk,
-                encrypted.status,
-            )
-            raise serializers.ValidationError(
-                {"encrypt": f"Error encrypting {object_label}: {encrypted.status}"}
-            )
 
-        return str(encrypted)
+    return str(encrypted)
 
 
 def habit_queryset_for_request(request):
@@ -63,7 +60,9 @@ def habit_log_queryset_for_request(request):
     return HabitLog.objects.select_related("habit").filter(habit__user=request.user)
 
 
-class StatusMediaSerializer(serializers.ModelSerializer):
+class StatusMediaSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    fast_fields = {"name": ["file"], "url": ["file"]}
+
     name = serializers.SerializerMethodField()
     url = serializers.SerializerMethodField()
 
@@ -83,14 +82,24 @@ class StatusMediaSerializer(serializers.ModelSerializer):
         return request.build_absolute_uri(url) if request else url
 
 
-class MoodSerializer(serializers.ModelSerializer):
+class MoodSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Mood
         fields = ["id", "name", "value", "icon", "color"]
         read_only_fields = ["id"]
 
 
-class StatusSerializer(serializers.ModelSerializer):
+class ActivitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Activity
+        fields = ["id", "name", "icon", "color"]
+        read_only_fields = ["id"]
+
+
+class StatusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    field_lookups = {"activities": "statusactivity_set"}
+    fast_fields = {"activities": Nested("statusactivity_set__activity", ActivitySerializer)}
+
     mood = serializers.PrimaryKeyRelatedField(
         queryset=Mood.objects.none(), allow_null=True
     )
@@ -173,21 +182,42 @@ class StatusSerializer(serializers.ModelSerializer):
         status.save(update_fields=["text"])
 
 
-class ActivitySerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Activity
-        fields = ["id", "name", "icon", "color"]
-        read_only_fields = ["id"]
+class StatusBulkItemSerializer(serializers.Serializer):
+    """One entry of a bulk status upload.
+
+    Moods and activities are looked up in the ``moods`` and ``activities``
+    maps (pk to object) passed in the context instead of the database.
+    """
+
+    key = serializers.CharField(max_length=64)
+    mood = serializers.IntegerField(allow_null=True, required=False, default=None)
+    title = serializers.CharField(max_length=64, allow_null=True, allow_blank=True, required=False)
+    text = serializers.CharField(allow_null=True, allow_blank=True, required=False)
+    timestamp = serializers.DateTimeField(required=False)
+    activity_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    encrypt = serializers.BooleanField(required=False, default=False)
+
+    def _lookup(self, name, pk):
+        try:
+            return self.context[name][pk]
+        except KeyError:
+            raise serializers.ValidationError(f'Invalid pk "{pk}" - object does not exist.')
 
+    def validate_mood(self, value):
+        return None if value is None else self._lookup("moods", value)
 
-class HabitSerializer(serializers.ModelSerializer):
+    def validate_activity_ids(self, value):
+        return [self._lookup("activities", pk) for pk in dict.fromkeys(value)]
+
+
+class HabitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Habit
         fields = ["id", "name", "icon", "color", "description"]
         read_only_fields = ["id"]
 
 
-class HabitLogSerializer(serializers.ModelSerializer):
+class HabitLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     habit = serializers.PrimaryKeyRelatedField(queryset=Habit.objects.none())
 
     class Meta:
@@ -202,14 +232,14 @@ class HabitLogSerializer(serializers.ModelSerializer):
             self.fields["habit"].queryset = habit_queryset_for_request(request)
 
 
-class HealthParameterSerializer(serializers.ModelSerializer):
+class HealthParameterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = HealthParameter
         fields = ["id", "name", "unit", "icon"]
         read_only_fields = ["id"]
 
 
-class HealthRecordSerializer(serializers.ModelSerializer):
+class HealthRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     parameter = HealthParameterSerializer(read_only=True)
 
     class Meta:
@@ -231,7 +261,7 @@ class HealthRecordWriteSerializer(serializers.Serializer):
             )
 
 
-class HealthLogSerializer(serializers.ModelSerializer):
+class HealthLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     records = HealthRecordSerializer(many=True, read_only=True)
 
     class Meta:
@@ -296,7 +326,7 @@ class HealthLogWriteSerializer(serializers.ModelSerializer):
         ).delete()
 
 
-class VaccinationSerializer(serializers.ModelSerializer):
+class VaccinationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Vaccination
         fields = [
@@ -312,14 +342,14 @@ class VaccinationSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class CBTRecordSerializer(serializers.ModelSerializer):
+class CBTRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ThoughtRecord
         fields = "__all__"
         read_only_fields = ["id", "user"]
 
 
-class DreamMediaSerializer(serializers.ModelSerializer):
+class DreamMediaSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     name = serializers.SerializerMethodField()
     url = serializers.SerializerMethodField()
 
@@ -339,7 +369,7 @@ class DreamMediaSerializer(serializers.ModelSerializer):
         return request.build_absolute_uri(url) if request else url
 
 
-class DreamSerializer(serializers.ModelSerializer):
+class DreamSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     mood = serializers.PrimaryKeyRelatedField(
         queryset=Mood.objects.none(), allow_null=True, required=False
     )
@@ -372,9 +402,7 @@ class DreamSerializer(serializers.ModelSerializer):
         return instance
 
     def _maybe_encrypt(self, dream, encrypt):
-        if not encrypt or not dream.content or dream.content.startswith(
-            "-----BEGIN PGP MESSAGE-----"
-        ):
+        if not encrypt or not dream.content or dream.is_encrypted:
             return
         dream.content = encrypt_text_for_user(dream.user, dream.content, "dream")
         dream.save(update_fields=["content"])
@@ -431,7 +459,7 @@ class EmergencyContactSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class PersonSerializer(serializers.ModelSerializer):
+class PersonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Person
         fields = [
@@ -474,8 +502,37 @@ class EmergencyProfileSerializer(serializers.Serializer):
     vaccinations = EmergencyVaccinationSerializer(many=True, read_only=True)
 
 
-class EmergencyAccessLogSerializer(serializers.ModelSerializer):
+class EmergencyAccessLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = EmergencyAccessLog
         fields = ["id", "accessed_at", "source", "method", "details"]
         read_only_fields = ["id", "accessed_at"]
+
+
+class MoodStatisticsQuerySerializer(serializers.Serializer):
+    DATETIME_FORMATS = ["iso-8601", "%Y-%m-%d"]
+
+    start = serializers.DateTimeField(input_formats=DATETIME_FORMATS, required=False)
+    end = serializers.DateTimeField(input_formats=DATETIME_FORMATS, required=False)
+    interval = serializers.ChoiceField(choices=INTERVALS, default="day")
+    max_points = serializers.IntegerField(min_value=3, max_value=5000, default=500)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError({"end": "End must not be before start."})
+        return attrs
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+
+    method = serializers.ChoiceField(choices=METHODS)
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 50
+
+    operations = BatchOperationSerializer(many=True, allow_empty=False, max_length=MAX_OPERATIONS)
+    atomic = serializers.BooleanField(default=False)
@@ -0,0 +1,138 @@
+"""
+Change tracking for the delta sync API.
+
+Every write to an object exposed through ``/api/sync/`` moves its SyncChange
+row to the next sequence number of the owning user; deleting the object turns
+the row into a tombstone. Clients keep the token returned by their last sync
+and only receive the objects whose sequence number is higher.
+
+The receivers keeping the change log up to date live in ``handler.py``.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from moodyduck.cbt.models import ThoughtRecord
+from moodyduck.common.versioning import bump_version
+from moodyduck.dreams.models import Dream
+from moodyduck.friends.models import Person
+from moodyduck.habits.models import Habit, HabitLog
+from moodyduck.health.models import HealthLog, HealthParameter, Vaccination
+from moodyduck.mood.models import Activity, Mood, Status
+
+from .mixins import version_scope
+from .models import SyncChange, SyncCounter
+
+COLLECTIONS = {
+    "moods": Mood,
+    "activities": Activity,
+    "statuses": Status,
+    "habits": Habit,
+    "habit-logs": HabitLog,
+    "health-parameters": HealthParameter,
+    "health-logs": HealthLog,
+    "health-vaccinations": Vaccination,
+    "cbt-records": ThoughtRecord,
+    "dreams": Dream,
+    "friends": Person,
+}
+
+_COLLECTION_NAMES = {model: name for name, model in COLLECTIONS.items()}
+
+
+def collection_for(model) -> str | None:
+    return _COLLECTION_NAMES.get(model)
+
+
+def _user_id(user) -> int:
+    return getattr(user, "pk", user)
+
+
+def _next_sequence(user_id: int) -> int:
+    # Must run in a transaction: the update keeps the counter row locked until
+    # the change itself is committed.
+    counters = SyncCounter.objects.filter(user_id=user_id)
+
+    if not counters.update(sequence=F("sequence") + 1):
+        try:
+            with transaction.atomic():
+                SyncCounter.objects.create(user_id=user_id, sequence=1)
+            return 1
+        except IntegrityError:
+            counters.update(sequence=F("sequence") + 1)
+
+    return counters.values_list("sequence", flat=True).get()
+
+
+def record_changes(user, collection: str, object_ids, deleted: bool = False) -> None:
+    """Mark objects of a collection as changed (or deleted) for their owner.
+
+    Also bumps the version of the collection used for conditional requests.
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+
+    user_id = _user_id(user)
+
+    with transaction.atomic():
+        sequence = _next_sequence(user_id)
+        SyncChange.objects.bulk_create(
+            [
+                SyncChange(
+                    user_id=user_id,
+                    collection=collection,
+                    object_id=object_id,
+                    sequence=sequence,
+                    deleted=deleted,
+                )
+                for object_id in object_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["user", "collection", "object_id"],
+            update_fields=["sequence", "deleted"],
+        )
+        bump_version(user_id, version_scope(collection))
+
+
+def current_sequence(user) -> int:
+    return (
+        SyncCounter.objects.filter(user_id=_user_id(user))
+        .values_list("sequence", flat=True)
+        .first()
+        or 0
+    )
+
+
+def encode_token(sequence: int) -> str:
+    return str(sequence)
+
+
+def decode_token(token: str) -> int:
+    """Return the sequence number of a token; raise ValueError if malformed."""
+    if not token.isdigit():
+        raise ValueError(f"Invalid sync token: {token!r}")
+    return int(token)
+
+
+def changes_since(user, since: int, until: int):
+    """Return ``(changed, deleted)``, mapping collections to object IDs.
+
+    Only changes with ``since < sequence <= until`` are included.
+    """
+    changed, deleted = defaultdict(list), defaultdict(list)
+
+    for collection, object_id, is_deleted in (
+        SyncChange.objects.filter(
+            user_id=_user_id(user), sequence__gt=since, sequence__lte=until
+        )
+        .order_by("sequence")
+        .values_list("collection", "object_id", "deleted")
+    ):
+        (deleted if is_deleted else changed)[collection].append(object_id)
+
+    return dict(changed), dict(deleted)
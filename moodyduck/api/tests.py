@@ -1,21 +1,39 @@
-from datetime import timedelta
+import json
+from datetime import datetime, timedelta
 from decimal import Decimal
+from unittest import mock
+from zoneinfo import ZoneInfo
 
+import gnupg
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
+from moodyduck.cbt.models import EmotionRecord, ThoughtRecord
+from moodyduck.common.keyring import keyrings
+from moodyduck.common.tests import ALICE_KEY
 from moodyduck.dreams.models import Dream, DreamMedia
+from moodyduck.habits.models import Habit, HabitLog
 from moodyduck.friends.models import Person
 from moodyduck.health.models import BasicMedicalInfo, Vaccination
-from moodyduck.mood.models import Activity, Mood, Status, StatusMedia
+from moodyduck.mood import encryption
+from moodyduck.mood.models import Activity, Mood, Status, StatusActivity, StatusMedia
 from moodyduck.health.models import HealthLog, HealthParameter, HealthRecord
 from moodyduck.profiles.models import EmergencyAccessLog
 
+from . import fastlist, sync
+from .views import SyncView
+
 
 class HealthLogApiTests(APITestCase):
     def setUp(self):
@@ -175,6 +193,81 @@ class StatusApiTests(APITestCase):
         self.assertEqual(delete_response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(StatusMedia.objects.filter(status=status_obj).count(), 0)
 
+    def test_bulk_create_is_idempotent(self):
+        mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        walk = Activity.objects.create(user=self.user, name="Walk")
+        reading = Activity.objects.create(user=self.user, name="Reading")
+        other_user = get_user_model().objects.create_user(username="other-status-user")
+        foreign = Activity.objects.create(user=other_user, name="Foreign")
+        yesterday = timezone.now() - timedelta(days=1)
+        payload = [
+            {"key": "a", "mood": mood.pk, "title": "Morning", "activity_ids": [walk.pk, reading.pk]},
+            {"key": "b", "mood": mood.pk, "timestamp": yesterday.isoformat()},
+            {"key": "c", "mood": mood.pk, "activity_ids": [foreign.pk]},
+            {"key": "a", "mood": mood.pk},
+            {"mood": mood.pk},
+        ]
+
+        response = self.client.post(
+            reverse("status-bulk"), payload, format="json", HTTP_HOST=self.host
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "created", "invalid", "invalid", "invalid"],
+        )
+        self.assertIn("activity_ids", results[2]["errors"])
+        self.assertIn("key", results[3]["errors"])
+
+        first = Status.objects.get(pk=results[0]["id"])
+        self.assertCountEqual([activity.name for activity in first.activity_set], ["Walk", "Reading"])
+        self.assertEqual(Status.objects.get(pk=results[1]["id"]).timestamp, yesterday)
+
+        # The dashboard rollups and charts see the new entries as well
+        self.assertEqual(
+            sum(self.user.dailymoodrollup_set.values_list("count", flat=True)), 2
+        )
+
+        retry = self.client.post(
+            reverse("status-bulk"), payload[:2], format="json", HTTP_HOST=self.host
+        )
+        self.assertEqual(
+            [(result["status"], result["id"]) for result in retry.data["results"]],
+            [("exists", results[0]["id"]), ("exists", results[1]["id"])],
+        )
+        self.assertEqual(Status.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_queries_do_not_grow_with_batch(self):
+        mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        walk = Activity.objects.create(user=self.user, name="Walk")
+        now = timezone.now()
+
+        def upload(prefix, count):
+            payload = [
+                {"key": f"{prefix}-{i}", "mood": mood.pk, "activity_ids": [walk.pk], "timestamp": now.isoformat()}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse("status-bulk"), payload, format="json", HTTP_HOST=self.host
+                )
+            self.assertEqual(
+                {result["status"] for result in response.data["results"]}, {"created"}
+            )
+            return len(queries)
+
+        upload("warm-up", 1)
+        self.assertEqual(upload("small", 5), upload("large", 100))
+        self.assertEqual(StatusActivity.objects.filter(activity=walk).count(), 106)
+
+    def test_bulk_create_rejects_non_list(self):
+        response = self.client.post(
+            reverse("status-bulk"), {"key": "a"}, format="json", HTTP_HOST=self.host
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_status_list_is_newest_first(self):
         older = Status.objects.create(
             user=self.user,
@@ -196,6 +289,105 @@ class StatusApiTests(APITestCase):
         )
 
 
+class MoodStatisticsApiTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="statistics-user",
+            password="secret",
+        )
+        self.user.userprofile.timezone = "Europe/Vienna"
+        self.user.userprofile.save()
+        self.client.force_authenticate(user=self.user)
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.bad = Mood.objects.create(user=self.user, name="Bad", value=2)
+        self.tz = ZoneInfo("Europe/Vienna")
+
+    def _status(self, mood, *args):
+        return Status.objects.create(
+            user=self.user, mood=mood, timestamp=datetime(*args, tzinfo=self.tz)
+        )
+
+    def test_daily_buckets_across_dst(self):
+        self._status(self.good, 2024, 3, 30, 23, 30)
+        self._status(self.bad, 2024, 3, 31, 0, 30)
+        self._status(self.good, 2024, 3, 31, 23, 30)
+        self._status(self.good, 2024, 4, 1, 12)
+
+        response = self.client.get(
+            reverse("statistics-mood"),
+            {"start": "2024-03-30", "end": "2024-04-01", "interval": "day"},
+            HTTP_HOST=self.host,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["timezone"], "Europe/Vienna")
+        self.assertEqual(
+            [bucket["start"] for bucket in response.data["buckets"]],
+            [
+                "2024-03-30T00:00:00+01:00",
+                "2024-03-31T00:00:00+01:00",
+                "2024-04-01T00:00:00+02:00",
+            ],
+        )
+        self.assertEqual(
+            [
+                (bucket["count"], bucket["mean"], bucket["min"], bucket["max"])
+                for bucket in response.data["buckets"]
+            ],
+            [(1, 4.0, 4.0, 4.0), (2, 3.0, 2.0, 4.0), (1, 4.0, 4.0, 4.0)],
+        )
+
+    def test_empty_buckets_and_limits(self):
+        response = self.client.get(
+            reverse("statistics-mood"),
+            {"start": "2024-01-01", "end": "2024-03-15", "interval": "month"},
+            HTTP_HOST=self.host,
+        )
+
+        self.assertEqual(len(response.data["buckets"]), 3)
+        self.assertEqual(response.data["buckets"][0]["count"], 0)
+        self.assertIsNone(response.data["buckets"][0]["mean"])
+
+        response = self.client.get(
+            reverse("statistics-mood"),
+            {"start": "2000-01-01", "end": "2024-01-01", "interval": "hour"},
+            HTTP_HOST=self.host,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            reverse("statistics-mood"),
+            {"start": "2024-01-02", "end": "2024-01-01"},
+            HTTP_HOST=self.host,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_points_are_downsampled(self):
+        start = datetime(2024, 1, 1, tzinfo=self.tz)
+        for hour in range(200):
+            Status.objects.create(
+                user=self.user,
+                mood=self.good if hour % 3 else self.bad,
+                timestamp=start + timedelta(hours=hour),
+            )
+
+        response = self.client.get(
+            reverse("statistics-mood-points"),
+            {"max_points": 20},
+            HTTP_HOST=self.host,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 200)
+        self.assertEqual(len(response.data["points"]), 20)
+        self.assertEqual(
+            response.data["points"][0]["timestamp"], "2024-01-01T00:00:00+01:00"
+        )
+        self.assertEqual(response.data["points"][0]["value"], 2)
+
+
 class DreamApiTests(APITestCase):
     def setUp(self):
         self.host = settings.ALLOWED_HOSTS[0]
@@ -263,6 +455,25 @@ class DreamApiTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("encrypt", response.data)
 
+    def test_dream_encrypt_reuses_imported_key(self):
+        self.addCleanup(keyrings.clear)
+        self.user.userprofile.pgp_key = ALICE_KEY
+        self.user.userprofile.save()
+
+        with mock.patch("gnupg.GPG.import_keys", autospec=True, side_effect=gnupg.GPG.import_keys) as import_keys:
+            for title in ("First", "Second"):
+                response = self.client.post(
+                    reverse("dream-list"),
+                    {"title": title, "content": "Secret dream text", "type": 0, "encrypt": True},
+                    format="json",
+                    HTTP_HOST=self.host,
+                )
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        import_keys.assert_called_once()
+        for dream in Dream.objects.filter(user=self.user):
+            self.assertTrue(dream.content.startswith("-----BEGIN PGP MESSAGE"))
+
     def test_dream_list_is_newest_first(self):
         older = Dream.objects.create(
             user=self.user,
@@ -445,3 +656,581 @@ class FriendsApiTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Person.objects.filter(user=self.user, name="Alex Friend").count(), 1)
         self.assertTrue(Person.objects.get(user=self.user, name="Alex Friend").emergency_contact)
+
+
+class QueryBudgetApiTests(APITestCase):
+    # Queries per list request with page number pagination, including the
+    # version lookup for the ETag and the COUNT(*). Cursor pagination skips
+    # the count and needs one less.
+    BUDGETS = {
+        "emergency-access-log-list": 3,
+        "friend-list": 3,
+        "mood-list": 3,
+        "activity-list": 3,
+        "status-list": 5,
+        "habit-list": 3,
+        "habit-log-list": 3,
+        "health-parameter-list": 3,
+        "health-log-list": 5,
+        "health-vaccination-list": 3,
+        "cbt-record-list": 5,
+        "dream-list": 4,
+    }
+
+    ITEMS = 12
+
+    def setUp(self):
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="budget-user",
+            password="secret",
+        )
+        self.client.force_authenticate(user=self.user)
+
+        now = timezone.now()
+        emotion = EmotionRecord.objects.create(
+            emotion="Calm", percentage=50, description="Fine"
+        )
+
+        for i in range(self.ITEMS):
+            mood = Mood.objects.create(user=self.user, name=f"Mood {i}", value=i)
+            activity = Activity.objects.create(user=self.user, name=f"Activity {i}")
+            status_obj = Status.objects.create(
+                user=self.user,
+                mood=mood,
+                title=f"Status {i}",
+                timestamp=now - timedelta(hours=i),
+            )
+            StatusActivity.objects.create(status=status_obj, activity=activity)
+            StatusMedia.objects.create(status=status_obj, file=f"status/{i}.png")
+
+            habit = Habit.objects.create(user=self.user, name=f"Habit {i}")
+            HabitLog.objects.create(habit=habit)
+
+            parameter = HealthParameter.objects.create(user=self.user, name=f"Pulse {i}")
+            log = HealthLog.objects.create(user=self.user)
+            HealthRecord.objects.create(log=log, parameter=parameter, value=60 + i)
+
+            record = ThoughtRecord.objects.create(user=self.user, title=f"Record {i}")
+            record.emotions.add(emotion)
+            record.emotions_now.add(emotion)
+
+            dream = Dream.objects.create(
+                user=self.user,
+                mood=mood,
+                title=f"Dream {i}",
+                content="Flying",
+                type=Dream.DreamTypes.NIGHT,
+                timestamp=now - timedelta(hours=i),
+            )
+            DreamMedia.objects.create(dream=dream, media=f"dreams/{i}.png")
+
+            Person.objects.create(user=self.user, name=f"Person {i}")
+            Vaccination.objects.create(user=self.user, name=f"Vaccine {i}")
+            EmergencyAccessLog.objects.create(user=self.user)
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, HTTP_HOST=self.host)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_list_query_budget_is_independent_of_page_size(self):
+        for name, budget in self.BUDGETS.items():
+            url = reverse(name)
+            with self.subTest(endpoint=name):
+                small, _ = self.count_queries(url, page_size=2)
+                large, response = self.count_queries(url, page_size=self.ITEMS)
+
+                self.assertEqual(len(response.data["results"]), self.ITEMS)
+                self.assertEqual(small, budget)
+                self.assertEqual(large, budget)
+
+    def test_cursor_query_budget_is_independent_of_depth(self):
+        for name, budget in self.BUDGETS.items():
+            url = reverse(name)
+            with self.subTest(endpoint=name):
+                first, response = self.count_queries(url, pagination="cursor", page_size=5)
+                self.assertNotIn("count", response.data)
+                self.assertEqual(first, budget - 1)
+
+                seen = [item["id"] for item in response.data["results"]]
+                while response.data["next"]:
+                    queries, response = self.count_queries(response.data["next"])
+                    self.assertEqual(queries, budget - 1)
+                    seen += [item["id"] for item in response.data["results"]]
+
+                self.assertEqual(len(seen), self.ITEMS)
+                self.assertEqual(len(set(seen)), self.ITEMS)
+
+    def test_cursor_pages_follow_list_order(self):
+        numbered = self.client.get(reverse("status-list"), HTTP_HOST=self.host)
+        first = self.client.get(
+            reverse("status-list"),
+            {"pagination": "cursor", "page_size": 5},
+            HTTP_HOST=self.host,
+        )
+        second = self.client.get(first.data["next"], HTTP_HOST=self.host)
+
+        self.assertEqual(
+            [item["id"] for item in first.data["results"] + second.data["results"]],
+            [item["id"] for item in numbered.data["results"][:10]],
+        )
+        self.assertIsNone(first.data["previous"])
+        self.assertIsNotNone(second.data["previous"])
+
+
+class SyncApiTests(APITestCase):
+    def setUp(self):
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="sync-user",
+            password="secret",
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username="other-sync-user",
+            password="secret",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("sync")
+
+        self.mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        self.status = Status.objects.create(user=self.user, mood=self.mood, title="First")
+        habit = Habit.objects.create(user=self.user, name="Stretch")
+        self.habit_log = HabitLog.objects.create(habit=habit)
+
+    def sync(self, token=None):
+        params = {} if token is None else {"since": token}
+        response = self.client.get(self.url, params, HTTP_HOST=self.host)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_collections_match_sync_view(self):
+        self.assertEqual(set(sync.COLLECTIONS), set(SyncView.viewsets))
+
+    def test_bulk_encryption_is_synced(self):
+        self.addCleanup(keyrings.clear)
+        self.user.userprofile.pgp_key = ALICE_KEY
+        self.user.userprofile.save()
+        self.status.text = "Dear diary"
+        self.status.save()
+        token = self.sync()["token"]
+
+        encryption.run(encryption.start(self.user))
+
+        data = self.sync(token)
+        self.assertEqual([item["id"] for item in data["changes"]["statuses"]], [self.status.pk])
+        self.assertTrue(data["changes"]["statuses"][0]["text"].startswith("-----BEGIN PGP MESSAGE"))
+
+    def test_initial_sync_returns_everything(self):
+        data = self.sync()
+
+        self.assertTrue(data["reset"])
+        self.assertEqual([item["id"] for item in data["changes"]["statuses"]], [self.status.pk])
+        self.assertEqual([item["id"] for item in data["changes"]["habit-logs"]], [self.habit_log.pk])
+        self.assertNotIn("dreams", data["changes"])
+
+        data = self.sync(data["token"])
+        self.assertFalse(data["reset"])
+        self.assertEqual(data["changes"], {})
+        self.assertEqual(data["deleted"], {})
+
+    def test_changes_and_tombstones_since_token(self):
+        token = self.sync()["token"]
+
+        walk = Activity.objects.create(user=self.user, name="Walk")
+        StatusActivity.objects.create(status=self.status, activity=walk)
+        log_id = self.habit_log.pk
+        self.habit_log.delete()
+        Status.objects.create(user=self.other_user, title="Not mine")
+
+        data = self.sync(token)
+
+        self.assertEqual([item["id"] for item in data["changes"]["activities"]], [walk.pk])
+        self.assertEqual(
+            [activity["name"] for activity in data["changes"]["statuses"][0]["activities"]],
+            ["Walk"],
+        )
+        self.assertEqual(len(data["changes"]["statuses"]), 1)
+        self.assertEqual(data["deleted"], {"habit-logs": [log_id]})
+        self.assertGreater(int(data["token"]), int(token))
+
+    def test_deleted_mood_updates_its_entries(self):
+        token = self.sync()["token"]
+
+        mood_id = self.mood.pk
+        self.mood.delete()
+        data = self.sync(token)
+
+        self.assertEqual(data["deleted"], {"moods": [mood_id]})
+        self.assertEqual(data["changes"]["statuses"][0]["id"], self.status.pk)
+        self.assertIsNone(data["changes"]["statuses"][0]["mood"])
+
+    def test_deleting_status_leaves_single_tombstone(self):
+        token = self.sync()["token"]
+
+        StatusMedia.objects.create(status=self.status, file="status/a.png")
+        status_id = self.status.pk
+        self.status.delete()
+        data = self.sync(token)
+
+        self.assertNotIn("statuses", data["changes"])
+        self.assertEqual(data["deleted"], {"statuses": [status_id]})
+
+    def test_steady_state_sync_is_cheap(self):
+        token = self.sync()["token"]
+
+        with self.assertNumQueries(2):
+            data = self.sync(token)
+        self.assertEqual(data["changes"], {})
+
+    def test_bad_and_unknown_tokens(self):
+        response = self.client.get(self.url, {"since": "abc"}, HTTP_HOST=self.host)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        data = self.sync("999999")
+        self.assertTrue(data["reset"])
+        self.assertIn("statuses", data["changes"])
+
+
+class BatchApiTests(APITestCase):
+    def setUp(self):
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="batch-user",
+            password="secret",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("batch")
+        self.mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        self.habit = Habit.objects.create(user=self.user, name="Stretch")
+        self.parameter = HealthParameter.objects.create(user=self.user, name="Pulse")
+
+    def batch(self, operations, **kwargs):
+        return self.client.post(
+            self.url,
+            {"operations": operations, **kwargs},
+            format="json",
+            HTTP_HOST=self.host,
+        )
+
+    def save_operations(self):
+        return [
+            {"method": "POST", "path": reverse("status-list"), "body": {"mood": self.mood.pk, "title": "Evening"}},
+            {"method": "POST", "path": reverse("habit-log-list"), "body": {"habit": self.habit.pk}},
+            {
+                "method": "POST",
+                "path": reverse("health-log-list"),
+                "body": {"records": [{"parameter": self.parameter.pk, "value": "61"}]},
+            },
+        ]
+
+    def test_operations_run_in_order(self):
+        operations = self.save_operations() + [
+            {"method": "GET", "path": reverse("status-list") + "?page_size=1"},
+        ]
+
+        response = self.batch(operations)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["committed"])
+        results = response.data["results"]
+        self.assertEqual([result["status"] for result in results], [201, 201, 201, 200])
+        self.assertEqual(results[3]["body"]["results"][0]["id"], results[0]["body"]["id"])
+        self.assertEqual(results[2]["body"]["records"][0]["parameter"]["name"], "Pulse")
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        operations = self.save_operations()
+        operations[1]["body"]["habit"] = 0
+
+        response = self.batch(operations, atomic=True)
+
+        self.assertFalse(response.data["committed"])
+        self.assertEqual([result["status"] for result in response.data["results"]], [201, 400])
+        self.assertFalse(Status.objects.filter(user=self.user).exists())
+        self.assertFalse(HealthLog.objects.filter(user=self.user).exists())
+
+    def test_non_atomic_batch_keeps_going(self):
+        operations = self.save_operations()
+        operations[1]["body"]["habit"] = 0
+
+        response = self.batch(operations)
+
+        self.assertTrue(response.data["committed"])
+        self.assertEqual([result["status"] for result in response.data["results"]], [201, 400, 201])
+        self.assertTrue(Status.objects.filter(user=self.user).exists())
+
+    def test_only_api_views_are_reachable(self):
+        response = self.batch(
+            [
+                {"method": "GET", "path": "/admin/"},
+                {"method": "POST", "path": self.url, "body": {"operations": []}},
+                {"method": "GET", "path": "/api/no-such-thing/"},
+            ]
+        )
+
+        self.assertEqual([result["status"] for result in response.data["results"]], [404, 404, 404])
+
+    def test_plain_django_views_return_their_content(self):
+        response = self.batch([{"method": "GET", "path": reverse("status")}])
+
+        self.assertEqual(response.data["results"], [{"status": 200, "body": {"status": "OK"}}])
+
+    def test_authenticates_once(self):
+        token = Token.objects.create(user=self.user)
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        with mock.patch.object(
+            TokenAuthentication,
+            "authenticate_credentials",
+            autospec=True,
+            side_effect=TokenAuthentication.authenticate_credentials,
+        ) as authenticate:
+            response = self.batch(self.save_operations())
+
+        self.assertEqual([result["status"] for result in response.data["results"]], [201, 201, 201])
+        self.assertEqual(authenticate.call_count, 1)
+
+    def test_rejects_malformed_envelope(self):
+        response = self.batch([{"method": "TRACE", "path": "/api/moods/"}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetApiTests(APITestCase):
+    def setUp(self):
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="conditional-user",
+            password="secret",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+
+    def get(self, url, **headers):
+        return self.client.get(url, HTTP_HOST=self.host, **headers)
+
+    def test_unchanged_list_and_detail_are_not_modified(self):
+        for url in (reverse("mood-list"), reverse("mood-detail", kwargs={"pk": self.mood.pk})):
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response["ETag"].startswith('W/"'))
+                self.assertIn("Last-Modified", response)
+
+                with self.assertNumQueries(1):
+                    cached = self.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(cached["ETag"], response["ETag"])
+
+                cached = self.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+                self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_invalidate_etag(self):
+        url = reverse("mood-list")
+        etag = self.get(url)["ETag"]
+
+        Mood.objects.create(user=self.user, name="Great", value=5)
+
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_nested_data_invalidates_etag(self):
+        walk = Activity.objects.create(user=self.user, name="Walk")
+        entry = Status.objects.create(user=self.user, mood=self.mood)
+        StatusActivity.objects.create(status=entry, activity=walk)
+        url = reverse("status-list")
+        etag = self.get(url)["ETag"]
+
+        walk.name = "Long walk"
+        walk.save()
+
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["activities"][0]["name"], "Long walk")
+
+    def test_query_and_user_are_part_of_etag(self):
+        url = reverse("mood-list")
+        etag = self.get(url)["ETag"]
+
+        self.assertNotEqual(self.get(url + "?page_size=1")["ETag"], etag)
+
+        other_user = get_user_model().objects.create_user(username="other-conditional-user")
+        self.client.force_authenticate(user=other_user)
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [])
+
+    def test_emergency_profile(self):
+        url = reverse("emergency-profile")
+        self.get(url)
+        etag = self.get(url)["ETag"]
+
+        self.assertEqual(
+            self.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        Person.objects.create(user=self.user, name="Sam", emergency_contact=True)
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([contact["name"] for contact in response.data["contacts"]], ["Sam"])
+
+
+class SparseFieldsApiTests(APITestCase):
+    def setUp(self):
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="sparse-user",
+            password="secret",
+        )
+        self.client.force_authenticate(user=self.user)
+        mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        walk = Activity.objects.create(user=self.user, name="Walk")
+        for i in range(3):
+            entry = Status.objects.create(user=self.user, mood=mood, text="x" * 1000)
+            StatusActivity.objects.create(status=entry, activity=walk)
+            StatusMedia.objects.create(status=entry, file=f"status/{i}.png")
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, HTTP_HOST=self.host)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query["sql"] for query in queries]
+
+    def test_fields_trim_representation_and_queries(self):
+        response, queries = self.get(reverse("status-list"), {"fields": "id,timestamp,mood,nope"})
+
+        for item in response.data["results"]:
+            self.assertEqual(set(item), {"id", "timestamp", "mood"})
+        # Version lookup, count and the page itself, without the text column
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('"mood_status"."text"', queries[-1])
+
+    def test_omit_keeps_needed_relations(self):
+        response, queries = self.get(reverse("status-list"), {"omit": "text,attachments"})
+
+        item = response.data["results"][0]
+        self.assertNotIn("text", item)
+        self.assertNotIn("attachments", item)
+        self.assertEqual(item["activities"][0]["name"], "Walk")
+        self.assertEqual(len(queries), 4)
+        self.assertFalse(any("mood_statusmedia" in query for query in queries))
+
+    def test_single_field_cursor_ordering(self):
+        for i in range(3):
+            ThoughtRecord.objects.create(user=self.user, title=f"Record {i}", situation="x" * 100)
+
+        for params in (
+            {"fields": "id,title"},
+            {"omit": "situation"},
+            {"fields": "id,title", "pagination": "cursor"},
+        ):
+            response, queries = self.get(reverse("cbt-record-list"), params)
+
+            item = response.data["results"][0]
+            self.assertEqual(item["title"], "Record 2")
+            self.assertNotIn("situation", item)
+            self.assertFalse(any('"cbt_thoughtrecord"."situation"' in query for query in queries))
+
+    def test_detail_and_nested_serializers(self):
+        parameter = HealthParameter.objects.create(user=self.user, name="Pulse")
+        log = HealthLog.objects.create(user=self.user, notes="Check-in")
+        HealthRecord.objects.create(log=log, parameter=parameter, value=60)
+
+        response, _ = self.get(
+            reverse("health-log-detail", kwargs={"pk": log.pk}), {"fields": "records"}
+        )
+
+        self.assertEqual(set(response.data), {"records"})
+        self.assertEqual(response.data["records"][0]["parameter"]["name"], "Pulse")
+
+    def test_writes_ignore_fields(self):
+        response = self.client.post(
+            reverse("mood-list") + "?fields=id",
+            {"name": "Great", "value": 5},
+            format="json",
+            HTTP_HOST=self.host,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["name"], "Great")
+
+
+class FastListApiTests(APITestCase):
+    def setUp(self):
+        self.host = settings.ALLOWED_HOSTS[0]
+        self.user = get_user_model().objects.create_user(
+            username="fast-user",
+            password="secret",
+        )
+        self.client.force_authenticate(user=self.user)
+
+        mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        walk = Activity.objects.create(user=self.user, name="Walk", color="#123456")
+        read = Activity.objects.create(user=self.user, name="Lesen ✓")
+        texts = [None, "", "Plain", "Ünïcödé 🦆\u2028\u2029\x00\x1f\t\"quoted\"", "-----BEGIN PGP MESSAGE-----\n..."]
+        for i, text in enumerate(texts * 3):
+            entry = Status.objects.create(
+                user=self.user,
+                mood=mood if i % 2 else None,
+                title=None if i % 3 else f"Entry {i}",
+                text=text,
+                timestamp=timezone.now() - timedelta(hours=i, microseconds=i),
+            )
+            for activity in [walk, read][: i % 3]:
+                StatusActivity.objects.create(status=entry, activity=activity)
+            if i % 4 == 0:
+                StatusMedia.objects.create(status=entry, file=f"status/{i} ä.png")
+
+        pulse = HealthParameter.objects.create(user=self.user, name="Pulse", unit="bpm")
+        weight = HealthParameter.objects.create(user=self.user, name="Weight")
+        for i in range(4):
+            log = HealthLog.objects.create(user=self.user, notes=None if i % 2 else "Check-in")
+            HealthRecord.objects.create(log=log, parameter=pulse, value=Decimal("60.5") + i)
+            if i % 2:
+                HealthRecord.objects.create(log=log, parameter=weight, value=None)
+
+    def get_both(self, url, params=None):
+        fast = self.client.get(url, params, HTTP_HOST=self.host)
+        with mock.patch.object(fastlist, "Plan", side_effect=fastlist.Unsupported):
+            regular = self.client.get(url, params, HTTP_HOST=self.host)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(regular.status_code, status.HTTP_200_OK)
+        return fast, regular
+
+    def test_output_is_identical(self):
+        for url in (reverse("status-list"), reverse("health-log-list")):
+            for params in ({}, {"page_size": 3, "page": 2}, {"pagination": "cursor", "page_size": 3}):
+                with self.subTest(url=url, params=params):
+                    fast, regular = self.get_both(url, params)
+                    self.assertEqual(fast.content, regular.content)
+                    self.assertEqual(fast["Content-Type"], regular["Content-Type"])
+
+    def test_cursor_pages_are_identical(self):
+        fast, regular = self.get_both(reverse("status-list"), {"pagination": "cursor", "page_size": 4})
+        while True:
+            next_fast = json.loads(fast.content)["next"]
+            self.assertEqual(next_fast, json.loads(regular.content)["next"])
+            if not next_fast:
+                break
+            fast, regular = self.get_both(next_fast)
+            self.assertEqual(fast.content, regular.content)
+
+    def test_fast_path_is_opt_in(self):
+        with mock.patch.object(fastlist, "Plan", side_effect=AssertionError):
+            for url in (reverse("mood-list"), reverse("status-list") + "?fields=id"):
+                response = self.client.get(url, HTTP_HOST=self.host)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_dumps_matches_json_renderer(self):
+        data = {"text": "Ünï 🦆\u2028\u2029\x00\x1f\x7f\t/\\", "items": [None, True, 1, "x"], "nested": {}}
+        expected = JSONRenderer().render(data)
+
+        self.assertEqual(fastlist.dumps(data), expected)
+        with mock.patch.object(fastlist, "orjson", None):
+            self.assertEqual(fastlist.dumps(data), expected)
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (
     ActivityViewSet,
+    BatchView,
     CBTRecordViewSet,
     CurrentEmergencyProfileView,
     CurrentProfileView,
@@ -12,10 +13,13 @@ from .views import (
     HabitViewSet,
     HealthLogViewSet,
     HealthParameterViewSet,
+    MoodStatisticsPointsView,
+    MoodStatisticsView,
     MoodViewSet,
     PersonViewSet,
     StatusCheckView,
     StatusViewSet,
+    SyncView,
     VaccinationViewSet,
 )
 
@@ -42,5 +46,13 @@ urlpatterns = [
     path("profile/", CurrentProfileView.as_view(), name="profile"),
     path("emergency-profile/", CurrentEmergencyProfileView.as_view(), name="emergency-profile"),
     path("status/", StatusCheckView.as_view(), name="status"),
+    path("sync/", SyncView.as_view(), name="sync"),
+    path("batch/", BatchView.as_view(), name="batch"),
+    path("statistics/mood/", MoodStatisticsView.as_view(), name="statistics-mood"),
+    path(
+        "statistics/mood/points/",
+        MoodStatisticsPointsView.as_view(),
+        name="statistics-mood-points",
+    ),
     path("auth/", include("rest_framework.urls")),
 ]
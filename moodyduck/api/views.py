@@ -1,17 +1,32 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.http import JsonResponse
 from django.views import View
 
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-from moodyduck.common.helpers import get_upload_path
-from moodyduck.mood.models import Activity, Mood, Status, StatusMedia
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from moodyduck.common.helpers import get_upload_path, user_timezone
+from moodyduck.mood.aggregation import (
+    aggregate,
+    bucket_edges,
+    downsample,
+    to_datetime,
+)
+from moodyduck.mood.handler import statuses_created
+from moodyduck.mood.models import Activity, Mood, Status, StatusActivity, StatusMedia, is_pgp_message
+from moodyduck.mood.timeseries import get_series
 from moodyduck.habits.models import Habit, HabitLog
 from moodyduck.health.models import BasicMedicalInfo, HealthLog, HealthParameter, Vaccination
 from moodyduck.cbt.models import ThoughtRecord
@@ -19,7 +34,10 @@ from moodyduck.dreams.models import Dream, DreamMedia
 from moodyduck.friends.models import Person
 from moodyduck.profiles.models import EmergencyAccessLog
 
+from . import batch, sync
+from .mixins import ConditionalGetMixin, FastListMixin, SparseQuerysetMixin
 from .serializers import (
+    BatchRequestSerializer,
     CBTRecordSerializer,
     DreamSerializer,
     ActivitySerializer,
@@ -29,6 +47,7 @@ from .serializers import (
     EmergencyContactSerializer,
     EmergencyProfileSerializer,
     EmergencyVaccinationSerializer,
+    encrypt_text_for_user,
     habit_log_queryset_for_request,
     habit_queryset_for_request,
     HabitLogSerializer,
@@ -37,7 +56,9 @@ from .serializers import (
     HealthLogWriteSerializer,
     HealthParameterSerializer,
     MoodSerializer,
+    MoodStatisticsQuerySerializer,
     PersonSerializer,
+    StatusBulkItemSerializer,
     StatusMediaSerializer,
     StatusSerializer,
     UserProfileSerializer,
@@ -50,10 +71,108 @@ class StatusCheckView(View):
         return JsonResponse({"status": "OK"})
 
 
-class CurrentProfileView(APIView):
+class MoodStatisticsView(APIView):
+    """Mood values aggregated into calendar buckets.
+
+    Query parameters: ``start``, ``end`` (ISO 8601 date or datetime) and
+    ``interval`` (hour, day, week or month). Buckets follow the user's time
+    zone; empty buckets have a count of 0 and no mean, min or max.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    DEFAULT_SPANS = {
+        "hour": relativedelta(days=2),
+        "day": relativedelta(months=1),
+        "week": relativedelta(months=6),
+        "month": relativedelta(years=1),
+    }
+
+    def get(self, request):
+        query = MoodStatisticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        interval = query.validated_data["interval"]
+        end = query.validated_data.get("end", timezone.now())
+        start = query.validated_data.get("start", end - self.DEFAULT_SPANS[interval])
+        tz = user_timezone(request.user)
+
+        try:
+            edges = bucket_edges(start, end, interval, tz)
+        except ValueError as e:
+            raise ValidationError({"interval": str(e)})
+
+        result = aggregate(get_series(request.user), edges)
+
+        def number(value):
+            return None if np.isnan(value) else round(float(value), 4)
+
+        return Response(
+            {
+                "start": start,
+                "end": end,
+                "interval": interval,
+                "timezone": str(tz),
+                "buckets": [
+                    {
+                        "start": edge.isoformat(),
+                        "count": int(count),
+                        "mean": number(mean),
+                        "min": number(low),
+                        "max": number(high),
+                    }
+                    for edge, count, mean, low, high in zip(
+                        edges,
+                        result["count"],
+                        result["mean"],
+                        result["min"],
+                        result["max"],
+                    )
+                ],
+            }
+        )
+
+
+class MoodStatisticsPointsView(APIView):
+    """Individual mood entries, downsampled with LTTB to ``max_points``.
+
+    Without ``start`` or ``end`` the full history is used.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = MoodStatisticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        series = get_series(request.user).window(
+            query.validated_data.get("start"), query.validated_data.get("end")
+        )
+        points = downsample(series, query.validated_data["max_points"])
+        tz = user_timezone(request.user)
+
+        return Response(
+            {
+                "total": len(series),
+                "points": [
+                    {
+                        "timestamp": to_datetime(timestamp, tz).isoformat(),
+                        "value": int(value),
+                    }
+                    for timestamp, value in zip(points.timestamps, points.values)
+                ],
+            }
+        )
+
+
+class CurrentProfileView(ConditionalGetMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    version_scopes = ("profile",)
 
     def get(self, request):
+        return self.conditional(request, self.profile)
+
+    def profile(self, request):
         return Response(UserProfileSerializer(request.user.userprofile).data)
 
     def patch(self, request):
@@ -67,10 +186,14 @@ class CurrentProfileView(APIView):
         return Response(serializer.data)
 
 
-class CurrentEmergencyProfileView(APIView):
+class CurrentEmergencyProfileView(ConditionalGetMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    version_scopes = ("profile", "medical-info", "friends", "health-vaccinations")
 
     def get(self, request):
+        return self.conditional(request, self.emergency_profile)
+
+    def emergency_profile(self, request):
         profile = request.user.userprofile
         medical_info, _ = BasicMedicalInfo.objects.get_or_create(user=request.user)
         latest_vaccinations = []
@@ -124,7 +247,9 @@ class CurrentEmergencyProfileView(APIView):
         return self.get(request)
 
 
-class EmergencyAccessLogViewSet(viewsets.ModelViewSet):
+class EmergencyAccessLogViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("emergency-access-logs",)
+    cursor_ordering = ("-accessed_at", "-id")
     serializer_class = EmergencyAccessLogSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -135,7 +260,9 @@ class EmergencyAccessLogViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class PersonViewSet(viewsets.ModelViewSet):
+class PersonViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("friends",)
+    cursor_ordering = ("name", "id")
     serializer_class = PersonSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -146,7 +273,9 @@ class PersonViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class MoodViewSet(viewsets.ModelViewSet):
+class MoodViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("moods",)
+    cursor_ordering = ("-value", "id")
     serializer_class = MoodSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -157,7 +286,9 @@ class MoodViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("activities",)
+    cursor_ordering = ("name", "id")
     serializer_class = ActivitySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -168,16 +299,135 @@ class ActivityViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class StatusViewSet(viewsets.ModelViewSet):
+class StatusViewSet(
+    ConditionalGetMixin, SparseQuerysetMixin, FastListMixin, viewsets.ModelViewSet
+):
+    version_scopes = ("statuses", "activities")
+    cursor_ordering = ("-timestamp", "-id")
     serializer_class = StatusSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Status.objects.filter(user=self.request.user).order_by("-timestamp")
+        return (
+            Status.objects.filter(user=self.request.user)
+            .prefetch_related(
+                Prefetch(
+                    "statusactivity_set",
+                    queryset=StatusActivity.objects.select_related("activity"),
+                ),
+                "statusmedia_set",
+            )
+            .order_by("-timestamp")
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    MAX_BULK_ITEMS = 500
+
+    @action(detail=False, methods=["post"], url_path="bulk", url_name="bulk")
+    def bulk(self, request):
+        """Create many statuses at once, e.g. entries queued by an offline client.
+
+        Takes a list of statuses, each with a client-generated ``key``. Entries
+        with a key that was uploaded before are not created again, so a failed
+        upload can simply be retried. Returns one result per entry, in order.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({"non_field_errors": ["Expected a list of statuses."]})
+        if len(request.data) > self.MAX_BULK_ITEMS:
+            raise ValidationError(
+                {"non_field_errors": [f"Upload at most {self.MAX_BULK_ITEMS} statuses at once."]}
+            )
+
+        context = {
+            "moods": Mood.objects.filter(user=request.user).in_bulk(),
+            "activities": Activity.objects.filter(user=request.user).in_bulk(),
+        }
+
+        results, pending = [], {}
+        for row in request.data:
+            item = StatusBulkItemSerializer(data=row, context=context)
+            if not item.is_valid():
+                key = row.get("key") if isinstance(row, dict) else None
+                results.append({"key": key, "status": "invalid", "errors": item.errors})
+                continue
+
+            data = item.validated_data
+            result = {"key": data["key"]}
+            results.append(result)
+
+            if data["key"] in pending:
+                result.update(status="invalid", errors={"key": ["Duplicate key."]})
+                continue
+
+            text = data.get("text")
+            if data["encrypt"] and text and not is_pgp_message(text):
+                try:
+                    data["text"] = encrypt_text_for_user(request.user, text, "note")
+                except ValidationError as e:
+                    result.update(status="invalid", errors=e.detail)
+                    continue
+
+            pending[data["key"]] = (result, data)
+
+        try:
+            existing, created = self._bulk_insert(request.user, pending)
+        except IntegrityError:
+            # A concurrent upload of the same keys got there first
+            existing, created = self._bulk_insert(request.user, pending)
+
+        for key, pk in existing.items():
+            pending[key][0].update(status="exists", id=pk)
+        for entry in created:
+            pending[entry.client_key][0].update(status="created", id=entry.pk)
+
+        return Response({"results": results})
+
+    @transaction.atomic
+    def _bulk_insert(self, user, pending):
+        existing = dict(
+            Status.objects.filter(user=user, client_key__in=pending).values_list("client_key", "pk")
+        )
+        created = [
+            Status(
+                user=user,
+                client_key=key,
+                mood=data["mood"],
+                title=data.get("title"),
+                text=data.get("text"),
+                is_encrypted=is_pgp_message(data.get("text")),
+                timestamp=data.get("timestamp") or timezone.now(),
+            )
+            for key, (_, data) in pending.items()
+            if key not in existing
+        ]
+        if not created:
+            return existing, created
+
+        Status.objects.bulk_create(created)
+        if any(entry.pk is None for entry in created):
+            # Not every database returns the primary keys of inserted rows
+            ids = dict(
+                Status.objects.filter(
+                    user=user, client_key__in=[entry.client_key for entry in created]
+                ).values_list("client_key", "pk")
+            )
+            for entry in created:
+                entry.pk = ids[entry.client_key]
+
+        StatusActivity.objects.bulk_create(
+            StatusActivity(status=entry, activity=activity)
+            for entry in created
+            for activity in pending[entry.client_key][1]["activity_ids"]
+        )
+
+        # bulk_create does not send signals
+        statuses_created(user.pk, created)
+        sync.record_changes(user, "statuses", [entry.pk for entry in created])
+
+        return existing, created
+
     @action(
         detail=True,
         methods=["post"],
@@ -224,7 +474,9 @@ class StatusViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class HabitViewSet(viewsets.ModelViewSet):
+class HabitViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("habits",)
+    cursor_ordering = ("name", "id")
     serializer_class = HabitSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -235,7 +487,9 @@ class HabitViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class HabitLogViewSet(viewsets.ModelViewSet):
+class HabitLogViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("habit-logs",)
+    cursor_ordering = ("-date", "-id")
     serializer_class = HabitLogSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -243,7 +497,9 @@ class HabitLogViewSet(viewsets.ModelViewSet):
         return habit_log_queryset_for_request(self.request)
 
 
-class HealthParameterViewSet(viewsets.ModelViewSet):
+class HealthParameterViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("health-parameters",)
+    cursor_ordering = ("name", "id")
     serializer_class = HealthParameterSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -254,12 +510,18 @@ class HealthParameterViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class HealthLogViewSet(viewsets.ModelViewSet):
+class HealthLogViewSet(
+    ConditionalGetMixin, SparseQuerysetMixin, FastListMixin, viewsets.ModelViewSet
+):
+    version_scopes = ("health-logs", "health-parameters")
+    cursor_ordering = ("-recorded_at", "-id")
     serializer_class = HealthLogSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return HealthLog.objects.filter(user=self.request.user)
+        return HealthLog.objects.filter(user=self.request.user).prefetch_related(
+            "records__parameter"
+        )
 
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
@@ -270,7 +532,9 @@ class HealthLogViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class VaccinationViewSet(viewsets.ModelViewSet):
+class VaccinationViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("health-vaccinations",)
+    cursor_ordering = ("-administered_on", "-id")
     serializer_class = VaccinationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -281,23 +545,35 @@ class VaccinationViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class CBTRecordViewSet(viewsets.ModelViewSet):
+class CBTRecordViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("cbt-records",)
+    cursor_ordering = "-id"
     serializer_class = CBTRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return ThoughtRecord.objects.filter(user=self.request.user)
+        return (
+            ThoughtRecord.objects.filter(user=self.request.user)
+            .prefetch_related("emotions", "emotions_now")
+            .order_by("-pk")
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class DreamViewSet(viewsets.ModelViewSet):
+class DreamViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    version_scopes = ("dreams",)
+    cursor_ordering = ("-timestamp", "-id")
     serializer_class = DreamSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Dream.objects.filter(user=self.request.user).order_by("-timestamp")
+        return (
+            Dream.objects.filter(user=self.request.user)
+            .prefetch_related("dreammedia_set")
+            .order_by("-timestamp")
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -346,3 +622,90 @@ class DreamViewSet(viewsets.ModelViewSet):
         )
         attachment.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SyncView(APIView):
+    """Objects changed or deleted since a previous sync.
+
+    ``?since=<token>`` takes the token returned by the previous call. The
+    response lists the changed objects and the IDs of deleted ones per
+    collection, plus the token for the next call. Without a token, or with
+    one the server does not know, all objects are returned and ``reset`` is
+    set: the client should replace its local copy.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    viewsets = {
+        "moods": MoodViewSet,
+        "activities": ActivityViewSet,
+        "statuses": StatusViewSet,
+        "habits": HabitViewSet,
+        "habit-logs": HabitLogViewSet,
+        "health-parameters": HealthParameterViewSet,
+        "health-logs": HealthLogViewSet,
+        "health-vaccinations": VaccinationViewSet,
+        "cbt-records": CBTRecordViewSet,
+        "dreams": DreamViewSet,
+        "friends": PersonViewSet,
+    }
+
+    def get(self, request):
+        until = sync.current_sequence(request.user)
+        since = request.query_params.get("since")
+
+        if since is not None:
+            try:
+                since = sync.decode_token(since)
+            except ValueError as e:
+                raise ValidationError({"since": str(e)})
+
+        reset = since is None or since > until
+        if reset:
+            changed, deleted = dict.fromkeys(self.viewsets), {}
+        else:
+            changed, deleted = sync.changes_since(request.user, since, until)
+
+        changes = {}
+        for collection, ids in changed.items():
+            view = self.viewsets[collection](
+                request=request, format_kwarg=None, action="list", args=(), kwargs={}
+            )
+            queryset = view.get_queryset()
+            if ids is not None:
+                queryset = queryset.filter(pk__in=ids)
+            changes[collection] = view.get_serializer(queryset, many=True).data
+
+        return Response(
+            {
+                "token": sync.encode_token(until),
+                "reset": reset,
+                "changes": {collection: data for collection, data in changes.items() if data},
+                "deleted": deleted,
+            }
+        )
+
+
+class BatchView(APIView):
+    """Several API requests in one round-trip.
+
+    Takes ``operations``, a list of ``{"method", "path", "body"}`` objects with
+    paths like ``/api/statuses/``, and runs them in order as the authenticated
+    user. With ``atomic`` set, the batch stops at the first operation that
+    fails and none of its changes are kept. Returns the status code and body
+    of every operation that ran.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    batchable = False
+
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results, committed = batch.run_batch(
+            request,
+            serializer.validated_data["operations"],
+            atomic=serializer.validated_data["atomic"],
+        )
+        return Response({"results": results, "committed": committed})
@@ -1,5 +1,21 @@
 import uuid
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
 
 
 def get_upload_path(instance, filename):
     return "usermedia/{0}/{1}/{2}".format(instance.user.id, str(uuid.uuid4()), filename)
+
+
+def user_timezone(user):
+    """Return the time zone from the user's profile, or the current one."""
+    name = getattr(getattr(user, "userprofile", None), "timezone", None)
+
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+
+    return timezone.get_current_timezone()
@@ -0,0 +1,169 @@
+"""
+Process-wide cache of GnuPG homes holding users' public keys.
+
+Encrypting used to mean creating a temporary GnuPG home, running ``gpg`` to
+import the armoured key from the user's profile and running it again to
+encrypt. ``keyrings.keyring(pgp_key)`` imports every distinct key only once
+and hands out the same home for subsequent encryptions, so an encryption
+costs a single ``gpg`` call.
+
+Keyrings are keyed by a hash of the armoured key, so a changed profile key
+never hits a stale entry. The least recently used keyrings are evicted once
+more than ``CACHE_SIZE`` are held; a keyring still in use is only removed
+from disk after its last user is done with it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import gnupg
+
+CACHE_SIZE = 32
+
+
+class KeyImportError(Exception):
+    """Raised if no public key could be imported from the armoured text."""
+
+
+def _user_id(user) -> int:
+    return getattr(user, "pk", user)
+
+
+def _digest(pgp_key: str) -> str:
+    return hashlib.sha256(pgp_key.strip().encode()).hexdigest()
+
+
+class Keyring:
+    """A GnuPG home with one armoured key block imported."""
+
+    def __init__(self, pgp_key: str):
+        self._directory = tempfile.TemporaryDirectory(prefix="moodyduck-keyring-")
+        self._users = 0
+        self._evicted = False
+
+        try:
+            self.gpg = gnupg.GPG(gnupghome=self._directory.name)
+            self.gpg.encoding = "utf-8"
+            imported = self.gpg.import_keys(pgp_key)
+        except Exception:
+            self.close()
+            raise
+
+        if not imported.count:
+            self.close()
+            raise KeyImportError("No public keys imported")
+
+        self.fingerprints = list(imported.fingerprints)
+
+    def encrypt(self, plaintext, recipients=None):
+        """Encrypt to ``recipients``, or to the first imported key."""
+        return self.gpg.encrypt(
+            plaintext,
+            recipients=recipients or self.fingerprints[:1],
+            always_trust=True,
+        )
+
+    def close(self):
+        self._directory.cleanup()
+
+
+class KeyringCache:
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._keyrings: OrderedDict[str, Keyring] = OrderedDict()
+        self._owners: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keyrings)
+
+    @contextmanager
+    def keyring(self, pgp_key: str, user=None):
+        """Yield the ``Keyring`` for ``pgp_key``, importing it if needed.
+
+        Passing the ``user`` the key belongs to evicts the keyring of the key
+        they used before, once their profile key has changed.
+        """
+        digest = _digest(pgp_key)
+        keyring = self._acquire(digest, user)
+
+        if keyring is None:
+            # Imported outside of the lock, so other keys are not held up
+            created = Keyring(pgp_key)
+            keyring = self._insert(digest, created, user)
+            if keyring is not created:
+                created.close()
+
+        try:
+            yield keyring
+        finally:
+            self._release(keyring)
+
+    def forget(self, user, pgp_key=None):
+        """Evict the keyring last used for ``user``, unless it is for ``pgp_key``."""
+        with self._lock:
+            digest = self._owners.get(_user_id(user))
+            if digest is not None and (pgp_key is None or digest != _digest(pgp_key)):
+                self._evict(digest)
+
+    def clear(self):
+        with self._lock:
+            for digest in list(self._keyrings):
+                self._evict(digest)
+            self._owners.clear()
+
+    def _acquire(self, digest, user):
+        with self._lock:
+            self._own(digest, user)
+            keyring = self._keyrings.get(digest)
+            if keyring is not None:
+                self._keyrings.move_to_end(digest)
+                keyring._users += 1
+            return keyring
+
+    def _insert(self, digest, keyring, user):
+        with self._lock:
+            self._own(digest, user)
+            keyring = self._keyrings.setdefault(digest, keyring)
+            self._keyrings.move_to_end(digest)
+            keyring._users += 1
+
+            while len(self._keyrings) > self.size:
+                self._evict(next(iter(self._keyrings)))
+
+            return keyring
+
+    def _release(self, keyring):
+        with self._lock:
+            keyring._users -= 1
+            if keyring._evicted and not keyring._users:
+                keyring.close()
+
+    def _own(self, digest, user):
+        if user is None:
+            return
+
+        previous = self._owners.get(_user_id(user))
+        self._owners[_user_id(user)] = digest
+        if previous not in (None, digest):
+            self._evict(previous)
+
+    def _evict(self, digest):
+        keyring = self._keyrings.pop(digest, None)
+        if keyring is None:
+            return
+
+        self._owners = {
+            owner: owned for owner, owned in self._owners.items() if owned != digest
+        }
+        keyring._evicted = True
+        if not keyring._users:
+            keyring.close()
+
+
+keyrings = KeyringCache()
@@ -1 +1,25 @@
-# Create your models here.
+from django.db import models
+from django.contrib.auth import get_user_model
+
+
+class DataVersion(models.Model):
+    """Opaque per-user version token for a scope of data.
+
+    The token is replaced whenever data in the scope changes, so it can be used
+    to build cache keys and ETags. See ``moodyduck.common.versioning``.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope"], name="unique_data_version"
+            )
+        ]
+
+    user = models.ForeignKey(get_user_model(), models.CASCADE)
+    scope = models.CharField(max_length=64)
+    version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope} for {self.user}: {self.version}"
@@ -0,0 +1,101 @@
+"""
+Keyset pagination over (timestamp, id).
+
+Instead of an OFFSET, each page is selected relative to the last row of the
+previous one, so fetching a page deep into a long history costs the same as
+fetching the first one. Cursors are opaque strings encoding the timestamp (in
+microseconds since the epoch) and primary key of the boundary row.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(timestamp, pk) -> str:
+    return f"{(timestamp - EPOCH) // MICROSECOND}_{pk}"
+
+
+def decode_cursor(cursor: str):
+    """Return (timestamp, pk) from a cursor; raises ValueError if malformed."""
+    microseconds, pk = cursor.split("_")
+    return EPOCH + timedelta(microseconds=int(microseconds)), int(pk)
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str | None = None
+    previous_cursor: str | None = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """Paginates a queryset newest first by ``field`` and primary key."""
+
+    def __init__(self, queryset, per_page, field="timestamp"):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def page(self, after=None, before=None) -> KeysetPage:
+        """Return the page of rows older than ``after`` or newer than ``before``.
+
+        Without either cursor, the newest rows are returned.
+        """
+        queryset = self.queryset
+
+        if before:
+            timestamp, pk = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__gt": timestamp})
+                | Q(**{self.field: timestamp, "pk__gt": pk})
+            ).order_by(self.field, "pk")
+        else:
+            if after:
+                timestamp, pk = decode_cursor(after)
+                queryset = queryset.filter(
+                    Q(**{f"{self.field}__lt": timestamp})
+                    | Q(**{self.field: timestamp, "pk__lt": pk})
+                )
+            queryset = queryset.order_by(f"-{self.field}", "-pk")
+
+        rows = list(queryset[: self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if before:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, bool(after)
+
+        page = KeysetPage(rows)
+
+        if rows and has_next:
+            page.next_cursor = self._cursor(rows[-1])
+
+        if rows and has_previous:
+            page.previous_cursor = self._cursor(rows[0])
+
+        return page
@@ -0,0 +1,28 @@
+"""
+Lazy access to the plotting stack.
+
+HoloViews, Bokeh and pandas take a long time to import and use a lot of
+memory, so nothing imports them at module level. Chart code calls holoviews()
+instead, which imports the stack on first use and loads the Bokeh backend
+exactly once per process.
+"""
+
+from threading import Lock
+
+_lock = Lock()
+_initialized = False
+
+
+def holoviews():
+    """Return the holoviews module with the Bokeh backend loaded."""
+    global _initialized
+
+    import holoviews as hv
+
+    if not _initialized:
+        with _lock:
+            if not _initialized:
+                hv.extension("bokeh")
+                _initialized = True
+
+    return hv
@@ -2,13 +2,10 @@ from django import template
 
 from io import BytesIO
 
-import holoviews as hv
-
-from bokeh.embed import file_html
-from bokeh.resources import INLINE
-from bokeh.models.tools import PanTool, WheelZoomTool
+from moodyduck.common.plotting import holoviews
 
 import base64
+import json
 
 register = template.Library()
 
@@ -21,8 +18,9 @@ def pildata(image):
     return f"data:img/jpeg;base64,{content}"
 
 
-@register.simple_tag
-def bkhtml(bkobject, lock_y=False):
+def bkmodel(bkobject, lock_y=False):
+    from bokeh.models.tools import PanTool, WheelZoomTool
+
     if lock_y:
         pan_tool = bkobject.select(dict(type=PanTool))
         pan_tool.dimensions = "width"
@@ -30,7 +28,26 @@ def bkhtml(bkobject, lock_y=False):
         zoom_tool = bkobject.select(dict(type=WheelZoomTool))
         zoom_tool.dimensions = "width"
 
-    html = file_html(bkobject, INLINE)
+    return bkobject
+
+
+def hvmodel(hvobject, lock_y=True):
+    return bkmodel(holoviews().render(hvobject), lock_y)
+
+
+def bkjson(bkobject):
+    """Serialize a Bokeh object for Bokeh.embed.embed_item() on the client."""
+    from bokeh.embed import json_item
+
+    return json.dumps(json_item(bkobject))
+
+
+@register.simple_tag
+def bkhtml(bkobject, lock_y=False):
+    from bokeh.embed import file_html
+    from bokeh.resources import INLINE
+
+    html = file_html(bkmodel(bkobject, lock_y), INLINE)
     html = html.replace(
         "http://localhost:5006/static/extensions/panel/css",
         "/static/frontend/vendor/panel",
@@ -41,7 +58,7 @@ def bkhtml(bkobject, lock_y=False):
 
 @register.simple_tag
 def hvhtml(hvobject, lock_y=True):
-    return bkhtml(hv.render(hvobject), lock_y)
+    return bkhtml(hvmodel(hvobject, lock_y))
 
 
 @register.simple_tag
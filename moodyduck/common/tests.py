@@ -1 +1,171 @@
-# Create your tests here.
+import os
+import subprocess
+import sys
+from unittest import mock
+
+import gnupg
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from . import plotting
+from .keyring import KeyImportError, KeyringCache, keyrings
+
+# Throwaway ed25519 keys, used to test encryption
+ALICE_KEY = """-----BEGIN PGP PUBLIC KEY BLOCK-----
+
+mDMEatSPGBYJKwYBBAHaRw8BAQdAMkCsllv6f1KK/lDNoKN0g9VuudGcPWTum78B
+uv+MQCm0GWFsaWNlIDxhbGljZUBleGFtcGxlLmNvbT6IkAQTFggAOBYhBDl1tCKS
+1O97Feh8THCe67pD6tO4BQJq1I8YAhsjBQsJCAcCBhUKCQgLAgQWAgMBAh4BAheA
+AAoJEHCe67pD6tO4g0oA/20P0AaiAVMbfx0d5GSrwNdJLLIiaDjl1hc3jE7RdsrT
+AQDiEzntIQW3+XmxVs+NwSAo2hPfHQA41w7kgHUdXiswAbg4BGrUjxgSCisGAQQB
+l1UBBQEBB0D6rEEXzWpRZCHTPCQ552qriDDtsiYsFFTOtDAvoCrvHQMBCAeIeAQY
+FggAIBYhBDl1tCKS1O97Feh8THCe67pD6tO4BQJq1I8YAhsMAAoJEHCe67pD6tO4
+dGIA/3QqFOHwrHvdSsvJVc0zHaKHV9b2AdSk8FeD4HW6Kd+2AP4r8Ssi+KotO/Zn
+jlqGuDNj2JJ+bwU4Q6iZBUwbReMfAA==
+=A148
+-----END PGP PUBLIC KEY BLOCK-----
+"""
+
+BOB_KEY = """-----BEGIN PGP PUBLIC KEY BLOCK-----
+
+mDMEatSPGRYJKwYBBAHaRw8BAQdAXxI3FW3BnrEmNDjy+YidvNJ+lVuxUYbk+xIj
+HAshMue0FWJvYiA8Ym9iQGV4YW1wbGUuY29tPoiQBBMWCAA4FiEEOuJXxn8LFF1c
+bgp30LQNGcwEumgFAmrUjxkCGyMFCwkIBwIGFQoJCAsCBBYCAwECHgECF4AACgkQ
+0LQNGcwEumj2DgEAw1Spy/gcljY1Bct3Foh7zy24g6U7V8yQ1GlHpUuIqkMBALMl
+dBWu7tpNlmAQe9+WCbsH2navjUMagAo51YHmU/sCuDgEatSPGRIKKwYBBAGXVQEF
+AQEHQGRjyd0UxqcljAbCDLelcq48o0MeZU6nFfGos65/tQN4AwEIB4h4BBgWCAAg
+FiEEOuJXxn8LFF1cbgp30LQNGcwEumgFAmrUjxkCGwwACgkQ0LQNGcwEumiqYwEA
+nqapL0IvNqc2iqQl9Tuq08K/h0dBMFM5QabElCbosBQBALb00PFOo95/YmmdNlCC
+E4uf2/Qz1Td/6assfQD7yqsH
+=wB8m
+-----END PGP PUBLIC KEY BLOCK-----
+"""
+
+CAROL_KEY = """-----BEGIN PGP PUBLIC KEY BLOCK-----
+
+mDMEatSPRRYJKwYBBAHaRw8BAQdArRWEMmfvA1GeApx3Dp8s6xCKibTA4wqiy0pY
+OzMKu0+0GWNhcm9sIDxjYXJvbEBleGFtcGxlLmNvbT6IkAQTFggAOBYhBIoIv/aP
+dnGixGkGCsYogORmrEbsBQJq1I9FAhsjBQsJCAcCBhUKCQgLAgQWAgMBAh4BAheA
+AAoJEMYogORmrEbsJgsA/3iMs6ilWY62K3dyia1YuaVE7uE9HWCgtTh5USuY4gEr
+APwPmVjf7S9BXBkemLPa1N5MRk8XeeSejubmPtYtNMbIDLg4BGrUj0USCisGAQQB
+l1UBBQEBB0BwX6cWJTfX8bQnFmBl0ngFy1SWLhTYOfh7cErscMqRWAMBCAeIeAQY
+FggAIBYhBIoIv/aPdnGixGkGCsYogORmrEbsBQJq1I9FAhsMAAoJEMYogORmrEbs
+1bABAK9+EeoSwWIS9BSEu6RHyt/DJgeJu71Rc4xVwSRkR2ZpAP4iWTCB0C/XpS7M
+Ng9OdrRSywg2jXJUqBmXAKNwGC7MCg==
+=nkMp
+-----END PGP PUBLIC KEY BLOCK-----
+"""
+
+
+class PlottingTests(SimpleTestCase):
+    def test_startup_does_not_load_plotting_stack(self):
+        code = (
+            "import sys, django; django.setup();"
+            "from django.urls import get_resolver; get_resolver().url_patterns;"
+            "print(','.join(m for m in ('holoviews', 'bokeh', 'pandas')"
+            " if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="moodyduck.settings")
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH")])
+        )
+
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_extension_is_loaded_once(self):
+        import holoviews as hv
+
+        with (
+            mock.patch.object(plotting, "_initialized", False),
+            mock.patch.object(hv, "extension") as extension,
+        ):
+            self.assertIs(plotting.holoviews(), hv)
+            plotting.holoviews()
+
+        extension.assert_called_once_with("bokeh")
+
+
+class KeyringCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = KeyringCache(size=2)
+        self.addCleanup(self.cache.clear)
+
+    def test_key_is_imported_once(self):
+        with mock.patch.object(
+            gnupg.GPG, "import_keys", autospec=True, side_effect=gnupg.GPG.import_keys
+        ) as import_keys:
+            for _ in range(3):
+                with self.cache.keyring(ALICE_KEY, user=1) as keyring:
+                    encrypted = keyring.encrypt("Dear diary")
+
+                self.assertTrue(encrypted.ok)
+                self.assertTrue(str(encrypted).startswith("-----BEGIN PGP MESSAGE"))
+
+        import_keys.assert_called_once()
+
+    def test_invalid_key_is_not_cached(self):
+        with self.assertRaises(KeyImportError):
+            with self.cache.keyring("not a key"):
+                pass
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_keyring_is_evicted(self):
+        with self.cache.keyring(ALICE_KEY) as alice:
+            pass
+        with self.cache.keyring(BOB_KEY) as bob:
+            pass
+        with self.cache.keyring(ALICE_KEY):
+            pass
+
+        with self.cache.keyring(CAROL_KEY):
+            pass
+
+        self.assertEqual(len(self.cache), 2)
+        with self.cache.keyring(ALICE_KEY) as keyring:
+            self.assertIs(keyring, alice)
+
+        self.assertTrue(os.path.isdir(alice.gpg.gnupghome))
+        self.assertFalse(os.path.isdir(bob.gpg.gnupghome))
+
+    def test_keyring_in_use_is_removed_when_released(self):
+        with self.cache.keyring(ALICE_KEY, user=1) as alice:
+            with self.cache.keyring(BOB_KEY, user=1):
+                pass
+
+            # Replaced by the user's new key, but still usable
+            self.assertTrue(alice.encrypt("Dear diary").ok)
+
+        self.assertEqual(len(self.cache), 1)
+        self.assertFalse(os.path.isdir(alice.gpg.gnupghome))
+
+
+class KeyringProfileTests(TestCase):
+    def setUp(self):
+        self.addCleanup(keyrings.clear)
+
+    def test_changed_profile_key_evicts_keyring(self):
+        user = get_user_model().objects.create_user(username="keyring")
+        user.userprofile.pgp_key = ALICE_KEY
+        user.userprofile.save()
+
+        with keyrings.keyring(ALICE_KEY, user=user) as alice:
+            pass
+
+        user.userprofile.display_name = "Alice"
+        user.userprofile.save()
+        self.assertTrue(os.path.isdir(alice.gpg.gnupghome))
+
+        user.userprofile.pgp_key = BOB_KEY
+        user.userprofile.save()
+        self.assertFalse(os.path.isdir(alice.gpg.gnupghome))
@@ -0,0 +1,107 @@
+"""
+Per-user data version tokens.
+
+A version token identifies the state of some scope of a user's data (e.g. all
+mood entries). Writers call ``bump_version`` whenever the data changes; readers
+include the token in cache keys or ETags, so stale entries are simply never
+looked up again. Tokens are random rather than sequential, which means a
+rolled back transaction can never cause a token to be handed out twice.
+"""
+
+from __future__ import annotations
+
+from uuid import uuid4
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import DataVersion
+
+
+def _user_id(user) -> int:
+    return getattr(user, "pk", user)
+
+
+def _new_token() -> str:
+    return uuid4().hex
+
+
+def get_versions(user, *scopes: str) -> dict[str, str]:
+    """Return the current tokens of the given scopes ("" if never bumped)."""
+    versions = dict(
+        DataVersion.objects.filter(
+            user_id=_user_id(user), scope__in=scopes
+        ).values_list("scope", "version")
+    )
+    return {scope: versions.get(scope, "") for scope in scopes}
+
+
+def get_versions_modified(user, *scopes: str):
+    """Return ``get_versions`` and ``last_modified`` of the scopes in one query."""
+    versions, modified = dict.fromkeys(scopes, ""), None
+
+    for scope, version, updated_at in DataVersion.objects.filter(
+        user_id=_user_id(user), scope__in=scopes
+    ).values_list("scope", "version", "updated_at"):
+        versions[scope] = version
+        if modified is None or updated_at > modified:
+            modified = updated_at
+
+    return versions, modified
+
+
+def get_version(user, scope: str) -> str:
+    return get_versions(user, scope)[scope]
+
+
+def last_modified(user, *scopes: str):
+    """Return the most recent time any of the given scopes was bumped, if ever."""
+    return (
+        DataVersion.objects.filter(user_id=_user_id(user), scope__in=scopes)
+        .order_by("-updated_at")
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+
+
+def bump_version(user, *scopes: str) -> None:
+    """Replace the tokens of the given scopes with fresh ones."""
+    user_id = _user_id(user)
+
+    for scope in scopes:
+        if not DataVersion.objects.filter(user_id=user_id, scope=scope).update(
+            version=_new_token(), updated_at=timezone.now()
+        ):
+            _create_version(user_id, scope, _new_token())
+
+
+def swap_version(user, scope: str, expected: str) -> str | None:
+    """Replace the token of a scope only if it still equals ``expected``.
+
+    Returns the new token on success. On failure the scope is bumped anyway
+    (somebody else changed it in the meantime) and None is returned.
+    """
+    user_id = _user_id(user)
+    token = _new_token()
+
+    if expected:
+        swapped = DataVersion.objects.filter(
+            user_id=user_id, scope=scope, version=expected
+        ).update(version=token, updated_at=timezone.now())
+    else:
+        swapped = _create_version(user_id, scope, token)
+
+    if swapped:
+        return token
+
+    bump_version(user_id, scope)
+    return None
+
+
+def _create_version(user_id: int, scope: str, token: str) -> bool:
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(user_id=user_id, scope=scope, version=token)
+    except IntegrityError:
+        return False
+    return True
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_encrypted(apps, schema_editor):
+    Dream = apps.get_model("dreams", "Dream")
+    Dream.objects.filter(content__startswith="-----BEGIN PGP MESSAGE-----").update(
+        is_encrypted=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dreams", "0003_alter_theme_icon_alter_themerating_icon"),
+        ("mood", "0010_status_is_encrypted"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dream",
+            name="is_encrypted",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="dream",
+            index=models.Index(
+                fields=["user", "is_encrypted"], name="dreams_dream_user_enc_idx"
+            ),
+        ),
+        migrations.RunPython(mark_encrypted, migrations.RunPython.noop),
+    ]
@@ -6,7 +6,7 @@ from django.utils.translation import gettext_lazy as _
 
 import os.path
 
-from moodyduck.mood.models import Mood
+from moodyduck.mood.models import Mood, is_pgp_message
 from moodyduck.common.helpers import get_upload_path
 
 from colorfield.fields import ColorField
@@ -23,6 +23,13 @@ class Theme(models.Model):
 
 
 class Dream(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "is_encrypted"], name="dreams_dream_user_enc_idx"
+            )
+        ]
+
     class DreamTypes(models.IntegerChoices):
         NIGHT = 0, _("Night (main) sleep")
         DAY = 1, _("Daydream")
@@ -36,11 +43,22 @@ class Dream(models.Model):
     mood = models.ForeignKey(Mood, models.SET_NULL, null=True)
     lucid = models.BooleanField(default=False)
     wet = models.BooleanField(default=False)
+    # Whether content is PGP armoured, kept up to date by save()
+    is_encrypted = models.BooleanField(default=False, editable=False)
 
     @property
     def short_text(self):
         return self.title or self.content[:64]
 
+    def save(self, *args, **kwargs):
+        self.is_encrypted = is_pgp_message(self.content)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "is_encrypted"}
+
+        super().save(*args, **kwargs)
+
     @property
     def theme_set(self):
         return [theme.theme for theme in self.dreamtheme_set.all()]
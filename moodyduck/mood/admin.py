@@ -5,7 +5,9 @@ from .models import (
     ActivityCategory,
     Aspect,
     AspectRating,
+    DailyMoodRollup,
     Mood,
+    MoodStreak,
     Status,
     StatusActivity,
     StatusAspectRating,
@@ -79,6 +81,20 @@ class AspectRatingAdmin(admin.ModelAdmin):
     search_fields = ("name",)
 
 
+@admin.register(DailyMoodRollup)
+class DailyMoodRollupAdmin(admin.ModelAdmin):
+    list_display = ("date", "user", "count", "mood_count", "mood_sum")
+    list_filter = ("user",)
+    date_hierarchy = "date"
+    raw_id_fields = ("user",)
+
+
+@admin.register(MoodStreak)
+class MoodStreakAdmin(admin.ModelAdmin):
+    list_display = ("user", "current", "longest", "last_date")
+    raw_id_fields = ("user",)
+
+
 admin.site.register(StatusMedia)
 admin.site.register(StatusActivity)
 admin.site.register(StatusAspectRating)
@@ -0,0 +1,172 @@
+"""
+Aggregation and downsampling of mood series.
+
+Works on the columnar MoodSeries: entries are assigned to calendar buckets with
+``searchsorted`` and aggregated with ``ufunc.reduceat``, and raw points are
+downsampled with Largest-Triangle-Three-Buckets. Both produce output whose size
+depends only on the requested range and resolution, not on the number of
+entries.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+
+from .timeseries import EPOCH, epoch
+
+INTERVALS = ("hour", "day", "week", "month")
+MAX_BUCKETS = 10000
+
+
+def _floor(local, interval):
+    if interval == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+
+    if interval == "month":
+        return day.replace(day=1)
+
+    return day
+
+
+def _next(local, interval):
+    if interval == "day":
+        return local + timedelta(days=1)
+
+    if interval == "week":
+        return local + timedelta(weeks=1)
+
+    if local.month == 12:
+        return local.replace(year=local.year + 1, month=1)
+
+    return local.replace(month=local.month + 1)
+
+
+def bucket_edges(start, end, interval, tz):
+    """Return the boundaries of the calendar buckets covering start to end.
+
+    Days, weeks (starting on Monday) and months follow the wall clock of the
+    given time zone, so buckets spanning a DST change are 23 or 25 hours long.
+    Hours are real hours. The result has one more element than there are
+    buckets; a ValueError is raised if there would be more than MAX_BUCKETS.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+
+    if interval == "hour":
+        # Aware arithmetic follows the wall clock, so step through UTC instead
+        first = start.astimezone(tz).replace(minute=0, second=0, microsecond=0)
+        first = first.astimezone(dt_timezone.utc)
+        count = int((end - first) // timedelta(hours=1)) + 1
+
+        if count > MAX_BUCKETS:
+            raise ValueError("Too many buckets, use a longer interval.")
+
+        return [
+            (first + timedelta(hours=hour)).astimezone(tz) for hour in range(count + 1)
+        ]
+
+    # Walk the naive wall clock and attach the zone to every edge separately
+    local = _floor(start.astimezone(tz).replace(tzinfo=None), interval)
+    edges = [local.replace(tzinfo=tz)]
+
+    while edges[-1] <= end:
+        if len(edges) > MAX_BUCKETS:
+            raise ValueError("Too many buckets, use a longer interval.")
+
+        local = _next(local, interval)
+        edges.append(local.replace(tzinfo=tz))
+
+    return edges
+
+
+def aggregate(series, edges):
+    """Count, mean, min and max of the values in each bucket.
+
+    Returns a dict of arrays with one element per bucket; mean, min and max
+    are NaN for empty buckets.
+    """
+    bounds = np.searchsorted(
+        series.timestamps, np.fromiter((epoch(edge) for edge in edges), np.int64)
+    )
+    counts = np.diff(bounds)
+    buckets = len(counts)
+
+    result = {
+        "count": counts,
+        "mean": np.full(buckets, np.nan),
+        "min": np.full(buckets, np.nan),
+        "max": np.full(buckets, np.nan),
+    }
+
+    filled = counts > 0
+    if not filled.any():
+        return result
+
+    # Empty buckets have no width, so the start of each filled bucket is also
+    # the end of the previous one - exactly the segments reduceat expects
+    values = series.values[: bounds[-1]].astype(np.float64)
+    starts = bounds[:-1][filled]
+
+    result["mean"][filled] = np.add.reduceat(values, starts) / counts[filled]
+    result["min"][filled] = np.minimum.reduceat(values, starts)
+    result["max"][filled] = np.maximum.reduceat(values, starts)
+
+    return result
+
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Always keeps the first and last point and one point out of each of
+    ``threshold - 2`` equally sized buckets in between: the one forming the
+    largest triangle with the previously kept point and the average of the
+    next bucket.
+    """
+    length = len(x)
+
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    every = (length - 2) / (threshold - 2)
+    edges = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges = np.append(edges, length)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        next_low, next_high = edges[bucket + 1], edges[bucket + 2]
+
+        average_x = x[next_low:next_high].mean()
+        average_y = y[next_low:next_high].mean()
+
+        areas = np.abs(
+            (x[previous] - average_x) * (y[low:high] - y[previous])
+            - (x[previous] - x[low:high]) * (average_y - y[previous])
+        )
+
+        previous = low + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def downsample(series, threshold):
+    """Return the series reduced to at most ``threshold`` points with LTTB."""
+    return series[lttb(series.timestamps, series.values, threshold)]
+
+
+def to_datetime(microseconds, tz):
+    """Convert a series timestamp back to an aware datetime in the given zone."""
+    return (EPOCH + timedelta(microseconds=int(microseconds))).astimezone(tz)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MoodConfig(AppConfig):
     name = "moodyduck.mood"
+
+    def ready(self):
+        # Keep the daily rollups in sync with Status writes
+        from . import handler  # noqa: F401
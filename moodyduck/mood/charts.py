@@ -0,0 +1,48 @@
+"""
+Render cache for the mood statistics charts.
+
+Rendered charts are cached under a key made of the user, the chart and its
+parameters, the user's "mood-charts" version token and the current date (the
+charts are relative to today). The version token is replaced by the signal
+handlers whenever a Status, StatusActivity or Mood of the user changes.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from moodyduck.common.versioning import bump_version, get_version
+
+SCOPE = "mood-charts"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def chart_key(user, name, *params):
+    parts = [
+        str(user.pk),
+        name,
+        *(str(param) for param in params),
+        get_version(user, SCOPE),
+        timezone.localdate().isoformat(),
+    ]
+    return "mood:chart:" + ":".join(parts)
+
+
+def chart_etag(key):
+    return '"%s"' % hashlib.sha256(key.encode()).hexdigest()[:40]
+
+
+def cached_chart(key, render):
+    """Return the cached output for key, calling render() on a miss."""
+    output = cache.get(key)
+
+    if output is None:
+        output = render()
+        cache.set(key, output, CACHE_TIMEOUT)
+
+    return output
+
+
+def invalidate(user):
+    bump_version(user, SCOPE)
@@ -0,0 +1,109 @@
+"""
+Values for the mood cards on the dashboard.
+
+All cards are computed together by dashboard_stats() in a fixed number of
+aggregate queries. The result is memoised on the request, so the template tags
+can ask for one value each without repeating any work, and cached across
+requests under the user's version tokens and the current date.
+"""
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Q, Sum
+from django.db.models.functions import Abs
+from django.utils import timezone
+
+from moodyduck.common.versioning import get_versions
+
+from . import charts
+from .models import Activity, DailyMoodRollup, Mood
+from .rollups import day_bounds
+from .streaks import current_length, get_streak
+
+#: Version scope bumped whenever an activity changes (names and icons are shown)
+ACTIVITY_SCOPE = "mood-activities"
+SCOPES = (charts.SCOPE, ACTIVITY_SCOPE)
+CACHE_TIMEOUT = 60 * 60 * 24
+WEEK = 7
+
+
+def closest_mood(user, value):
+    """Return the user's mood whose value is closest to the given one."""
+    if not value:
+        return None
+
+    return (
+        Mood.objects.filter(user=user)
+        .annotate(distance=Abs(F("value") - value))
+        .order_by("distance", "-value")
+        .first()
+    )
+
+
+def most_common_activity(user, start, end):
+    """Return (activity, count) for the activity used most between start and end."""
+    activity = (
+        Activity.objects.filter(
+            user=user,
+            statusactivity__status__user=user,
+            statusactivity__status__timestamp__gte=start,
+            statusactivity__status__timestamp__lte=end,
+        )
+        .annotate(count=Count("statusactivity"))
+        .order_by("-count", "name")
+        .first()
+    )
+
+    return (activity, activity.count) if activity else None
+
+
+def _compute(user, today):
+    start = today - timedelta(days=WEEK)
+
+    aggregates = DailyMoodRollup.objects.filter(user=user).aggregate(
+        total=Sum("count"),
+        average=Avg(
+            ExpressionWrapper(
+                F("mood_sum") * 1.0 / F("mood_count"), output_field=FloatField()
+            ),
+            filter=Q(date__gte=start, date__lte=today, mood_count__gt=0),
+        ),
+    )
+
+    streak = get_streak(user.pk)
+
+    return {
+        "total": aggregates["total"] or 0,
+        "current_streak": current_length(streak, today),
+        "longest_streak": streak.longest,
+        "average_weekly": aggregates["average"],
+        "closest_mood": closest_mood(user, aggregates["average"]),
+        "most_common_activity_weekly": most_common_activity(
+            user,
+            day_bounds(start)[0],
+            day_bounds(today)[1] - timedelta(microseconds=1),
+        ),
+    }
+
+
+def dashboard_stats(user, request=None):
+    """Return the values of all mood dashboard cards of a user."""
+    if request is not None and hasattr(request, "_mood_dashboard_stats"):
+        return request._mood_dashboard_stats
+
+    today = timezone.localdate()
+    versions = get_versions(user, *SCOPES)
+    key = "mood:dashboard:{}:{}:{}".format(
+        user.pk, ":".join(versions[scope] for scope in SCOPES), today.isoformat()
+    )
+
+    stats = cache.get(key)
+    if stats is None:
+        stats = _compute(user, today)
+        cache.set(key, stats, CACHE_TIMEOUT)
+
+    if request is not None:
+        request._mood_dashboard_stats = stats
+
+    return stats
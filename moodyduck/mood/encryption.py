@@ -0,0 +1,208 @@
+"""
+Bulk encryption of existing entries in the background.
+
+``start`` creates (or restarts) a user's ``EncryptionJob``; ``run`` then works
+through their unencrypted entries in chunks of ``CHUNK_SIZE`` rows. The rows
+of a chunk are encrypted concurrently - every encryption is a ``gpg``
+subprocess, so a small thread pool is enough to keep several busy - and
+written back with a single ``bulk_update``, together with the progress of
+the job. A run stops once its deadline has passed and the job is picked up
+again by the next ``cron`` run, so large diaries never hold up a request.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from moodyduck.common.keyring import KeyImportError, keyrings
+
+from .models import EncryptionJob
+from .signals import entries_encrypted
+
+CHUNK_SIZE = 100
+WORKERS = 4
+
+# How long a cron run, or the request starting a job, may spend encrypting
+CRON_BUDGET = timedelta(seconds=30)
+REQUEST_BUDGET = timedelta(seconds=5)
+
+# A running job not updated for this long was interrupted and can be resumed
+STALE_AFTER = timedelta(minutes=5)
+
+# Models with encryptable text, and the field holding it
+TARGETS = [
+    ("moodyduck.mood", "mood.Status", "text"),
+    ("moodyduck.dreams", "dreams.Dream", "content"),
+]
+
+logger = logging.getLogger(__name__)
+
+
+def targets():
+    for app, model, field in TARGETS:
+        if apps.is_installed(app):
+            yield apps.get_model(model), field
+
+
+def unencrypted(model, field, user):
+    return (
+        model.objects.filter(user=user, is_encrypted=False)
+        .exclude(**{f"{field}__isnull": True})
+        .exclude(**{field: ""})
+    )
+
+
+def unencrypted_count(user):
+    return sum(unencrypted(model, field, user).count() for model, field in targets())
+
+
+def start(user):
+    """Queue the encryption of all of ``user``'s unencrypted entries."""
+    job, _ = EncryptionJob.objects.update_or_create(
+        user=user,
+        defaults={
+            "state": EncryptionJob.States.PENDING,
+            "total": unencrypted_count(user),
+            "done": 0,
+            "cursors": {},
+            "error": "",
+        },
+    )
+    return job
+
+
+def _claim(job):
+    stale = timezone.now() - STALE_AFTER
+    return EncryptionJob.objects.filter(
+        Q(state=EncryptionJob.States.PENDING)
+        | Q(state=EncryptionJob.States.RUNNING, updated_at__lt=stale),
+        pk=job.pk,
+    ).update(state=EncryptionJob.States.RUNNING, updated_at=timezone.now())
+
+
+def _finish(job, state, error=""):
+    job.state = state
+    job.error = error
+    job.save(update_fields=["state", "error", "updated_at"])
+
+
+def _encrypt_chunk(job, keyring, pool, model, field, rows):
+    results = list(pool.map(keyring.encrypt, [getattr(row, field) for row in rows]))
+
+    encrypted, error = [], None
+    for row, result in zip(rows, results):
+        if not result.ok:
+            logger.error(
+                "Error encrypting %s %s: %s",
+                model._meta.model_name,
+                row.pk,
+                result.status,
+            )
+            error = error or f"Error encrypting entry: {result.status}"
+            continue
+
+        encrypted.append((row, str(result)))
+
+    with transaction.atomic():
+        # Leave entries alone that were edited while they were being encrypted
+        current = dict(
+            model.objects.select_for_update()
+            .filter(pk__in=[row.pk for row, _ in encrypted])
+            .values_list("pk", field)
+        )
+        updated = []
+        for row, text in encrypted:
+            if current.get(row.pk) == getattr(row, field):
+                setattr(row, field, text)
+                row.is_encrypted = True
+                updated.append(row)
+
+        model.objects.bulk_update(updated, [field, "is_encrypted"])
+
+        job.done += len(updated)
+        job.cursors[model._meta.label_lower] = rows[-1].pk
+        job.save(update_fields=["done", "cursors", "updated_at"])
+
+        if updated:
+            entries_encrypted.send(
+                model, user_id=job.user_id, pks=[row.pk for row in updated]
+            )
+
+    return error
+
+
+def run(job, deadline=None):
+    """Work on ``job`` until it is done or ``deadline`` has passed.
+
+    Returns False if the job is already being run elsewhere.
+    """
+    if not _claim(job):
+        return False
+
+    job.refresh_from_db()
+    pgp_key = job.user.userprofile.pgp_key
+
+    if not pgp_key:
+        _finish(job, EncryptionJob.States.FAILED, "No PGP key in your profile.")
+        return True
+
+    try:
+        with (
+            keyrings.keyring(pgp_key, user=job.user) as keyring,
+            ThreadPoolExecutor(WORKERS) as pool,
+        ):
+            for model, field in targets():
+                while True:
+                    if deadline and timezone.now() >= deadline:
+                        # Continued by the next run
+                        _finish(job, EncryptionJob.States.PENDING)
+                        return True
+
+                    cursor = job.cursors.get(model._meta.label_lower, 0)
+                    rows = list(
+                        unencrypted(model, field, job.user)
+                        .filter(pk__gt=cursor)
+                        .order_by("pk")
+                        .only("pk", field)[:CHUNK_SIZE]
+                    )
+                    if not rows:
+                        break
+
+                    error = _encrypt_chunk(job, keyring, pool, model, field, rows)
+                    if error:
+                        _finish(job, EncryptionJob.States.FAILED, error)
+                        return True
+
+    except KeyImportError:
+        _finish(
+            job,
+            EncryptionJob.States.FAILED,
+            "Could not import your stored PGP key. Please check the key in your profile settings.",
+        )
+        return True
+    except OSError as e:
+        logger.exception("Error running encryption job %s", job.pk)
+        _finish(job, EncryptionJob.States.FAILED, str(e))
+        return True
+
+    _finish(job, EncryptionJob.States.DONE)
+    return True
+
+
+def run_pending(deadline=None):
+    """Run the queued and interrupted jobs, oldest first."""
+    stale = timezone.now() - STALE_AFTER
+    jobs = EncryptionJob.objects.filter(
+        Q(state=EncryptionJob.States.PENDING)
+        | Q(state=EncryptionJob.States.RUNNING, updated_at__lt=stale)
+    ).order_by("updated_at")
+
+    for job in jobs:
+        if deadline and timezone.now() >= deadline:
+            break
+        run(job, deadline)
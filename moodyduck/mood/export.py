@@ -0,0 +1,95 @@
+"""
+Streaming CSV export of mood entries.
+
+Rows are read with a chunked server-side iterator and written out as they come,
+so memory use does not depend on the size of the exported range.
+"""
+
+import csv
+import zlib
+
+from itertools import islice
+
+from .models import Status, StatusActivity
+
+CHUNK_SIZE = 2000
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class Echo:
+    """File-like object handing written lines back to the csv writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _activities(status_ids):
+    names = {}
+
+    for status_id, name in (
+        StatusActivity.objects.filter(status_id__in=status_ids)
+        .order_by("activity__name")
+        .values_list("status_id", "activity__name")
+    ):
+        names.setdefault(status_id, []).append(name)
+
+    return names
+
+
+def csv_rows(user, start=None, end=None, activities=False):
+    """Yield the CSV lines for the user's mood entries with start <= ts < end.
+
+    Both bounds are optional. With ``activities``, an extra column lists the
+    names of the entry's activities, separated by "|".
+    """
+    writer = csv.writer(Echo(), lineterminator="\n")
+
+    entries = Status.objects.filter(user=user, mood__isnull=False)
+
+    if start is not None:
+        entries = entries.filter(timestamp__gte=start)
+
+    if end is not None:
+        entries = entries.filter(timestamp__lt=end)
+
+    rows = (
+        entries.order_by("timestamp", "id")
+        .values_list("id", "timestamp", "mood__value")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    yield writer.writerow(
+        ["date", "value", "activities"] if activities else ["date", "value"]
+    )
+
+    for chunk in _chunks(rows, CHUNK_SIZE):
+        names = _activities([row[0] for row in chunk]) if activities else {}
+        lines = []
+
+        for status_id, timestamp, value in chunk:
+            line = [timestamp.strftime(DATE_FORMAT), value]
+
+            if activities:
+                line.append("|".join(names.get(status_id, ())))
+
+            lines.append(writer.writerow(line))
+
+        yield "".join(lines)
+
+
+def gzip_stream(chunks):
+    """Compress a stream of strings into a stream of gzip data."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+
+    for chunk in chunks:
+        if data := compressor.compress(chunk.encode()):
+            yield data
+
+    yield compressor.flush()
@@ -0,0 +1,161 @@
+"""Signal handlers keeping derived mood data in sync with Status writes."""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from moodyduck.common.versioning import bump_version
+from moodyduck.cronhandler.signals import cron
+
+from . import charts, dashboard, encryption, streaks, timeseries
+from .models import Activity, Mood, Status, StatusActivity
+from .rollups import rebuild_rollups, rollup_date, update_daily_rollup
+
+
+def _update_day(user_id, date):
+    if update_daily_rollup(user_id, date) is None:
+        streaks.day_removed(user_id, date)
+    else:
+        streaks.day_added(user_id, date)
+
+
+def statuses_created(user_id, statuses):
+    """Update derived data for statuses inserted without signals (bulk_create)."""
+    if not statuses:
+        return
+
+    timeseries.invalidate(user_id)
+    charts.invalidate(user_id)
+
+    for date in sorted({rollup_date(status.timestamp) for status in statuses}):
+        _update_day(user_id, date)
+
+
+@receiver(pre_save, sender=Status)
+def remember_previous_date(sender, instance, raw=False, **kwargs):
+    instance._previous_rollup_date = None
+
+    if raw or instance._state.adding or not instance.pk:
+        return
+
+    previous = (
+        Status.objects.filter(pk=instance.pk)
+        .values_list("timestamp", flat=True)
+        .first()
+    )
+    if previous is not None:
+        instance._previous_rollup_date = rollup_date(previous)
+
+
+@receiver(post_save, sender=Status)
+def status_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created:
+        timeseries.status_created(instance)
+    else:
+        timeseries.invalidate(instance.user_id)
+
+    charts.invalidate(instance.user_id)
+
+    date = rollup_date(instance.timestamp)
+    _update_day(instance.user_id, date)
+
+    previous = getattr(instance, "_previous_rollup_date", None)
+    if previous and previous != date:
+        _update_day(instance.user_id, previous)
+
+
+@receiver(post_delete, sender=Status)
+def status_deleted(sender, instance, origin=None, **kwargs):
+    # The rollups are going away together with the user, no need to update them
+    if isinstance(origin, get_user_model()):
+        return
+
+    timeseries.invalidate(instance.user_id)
+    charts.invalidate(instance.user_id)
+    _update_day(instance.user_id, rollup_date(instance.timestamp))
+
+
+@receiver(pre_save, sender=Mood)
+def remember_previous_value(sender, instance, raw=False, **kwargs):
+    instance._previous_value = None
+
+    if raw or instance._state.adding or not instance.pk:
+        return
+
+    instance._previous_value = (
+        Mood.objects.filter(pk=instance.pk).values_list("value", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Mood)
+def mood_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+
+    # Names and colours show up in the charts as well
+    charts.invalidate(instance.user_id)
+
+    # A new mood has no entries yet, and only the value feeds into the rollups
+    if created:
+        return
+
+    previous = getattr(instance, "_previous_value", None)
+    if previous is not None and previous != instance.value:
+        timeseries.invalidate(instance.user_id)
+        rebuild_rollups(instance.user)
+
+
+@receiver(post_delete, sender=Mood)
+def mood_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, get_user_model()):
+        return
+
+    # Entries are detached from the mood without signals, so start over
+    timeseries.invalidate(instance.user_id)
+    charts.invalidate(instance.user_id)
+    rebuild_rollups(instance.user)
+
+
+@receiver(post_save, sender=StatusActivity)
+def status_activity_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    charts.invalidate(instance.status.user_id)
+
+
+@receiver(post_delete, sender=StatusActivity)
+def status_activity_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the status or the user takes care of the charts already
+    if isinstance(origin, (Status, get_user_model())):
+        return
+
+    if isinstance(origin, Activity):
+        charts.invalidate(origin.user_id)
+    else:
+        charts.invalidate(instance.status.user_id)
+
+
+@receiver(post_save, sender=Activity)
+def activity_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    bump_version(instance.user_id, dashboard.ACTIVITY_SCOPE)
+
+
+@receiver(post_delete, sender=Activity)
+def activity_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, get_user_model()):
+        return
+
+    bump_version(instance.user_id, dashboard.ACTIVITY_SCOPE)
+
+
+@receiver(cron)
+def run_encryption_jobs(sender, **kwargs):
+    encryption.run_pending(deadline=timezone.now() + encryption.CRON_BUDGET)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from moodyduck.mood import encryption
+from moodyduck.mood.models import EncryptionJob
+
+
+class Command(BaseCommand):
+    help = "Run queued encryption jobs to completion instead of waiting for cron"
+
+    def handle(self, *args, **options):
+        encryption.run_pending()
+
+        for job in EncryptionJob.objects.select_related("user"):
+            self.stdout.write(
+                'Encrypted %d of %d entries for user "%s" (%s)'
+                % (job.done, job.total, job.user.username, job.get_state_display())
+            )
+
+        self.stdout.write(self.style.SUCCESS("Finished encryption jobs"))
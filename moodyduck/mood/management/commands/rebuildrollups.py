@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from moodyduck.mood.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily mood rollups from existing mood entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Only rebuild the rollups of these users (default: all users)",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+            missing = set(options["usernames"]) - set(
+                users.values_list("username", flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    'User "%s" does not exist' % ", ".join(sorted(missing))
+                )
+
+        for user in users.iterator():
+            days = rebuild_rollups(user)
+            self.stdout.write('Rebuilt %d days for user "%s"' % (days, user.username))
+
+        self.stdout.write(self.style.SUCCESS("Successfully rebuilt mood rollups"))
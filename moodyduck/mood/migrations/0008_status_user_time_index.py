@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mood", "0007_moodstreak"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="status",
+            index=models.Index(
+                fields=["user", "timestamp", "id"], name="mood_status_user_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_encrypted(apps, schema_editor):
+    Status = apps.get_model("mood", "Status")
+    Status.objects.filter(text__startswith="-----BEGIN PGP MESSAGE-----").update(
+        is_encrypted=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mood", "0009_status_client_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EncryptionJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "state",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Pending"),
+                            (1, "Running"),
+                            (2, "Done"),
+                            (3, "Failed"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("done", models.PositiveIntegerField(default=0)),
+                ("cursors", models.JSONField(default=dict)),
+                ("error", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="status",
+            name="is_encrypted",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="status",
+            index=models.Index(
+                fields=["user", "is_encrypted"], name="mood_status_user_enc_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="encryptionjob",
+            name="user",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.RunPython(mark_encrypted, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,12 @@ from colorfield.fields import ColorField
 
 from moodyduck.common.helpers import get_upload_path
 
+PGP_MESSAGE_HEADER = "-----BEGIN PGP MESSAGE-----"
+
+
+def is_pgp_message(text):
+    return bool(text) and text.startswith(PGP_MESSAGE_HEADER)
+
 
 class Mood(models.Model):
     class Meta:
@@ -29,20 +35,42 @@ class Mood(models.Model):
 class Status(models.Model):
     class Meta:
         ordering = ["timestamp"]
+        indexes = [
+            models.Index(
+                fields=["user", "timestamp", "id"], name="mood_status_user_time_idx"
+            ),
+            models.Index(
+                fields=["user", "is_encrypted"], name="mood_status_user_enc_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "client_key"], name="unique_status_client_key"
+            )
+        ]
 
     user = models.ForeignKey(get_user_model(), models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now)
     mood = models.ForeignKey(Mood, models.SET_NULL, null=True)
     title = models.CharField(max_length=64, null=True, blank=True)
     text = models.TextField(null=True, blank=True)
+    # Idempotency key of entries uploaded in bulk by offline clients
+    client_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    # Whether text is PGP armoured, kept up to date by save()
+    is_encrypted = models.BooleanField(default=False, editable=False)
 
     @property
     def short_text(self):
         return self.title or (self.text[:64] if not self.is_encrypted else "")
 
-    @property
-    def is_encrypted(self):
-        return bool(self.text) and self.text.startswith("-----BEGIN PGP MESSAGE-----")
+    def save(self, *args, **kwargs):
+        self.is_encrypted = is_pgp_message(self.text)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "text" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "is_encrypted"}
+
+        super().save(*args, **kwargs)
 
     @property
     def activity_set(self):
@@ -112,3 +140,88 @@ class StatusAspectRating(models.Model):
     status = models.ForeignKey(Status, models.CASCADE)
     aspect_rating = models.ForeignKey(AspectRating, models.SET_NULL, null=True)
     comment = models.TextField(null=True, blank=True)
+
+
+class DailyMoodRollup(models.Model):
+    """Per-user, per-day aggregate of mood entries.
+
+    Maintained by the signal handlers in ``moodyduck.mood.handler`` so that the
+    dashboard does not have to walk individual Status rows.
+    """
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date"], name="unique_daily_mood_rollup"
+            )
+        ]
+
+    user = models.ForeignKey(get_user_model(), models.CASCADE)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    mood_sum = models.PositiveIntegerField(default=0)
+    mood_count = models.PositiveIntegerField(default=0)
+    mood_tallies = models.JSONField(default=dict)
+
+    @property
+    def average(self):
+        return (self.mood_sum / self.mood_count) if self.mood_count else None
+
+    def __str__(self):
+        return f"{self.user} on {self.date}"
+
+
+class MoodStreak(models.Model):
+    """Cached streak of consecutive days with entries for a user.
+
+    ``current`` is the length of the most recent streak, which ended on
+    ``last_date`` - it only counts as ongoing if that is today or yesterday.
+    Maintained by ``moodyduck.mood.streaks`` from the daily rollups.
+    """
+
+    user = models.OneToOneField(get_user_model(), models.CASCADE)
+    current = models.PositiveIntegerField(default=0)
+    longest = models.PositiveIntegerField(default=0)
+    last_date = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user}: {self.current} days"
+
+
+class EncryptionJob(models.Model):
+    """Background encryption of a user's existing entries.
+
+    Run in chunks by ``moodyduck.mood.encryption``; ``cursors`` holds the
+    highest primary key processed so far per model, so an interrupted job
+    picks up where it left off.
+    """
+
+    class States(models.IntegerChoices):
+        PENDING = 0
+        RUNNING = 1
+        DONE = 2
+        FAILED = 3
+
+    user = models.OneToOneField(get_user_model(), models.CASCADE)
+    state = models.IntegerField(choices=States.choices, default=States.PENDING)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    cursors = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def active(self):
+        return self.state in (self.States.PENDING, self.States.RUNNING)
+
+    @property
+    def finished(self):
+        return self.state == self.States.DONE
+
+    @property
+    def percent(self):
+        return min(100, self.done * 100 // self.total) if self.total else 100
+
+    def __str__(self):
+        return f"{self.user}: {self.done}/{self.total}"
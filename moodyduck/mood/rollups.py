@@ -0,0 +1,105 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import DailyMoodRollup, Status
+from .streaks import refresh_streak
+
+
+def rollup_date(timestamp):
+    """Return the calendar day a status timestamp is counted towards."""
+    return timezone.localdate(timestamp, timezone.get_default_timezone())
+
+
+def day_bounds(date):
+    tz = timezone.get_default_timezone()
+    start = timezone.make_aware(datetime.combine(date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def _tally(rows):
+    count = mood_sum = mood_count = 0
+    tallies = {}
+
+    for mood_id, entries, total in rows:
+        count += entries
+
+        if mood_id is not None:
+            mood_sum += total or 0
+            mood_count += entries
+            tallies[str(mood_id)] = entries
+
+    return count, mood_sum, mood_count, tallies
+
+
+def update_daily_rollup(user_id, date):
+    """Recompute the rollup row for a single day from that day's entries."""
+    start, end = day_bounds(date)
+
+    rows = (
+        Status.objects.filter(user_id=user_id, timestamp__gte=start, timestamp__lt=end)
+        .order_by()
+        .values("mood_id")
+        .annotate(entries=Count("id"), total=Sum("mood__value"))
+        .values_list("mood_id", "entries", "total")
+    )
+
+    count, mood_sum, mood_count, tallies = _tally(rows)
+
+    if not count:
+        DailyMoodRollup.objects.filter(user_id=user_id, date=date).delete()
+        return None
+
+    rollup, _ = DailyMoodRollup.objects.update_or_create(
+        user_id=user_id,
+        date=date,
+        defaults={
+            "count": count,
+            "mood_sum": mood_sum,
+            "mood_count": mood_count,
+            "mood_tallies": tallies,
+        },
+    )
+    return rollup
+
+
+def rebuild_rollups(user):
+    """Throw away and rebuild all rollup rows of a user."""
+    days = {}
+
+    for timestamp, mood_id, value in (
+        Status.objects.filter(user=user)
+        .order_by()
+        .values_list("timestamp", "mood_id", "mood__value")
+        .iterator()
+    ):
+        day = days.setdefault(rollup_date(timestamp), {})
+        entries, total = day.get(mood_id, (0, 0))
+        day[mood_id] = (entries + 1, total + (value or 0))
+
+    rollups = []
+
+    for date, moods in days.items():
+        count, mood_sum, mood_count, tallies = _tally(
+            (mood_id, entries, total) for mood_id, (entries, total) in moods.items()
+        )
+        rollups.append(
+            DailyMoodRollup(
+                user=user,
+                date=date,
+                count=count,
+                mood_sum=mood_sum,
+                mood_count=mood_count,
+                mood_tallies=tallies,
+            )
+        )
+
+    with transaction.atomic():
+        DailyMoodRollup.objects.filter(user=user).delete()
+        DailyMoodRollup.objects.bulk_create(rollups, batch_size=500)
+        refresh_streak(user.pk)
+
+    return len(rollups)
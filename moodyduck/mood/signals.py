@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with the model as sender, user_id and pks after entries were
+# encrypted in bulk, which bypasses post_save
+entries_encrypted = Signal()
@@ -0,0 +1,7 @@
+// Embed the Bokeh charts served as json_item payloads by the chart views.
+// Every element with a data-chart attribute gets the chart from that URL.
+document.querySelectorAll("[data-chart]").forEach(function(element) {
+    fetch(element.dataset.chart, { credentials: "same-origin" })
+        .then(function(response) { return response.json(); })
+        .then(function(item) { Bokeh.embed.embed_item(item, element.id); });
+});
@@ -1,22 +1,29 @@
-import holoviews as hv
-import pandas as pd
+import numpy as np
 
+from django.db.models import Count, Q
 from django.utils import timezone
 
 from math import pi
 
-from bokeh.models import HoverTool
-from bokeh.plotting import figure
-from bokeh.transform import cumsum
-from bokeh.layouts import column
-from holoviews.operation import timeseries
 from dateutil.relativedelta import relativedelta
 
-from .models import Status, Mood, StatusActivity
+from moodyduck.common.plotting import holoviews
 
+from .aggregation import downsample
+from .models import Activity, Mood, StatusActivity
+from .timeseries import get_series
 
-def moodstats(user):
-    hv.extension("bokeh")
+# Entries beyond this are thinned out with LTTB before plotting
+MAX_PLOT_POINTS = 2000
+
+
+def _moodplot(series, moods, start=None, end=None):
+    import pandas as pd
+
+    from bokeh.models import HoverTool
+    from holoviews.operation import timeseries
+
+    hv = holoviews()
 
     tooltips = [("Date", "@date{%F %H:%M}"), ("Mood", "@name (@value)")]
 
@@ -24,16 +31,18 @@ def moodstats(user):
 
     hover = HoverTool(tooltips=tooltips, formatters=formatters)
 
-    pointdict = {"date": [], "value": [], "color": [], "name": []}
-
-    for status in Status.objects.filter(user=user):
-        if status.mood:
-            pointdict["date"].append(status.timestamp)
-            pointdict["value"].append(status.mood.value)
-            pointdict["color"].append(status.mood.color)
-            pointdict["name"].append(status.mood.name)
+    coded = [moods[mood_id] for mood_id in series.mood_ids]
 
-    pointframe = pd.DataFrame.from_dict(pointdict)
+    pointframe = pd.DataFrame(
+        {
+            "date": pd.to_datetime(series.timestamps, unit="us", utc=True),
+            "value": series.values.astype(int),
+            "color": np.array([mood.color for mood in coded], dtype=object)[
+                series.codes
+            ],
+            "name": np.array([mood.name for mood in coded], dtype=object)[series.codes],
+        }
+    )
 
     points = hv.Points(pointframe)
 
@@ -48,18 +57,14 @@ def moodstats(user):
         show_grid=True,
     )
 
-    pointtuples = [
-        (pointdict["date"][i], pointdict["value"][i])
-        for i in range(len(pointdict["date"]))
-    ]
-
-    line = hv.Curve(pointtuples)
+    line = hv.Curve(pointframe[["date", "value"]])
 
-    maxval = Mood.objects.filter(user=user).latest("value").value
+    maxval = max((mood.value for mood in moods.values()), default=0)
     maxy = maxval + max(maxval * 0.1, 1)
 
-    maxx = timezone.now().timestamp() * 1000
-    minx = maxx - (60 * 60 * 24 * 7) * 1000
+    # Show the requested range, or the last week, but keep the rest pannable
+    maxx = (end or timezone.now()).timestamp() * 1000
+    minx = start.timestamp() * 1000 if start else maxx - (60 * 60 * 24 * 7) * 1000
 
     output = points * line * timeseries.rolling(line, rolling_window=7)
     output.opts(ylim=(0, maxy), xlim=(minx, maxx))
@@ -67,145 +72,97 @@ def moodstats(user):
     return output
 
 
-def activitystats(user):
-    output = {}
-
-    for status in Status.objects.filter(user=user):
-        for activity in status.activity_set:
-            if activity not in output.keys():
-                output[activity] = {
-                    "alltime": 0,
-                    "yearly": 0,
-                    "monthly": 0,
-                    "weekly": 0,
-                }
-
-            output[activity]["alltime"] += 1
-
-            if status.timestamp > timezone.now() - relativedelta(years=1):
-                output[activity]["yearly"] += 1
-
-            if status.timestamp > timezone.now() - relativedelta(months=1):
-                output[activity]["monthly"] += 1
-
-            if status.timestamp > timezone.now() - relativedelta(weeks=1):
-                output[activity]["weekly"] += 1
-
-    return output
-
-
-def moodpies(user):
-    hv.extension("bokeh")
-
-    maxdate = timezone.now()
-
-    weekly_moods = Status.objects.filter(
-        user=user,
-        timestamp__lte=maxdate,
-        timestamp__gte=maxdate - relativedelta(weeks=1),
-    )
-    monthly_moods = Status.objects.filter(
-        user=user,
-        timestamp__lte=maxdate,
-        timestamp__gte=maxdate - relativedelta(months=1),
-    )
-    yearly_moods = Status.objects.filter(
-        user=user,
-        timestamp__lte=maxdate,
-        timestamp__gte=maxdate - relativedelta(years=1),
-    )
-
-    weekly = dict()
-    colors = []
-
-    for mood in Mood.objects.filter(user=user):
-        weekly[mood.name] = 0
-        colors.append(mood.color)
-
-    monthly, yearly = weekly.copy(), weekly.copy()
-
-    for status in weekly_moods:
-        if status.mood:
-            weekly[status.mood.name] += 1
-
-    for status in monthly_moods:
-        if status.mood:
-            monthly[status.mood.name] += 1
-
-    for status in yearly_moods:
-        if status.mood:
-            yearly[status.mood.name] += 1
-
-    weekly_data = (
-        pd.Series(weekly).reset_index(name="value").rename(columns={"index": "mood"})
-    )
-    weekly_data["angle"] = weekly_data["value"] / weekly_data["value"].sum() * 2 * pi
-    weekly_data["color"] = colors
-
-    weekly_chart = figure(
-        height=350,
-        title="Weekly",
-        toolbar_location=None,
-        tools="hover",
-        tooltips="@mood: @value",
-    )
-    weekly_chart.axis.visible = False
-
-    weekly_chart.wedge(
-        x=0,
-        y=1,
-        radius=0.4,
-        start_angle=cumsum("angle", include_zero=True),
-        end_angle=cumsum("angle"),
-        line_color="white",
-        fill_color="color",
-        legend_label="mood",
-        source=weekly_data,
-    )
-
-    monthly_data = (
-        pd.Series(monthly).reset_index(name="value").rename(columns={"index": "mood"})
-    )
-    monthly_data["angle"] = monthly_data["value"] / monthly_data["value"].sum() * 2 * pi
-    monthly_data["color"] = colors
-
-    monthly_chart = figure(
-        height=350,
-        title="Monthly",
-        toolbar_location=None,
-        tools="hover",
-        tooltips="@mood: @value",
-    )
-    monthly_chart.axis.visible = False
-
-    monthly_chart.wedge(
-        x=0,
-        y=1,
-        radius=0.4,
-        start_angle=cumsum("angle", include_zero=True),
-        end_angle=cumsum("angle"),
-        line_color="white",
-        fill_color="color",
-        legend_label="mood",
-        source=monthly_data,
-    )
+def moodstats(user, start=None, end=None):
+    series = downsample(get_series(user).window(start, end), MAX_PLOT_POINTS)
+    return _moodplot(series, Mood.objects.filter(user=user).in_bulk(), start, end)
 
-    yearly_data = (
-        pd.Series(yearly).reset_index(name="value").rename(columns={"index": "mood"})
-    )
-    yearly_data["angle"] = yearly_data["value"] / yearly_data["value"].sum() * 2 * pi
-    yearly_data["color"] = colors
 
-    yearly_chart = figure(
+def activitystats(user):
+    now = timezone.now()
+
+    activities = Activity.objects.filter(
+        user=user, statusactivity__status__user=user
+    ).annotate(
+        alltime=Count("statusactivity"),
+        yearly=Count(
+            "statusactivity",
+            filter=Q(
+                statusactivity__status__timestamp__gt=now - relativedelta(years=1)
+            ),
+        ),
+        monthly=Count(
+            "statusactivity",
+            filter=Q(
+                statusactivity__status__timestamp__gt=now - relativedelta(months=1)
+            ),
+        ),
+        weekly=Count(
+            "statusactivity",
+            filter=Q(
+                statusactivity__status__timestamp__gt=now - relativedelta(weeks=1)
+            ),
+        ),
+    )
+
+    return {
+        activity: {
+            "alltime": activity.alltime,
+            "yearly": activity.yearly,
+            "monthly": activity.monthly,
+            "weekly": activity.weekly,
+        }
+        for activity in activities
+    }
+
+
+def piedata(user, activity=None):
+    """Count the entries per mood over the last week, month and year.
+
+    Returns the user's moods annotated with ``weekly``, ``monthly`` and
+    ``yearly`` counts, computed in a single query. If an activity is given,
+    only entries with that activity are counted.
+    """
+    now = timezone.now()
+    entries = Q(status__timestamp__lte=now)
+
+    if activity is not None:
+        entries &= Q(status__statusactivity__activity=activity)
+
+    def since(delta):
+        return Count("status", filter=entries & Q(status__timestamp__gte=now - delta))
+
+    return Mood.objects.filter(user=user).annotate(
+        weekly=since(relativedelta(weeks=1)),
+        monthly=since(relativedelta(months=1)),
+        yearly=since(relativedelta(years=1)),
+    )
+
+
+def _pie(title, moods, window):
+    import pandas as pd
+
+    from bokeh.plotting import figure
+    from bokeh.transform import cumsum
+
+    data = pd.DataFrame(
+        {
+            "mood": [mood.name for mood in moods],
+            "value": [getattr(mood, window) for mood in moods],
+            "color": [mood.color for mood in moods],
+        }
+    )
+    data["angle"] = data["value"] / data["value"].sum() * 2 * pi
+
+    chart = figure(
         height=350,
-        title="Yearly",
+        title=title,
         toolbar_location=None,
         tools="hover",
         tooltips="@mood: @value",
     )
-    yearly_chart.axis.visible = False
+    chart.axis.visible = False
 
-    yearly_chart.wedge(
+    chart.wedge(
         x=0,
         y=1,
         radius=0.4,
@@ -214,166 +171,45 @@ def moodpies(user):
         line_color="white",
         fill_color="color",
         legend_label="mood",
-        source=yearly_data,
-    )
-
-    return column(weekly_chart, monthly_chart, yearly_chart)
-
-
-def activitymood(activity):
-    hv.extension("bokeh")
-
-    tooltips = [("Date", "@date{%F %H:%M}"), ("Mood", "@name (@value)")]
-
-    formatters = {"@date": "datetime"}
-
-    hover = HoverTool(tooltips=tooltips, formatters=formatters)
-
-    pointdict = {"date": [], "value": [], "color": [], "name": []}
-
-    for statusactivity in StatusActivity.objects.filter(activity=activity):
-        if statusactivity.status.mood:
-            pointdict["date"].append(statusactivity.status.timestamp)
-            pointdict["value"].append(statusactivity.status.mood.value)
-            pointdict["color"].append(statusactivity.status.mood.color)
-            pointdict["name"].append(statusactivity.status.mood.name)
-
-    pointframe = pd.DataFrame.from_dict(pointdict)
-
-    points = hv.Points(pointframe)
-
-    points.opts(
-        tools=[hover],
-        color="color",
-        cmap="Category20",
-        line_color="black",
-        size=25,
-        width=600,
-        height=400,
-        show_grid=True,
+        source=data,
     )
 
-    pointtuples = [
-        (pointdict["date"][i], pointdict["value"][i])
-        for i in range(len(pointdict["date"]))
-    ]
-
-    line = hv.Curve(pointtuples)
-
-    maxval = Mood.objects.filter(user=activity.user).latest("value").value
-    maxy = maxval + max(maxval * 0.1, 1)
-
-    maxx = timezone.now().timestamp() * 1000
-    minx = maxx - (60 * 60 * 24 * 7) * 1000
-
-    output = points * line * timeseries.rolling(line, rolling_window=7)
-    output.opts(ylim=(0, maxy), xlim=(minx, maxx))
-
-    return output
-
-
-def activitypies(activity):
-    hv.extension("bokeh")
-
-    sa = StatusActivity.objects.filter(activity=activity)
+    return chart
 
-    weekly = dict()
-    colors = []
 
-    for mood in Mood.objects.filter(user=activity.user):
-        weekly[mood.name] = 0
-        colors.append(mood.color)
+def _pies(moods):
+    from bokeh.layouts import column
 
-    monthly, yearly = weekly.copy(), weekly.copy()
+    holoviews()
 
-    for single in sa:
-        if single.status.mood:
-            if single.status.timestamp > timezone.now() - relativedelta(weeks=1):
-                weekly[single.status.mood.name] += 1
-            if single.status.timestamp > timezone.now() - relativedelta(months=1):
-                monthly[single.status.mood.name] += 1
-            if single.status.timestamp > timezone.now() - relativedelta(years=1):
-                yearly[single.status.mood.name] += 1
+    moods = list(moods)
 
-    weekly_data = (
-        pd.Series(weekly).reset_index(name="value").rename(columns={"index": "mood"})
-    )
-    weekly_data["angle"] = weekly_data["value"] / weekly_data["value"].sum() * 2 * pi
-    weekly_data["color"] = colors
-
-    weekly_chart = figure(
-        height=350,
-        title="Weekly",
-        toolbar_location=None,
-        tools="hover",
-        tooltips="@mood: @value",
-    )
-    weekly_chart.axis.visible = False
-
-    weekly_chart.wedge(
-        x=0,
-        y=1,
-        radius=0.4,
-        start_angle=cumsum("angle", include_zero=True),
-        end_angle=cumsum("angle"),
-        line_color="white",
-        fill_color="color",
-        legend_label="mood",
-        source=weekly_data,
+    return column(
+        _pie("Weekly", moods, "weekly"),
+        _pie("Monthly", moods, "monthly"),
+        _pie("Yearly", moods, "yearly"),
     )
 
-    monthly_data = (
-        pd.Series(monthly).reset_index(name="value").rename(columns={"index": "mood"})
-    )
-    monthly_data["angle"] = monthly_data["value"] / monthly_data["value"].sum() * 2 * pi
-    monthly_data["color"] = colors
 
-    monthly_chart = figure(
-        height=350,
-        title="Monthly",
-        toolbar_location=None,
-        tools="hover",
-        tooltips="@mood: @value",
-    )
-    monthly_chart.axis.visible = False
+def moodpies(user):
+    return _pies(piedata(user))
 
-    monthly_chart.wedge(
-        x=0,
-        y=1,
-        radius=0.4,
-        start_angle=cumsum("angle", include_zero=True),
-        end_angle=cumsum("angle"),
-        line_color="white",
-        fill_color="color",
-        legend_label="mood",
-        source=monthly_data,
-    )
 
-    yearly_data = (
-        pd.Series(yearly).reset_index(name="value").rename(columns={"index": "mood"})
+def activitymood(activity, start=None, end=None):
+    series = downsample(
+        get_series(activity.user)
+        .window(start, end)
+        .only(
+            StatusActivity.objects.filter(activity=activity).values_list(
+                "status_id", flat=True
+            )
+        ),
+        MAX_PLOT_POINTS,
     )
-    yearly_data["angle"] = yearly_data["value"] / yearly_data["value"].sum() * 2 * pi
-    yearly_data["color"] = colors
-
-    yearly_chart = figure(
-        height=350,
-        title="Yearly",
-        toolbar_location=None,
-        tools="hover",
-        tooltips="@mood: @value",
+    return _moodplot(
+        series, Mood.objects.filter(user=activity.user).in_bulk(), start, end
     )
-    yearly_chart.axis.visible = False
 
-    yearly_chart.wedge(
-        x=0,
-        y=1,
-        radius=0.4,
-        start_angle=cumsum("angle", include_zero=True),
-        end_angle=cumsum("angle"),
-        line_color="white",
-        fill_color="color",
-        legend_label="mood",
-        source=yearly_data,
-    )
 
-    return column(weekly_chart, monthly_chart, yearly_chart)
+def activitypies(activity):
+    return _pies(piedata(activity.user_id, activity))
@@ -0,0 +1,131 @@
+"""
+Streaks of consecutive days with mood entries.
+
+Streaks are computed from the distinct days in DailyMoodRollup with a
+gaps-and-islands query: numbering the days in order and subtracting that
+number from the day gives the same value for every day of an unbroken run.
+The result is cached per user in MoodStreak, which the signal handlers keep
+up to date - extending the current streak by a day without touching the
+rollups and recomputing only when days are back-filled or removed.
+"""
+
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import DailyMoodRollup, MoodStreak
+
+# Expression turning the rollup date into a day number, per database vendor
+DAY_NUMBER = {
+    "sqlite": "CAST(julianday(date) AS INTEGER)",
+    "mysql": "TO_DAYS(date)",
+    "postgresql": "(date - DATE '1970-01-01')",
+}
+
+ISLANDS = """
+    SELECT MAX(date), COUNT(*) FROM (
+        SELECT date, {day} - ROW_NUMBER() OVER (ORDER BY date) AS island
+        FROM {table}
+        WHERE user_id = %s
+    ) days
+    GROUP BY island
+    ORDER BY MAX(date) DESC
+"""
+
+
+def _islands_python(user_id):
+    islands = []
+    previous = None
+
+    for date in (
+        DailyMoodRollup.objects.filter(user_id=user_id)
+        .order_by("-date")
+        .values_list("date", flat=True)
+        .iterator()
+    ):
+        if previous is not None and date == previous - timedelta(days=1):
+            islands[-1][1] += 1
+        else:
+            islands.append([date, 1])
+
+        previous = date
+
+    return islands
+
+
+def islands(user_id):
+    """Return (last date, length) of each streak of a user, newest first."""
+    try:
+        day = DAY_NUMBER[connection.vendor]
+    except KeyError:
+        return _islands_python(user_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ISLANDS.format(day=day, table=DailyMoodRollup._meta.db_table),
+            [user_id],
+        )
+        rows = cursor.fetchall()
+
+    # SQLite hands dates back as strings from aggregates
+    field = DailyMoodRollup._meta.get_field("date")
+    return [(field.to_python(last), length) for last, length in rows]
+
+
+def refresh_streak(user_id):
+    """Recompute the cached streak of a user from the rollups."""
+    found = islands(user_id)
+    last_date, current = found[0] if found else (None, 0)
+
+    streak, _ = MoodStreak.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            "current": current,
+            "longest": max((length for _, length in found), default=0),
+            "last_date": last_date,
+        },
+    )
+    return streak
+
+
+def day_added(user_id, date):
+    """Update the cached streak after an entry on the given day was saved."""
+    streak = MoodStreak.objects.filter(user_id=user_id).first()
+
+    if streak is None or streak.last_date is None:
+        return refresh_streak(user_id)
+
+    start = streak.last_date - timedelta(days=streak.current - 1)
+
+    if start <= date <= streak.last_date:
+        return streak
+
+    if date == streak.last_date + timedelta(days=1):
+        streak.current += 1
+        streak.longest = max(streak.longest, streak.current)
+        streak.last_date = date
+        streak.save(update_fields=["current", "longest", "last_date"])
+        return streak
+
+    return refresh_streak(user_id)
+
+
+def day_removed(user_id, date):
+    """Update the cached streak after the last entry of a day went away."""
+    return refresh_streak(user_id)
+
+
+def get_streak(user_id):
+    streak = MoodStreak.objects.filter(user_id=user_id).first()
+    return streak if streak is not None else refresh_streak(user_id)
+
+
+def current_length(streak, today=None):
+    """Length of the ongoing streak, which has to reach today or yesterday."""
+    today = today or timezone.localdate()
+
+    if streak.last_date is None or streak.last_date < today - timedelta(days=1):
+        return 0
+
+    return streak.current
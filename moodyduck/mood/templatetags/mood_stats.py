@@ -1,85 +1,69 @@
 from django import template
+from django.db.models import Avg, ExpressionWrapper, F, FloatField, Sum
 from django.utils import timezone
 
-from collections import Counter
+from moodyduck.mood import dashboard
+from moodyduck.mood.models import DailyMoodRollup
 
 register = template.Library()
 
 
+def _local_date(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _stats(context):
+    return dashboard.dashboard_stats(context["user"], context.get("request"))
+
+
 @register.simple_tag(takes_context=True)
 def total_moods(context):
-    return len(context["user"].status_set.all())
+    return _stats(context)["total"]
 
 
 @register.simple_tag(takes_context=True)
 def current_streak(context):
-    status_list = context["user"].status_set.all().order_by("-timestamp")
-    timestamp = None
-    counter = 0
-
-    for status in status_list:
-        if not timestamp:
-            if not (
-                status.timestamp.date() == timezone.now().date()
-                or status.timestamp.date()
-                == (timezone.now() - timezone.timedelta(days=1)).date()
-            ):
-                return counter
-            timestamp = status.timestamp
-            counter += 1
-            continue
+    return _stats(context)["current_streak"]
 
-        if status.timestamp.date() == timestamp.date():
-            continue
 
-        if status.timestamp.date() == timestamp.date() - timezone.timedelta(days=1):
-            timestamp = status.timestamp
-            counter += 1
-            continue
-
-        return counter
+@register.simple_tag(takes_context=True)
+def longest_streak(context):
+    return _stats(context)["longest_streak"]
 
 
 @register.simple_tag(takes_context=True)
 def closest_mood(context, value):
-    if not value:
-        return None
-
-    mood_list = context["user"].mood_set.all()
+    stats = _stats(context)
 
-    found = None
+    if value == stats["average_weekly"]:
+        return stats["closest_mood"]
 
-    for mood in mood_list:
-        if (not found) or (abs(mood.value - value) < abs(found.value - value)):
-            found = mood
-
-    return found
+    return dashboard.closest_mood(context["user"], value)
 
 
 @register.simple_tag(takes_context=True)
 def average_mood(context, start, end=None, daily_averages=True):
-    status_list = context["user"].status_set.filter(
-        timestamp__gte=start.date(),
-        timestamp__lte=(end.date() if end else start.date()),
+    aggregates = DailyMoodRollup.objects.filter(
+        user=context["user"],
+        date__gte=_local_date(start),
+        date__lte=_local_date(end or start),
+        mood_count__gt=0,
+    ).aggregate(
+        daily=Avg(
+            ExpressionWrapper(
+                F("mood_sum") * 1.0 / F("mood_count"), output_field=FloatField()
+            )
+        ),
+        total=Sum("mood_sum"),
+        count=Sum("mood_count"),
     )
-    moods = list() if not daily_averages else dict()
-
-    for status in status_list:
-        if status.mood:
-            if daily_averages:
-                if status.timestamp.date() not in moods.keys():
-                    moods[status.timestamp.date()] = [status.mood.value]
-                else:
-                    moods[status.timestamp.date()].append(status.mood.value)
-            else:
-                moods.append(status.mood.value)
 
     if daily_averages:
-        moods = [sum(entries) / len(entries) for date, entries in moods.items()]
+        return aggregates["daily"]
 
     try:
-        average = sum(moods) / len(moods)
-    except ZeroDivisionError:
+        average = aggregates["total"] / aggregates["count"]
+    except TypeError:
         average = None
 
     return average
@@ -87,41 +71,24 @@ def average_mood(context, start, end=None, daily_averages=True):
 
 @register.simple_tag(takes_context=True)
 def average_mood_weekly(context, daily_averages=True):
+    if daily_averages:
+        return _stats(context)["average_weekly"]
+
     now = timezone.now()
     start = now - timezone.timedelta(days=7)
-    end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-    return average_mood(context, start, end, daily_averages)
+    return average_mood(context, start, now, daily_averages)
 
 
 @register.simple_tag(takes_context=True)
 def most_common_activity(context, start, end=None):
-    status_list = context["user"].status_set.filter(
-        timestamp__gte=start,
-        timestamp__lte=(
-            end
-            if end
-            else (start.replace(hour=23, minute=59, second=59, microsecond=999999))
-        ),
+    return dashboard.most_common_activity(
+        context["user"],
+        start,
+        end or start.replace(hour=23, minute=59, second=59, microsecond=999999),
     )
-    activities = list()
-
-    for status in status_list:
-        for activity in status.statusactivity_set.all():
-            activities.append(activity.activity)
-
-    if not activities:
-        return None
-
-    most_common = Counter(activities).most_common(1)[0]
-
-    return most_common[0], most_common[1]
 
 
 @register.simple_tag(takes_context=True)
 def most_common_activity_weekly(context):
-    now = timezone.now()
-    start = now - timezone.timedelta(days=7)
-    end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-    return most_common_activity(context, start, end)
+    return _stats(context)["most_common_activity_weekly"]
@@ -1 +1,917 @@
-# Create your tests here.
+import gzip
+
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from moodyduck.common.keyring import keyrings
+from moodyduck.common.tests import ALICE_KEY
+from moodyduck.dreams.models import Dream
+
+from . import encryption, export
+from .aggregation import bucket_edges, lttb
+from .dashboard import dashboard_stats
+from .models import (
+    Activity,
+    DailyMoodRollup,
+    EncryptionJob,
+    Mood,
+    MoodStreak,
+    Status,
+    StatusActivity,
+)
+from .rollups import rollup_date
+from .streaks import _islands_python, islands
+from .statistics import activitystats, piedata
+from .timeseries import get_series
+from .templatetags.mood_stats import (
+    average_mood,
+    average_mood_weekly,
+    closest_mood,
+    current_streak,
+    longest_streak,
+    most_common_activity_weekly,
+    total_moods,
+)
+
+
+class ActivityStatsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="stats-user",
+            password="secret",
+        )
+        self.mood = Mood.objects.create(user=self.user, name="Okay", value=3)
+        self.walk = Activity.objects.create(user=self.user, name="Walk")
+        self.reading = Activity.objects.create(user=self.user, name="Reading")
+        Activity.objects.create(user=self.user, name="Unused")
+
+    def _status(self, days_ago, *activities):
+        status = Status.objects.create(
+            user=self.user,
+            mood=self.mood,
+            timestamp=timezone.now() - timedelta(days=days_ago),
+        )
+        for activity in activities:
+            StatusActivity.objects.create(status=status, activity=activity)
+        return status
+
+    def test_counts_per_window(self):
+        self._status(1, self.walk, self.reading)
+        self._status(20, self.walk)
+        self._status(200, self.walk)
+        self._status(800, self.walk, self.reading)
+
+        stats = activitystats(self.user)
+
+        self.assertEqual(set(stats), {self.walk, self.reading})
+        self.assertEqual(
+            stats[self.walk],
+            {"alltime": 4, "yearly": 3, "monthly": 2, "weekly": 1},
+        )
+        self.assertEqual(
+            stats[self.reading],
+            {"alltime": 2, "yearly": 1, "monthly": 1, "weekly": 1},
+        )
+
+    def test_ignores_other_users(self):
+        other = get_user_model().objects.create_user(username="other", password="x")
+        foreign = Activity.objects.create(user=other, name="Walk")
+        status = Status.objects.create(user=other)
+        StatusActivity.objects.create(status=status, activity=foreign)
+
+        self.assertEqual(activitystats(self.user), {})
+
+    def test_query_count_is_constant(self):
+        for days_ago in range(50):
+            self._status(days_ago * 10, self.walk, self.reading)
+
+        with self.assertNumQueries(1):
+            stats = activitystats(self.user)
+
+        self.assertEqual(stats[self.walk]["alltime"], 50)
+
+
+class DailyMoodRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="rollup-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.bad = Mood.objects.create(user=self.user, name="Bad", value=2)
+        self.today = timezone.localdate()
+
+    def _rollup(self, date):
+        return DailyMoodRollup.objects.get(user=self.user, date=date)
+
+    def test_status_writes_update_rollup(self):
+        first = Status.objects.create(user=self.user, mood=self.good)
+        Status.objects.create(user=self.user, mood=self.bad)
+        Status.objects.create(user=self.user)
+
+        date = rollup_date(first.timestamp)
+        rollup = self._rollup(date)
+        self.assertEqual(rollup.count, 3)
+        self.assertEqual(rollup.mood_count, 2)
+        self.assertEqual(rollup.mood_sum, 6)
+        self.assertEqual(
+            rollup.mood_tallies, {str(self.good.pk): 1, str(self.bad.pk): 1}
+        )
+
+        first.timestamp -= timedelta(days=3)
+        first.save()
+
+        self.assertEqual(self._rollup(date).count, 2)
+        self.assertEqual(self._rollup(rollup_date(first.timestamp)).mood_sum, 4)
+
+        first.delete()
+        self.assertFalse(
+            DailyMoodRollup.objects.filter(
+                user=self.user, date=date - timedelta(days=3)
+            ).exists()
+        )
+
+    def test_mood_value_change_is_reflected(self):
+        status = Status.objects.create(user=self.user, mood=self.good)
+
+        self.good.value = 5
+        self.good.save()
+
+        self.assertEqual(self._rollup(rollup_date(status.timestamp)).mood_sum, 5)
+
+        self.good.delete()
+
+        rollup = self._rollup(rollup_date(status.timestamp))
+        self.assertEqual((rollup.count, rollup.mood_count), (1, 0))
+
+    def test_rebuild_command(self):
+        Status.objects.create(user=self.user, mood=self.good)
+        DailyMoodRollup.objects.all().delete()
+
+        call_command("rebuildrollups", "rollup-user", stdout=StringIO())
+
+        self.assertEqual(self._rollup(self.today).mood_sum, 4)
+
+    def test_heatmap_reads_rollups(self):
+        for days_ago in range(3):
+            for _ in range(4):
+                Status.objects.create(
+                    user=self.user,
+                    mood=self.good,
+                    timestamp=timezone.now() - timedelta(days=days_ago),
+                )
+
+        self.client.force_login(self.user)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("mood:statistics_heatmap"), HTTP_HOST=settings.ALLOWED_HOSTS[0]
+            )
+
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(response.json()[-1]["count"], 4)
+        self.assertEqual(response.json()[-1]["average"], 4)
+
+    def test_dashboard_tags(self):
+        context = Context({"user": self.user})
+        now = timezone.now()
+
+        self.assertEqual(current_streak(context), 0)
+
+        for days_ago, mood in (
+            (0, self.good),
+            (1, self.bad),
+            (1, self.good),
+            (3, self.bad),
+        ):
+            Status.objects.create(
+                user=self.user, mood=mood, timestamp=now - timedelta(days=days_ago)
+            )
+
+        self.assertEqual(current_streak(context), 2)
+        self.assertEqual(average_mood(context, now - timedelta(days=1), now), 3.5)
+        self.assertEqual(average_mood(context, now - timedelta(days=3), now, False), 3)
+
+
+class StreakTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="streak-user",
+            password="secret",
+        )
+        self.context = Context({"user": self.user})
+        self.now = timezone.now()
+
+    def _status(self, days_ago):
+        return Status.objects.create(
+            user=self.user, timestamp=self.now - timedelta(days=days_ago)
+        )
+
+    def _streak(self):
+        streak = MoodStreak.objects.get(user=self.user)
+        return streak.current, streak.longest
+
+    def test_islands(self):
+        for days_ago in (0, 1, 2, 5, 6, 10, 11, 12, 13):
+            self._status(days_ago)
+
+        found = islands(self.user.pk)
+
+        self.assertEqual([length for _, length in found], [3, 2, 4])
+        self.assertEqual(found[0][0], rollup_date(self.now))
+        self.assertEqual(
+            found, [tuple(island) for island in _islands_python(self.user.pk)]
+        )
+
+    def test_streak_is_maintained(self):
+        for days_ago in (5, 4, 2, 1):
+            self._status(days_ago)
+
+        self.assertEqual(self._streak(), (2, 2))
+
+        # Extending the streak by today does not recompute it
+        with mock.patch("moodyduck.mood.streaks.refresh_streak") as refresh:
+            self._status(0)
+
+        refresh.assert_not_called()
+        self.assertEqual(self._streak(), (3, 3))
+
+        gap = self._status(3)
+        self.assertEqual(self._streak(), (6, 6))
+
+        gap.delete()
+        self.assertEqual(self._streak(), (3, 3))
+
+        Status.objects.filter(user=self.user).delete()
+        self.assertEqual(self._streak(), (0, 0))
+
+    def test_dashboard_tags(self):
+        for days_ago in (9, 8, 7, 2, 1):
+            self._status(days_ago)
+
+        self.assertEqual(current_streak(self.context), 2)
+        self.assertEqual(longest_streak(self.context), 3)
+
+        MoodStreak.objects.filter(user=self.user).update(
+            last_date=rollup_date(self.now) - timedelta(days=2)
+        )
+        cache.clear()
+        self.assertEqual(current_streak(self.context), 0)
+
+    def test_missing_streak_is_computed(self):
+        self._status(0)
+        MoodStreak.objects.all().delete()
+
+        self.assertEqual(current_streak(self.context), 1)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="dashboard-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.bad = Mood.objects.create(user=self.user, name="Bad", value=2)
+        self.walk = Activity.objects.create(user=self.user, name="Walk")
+        self.read = Activity.objects.create(user=self.user, name="Read")
+        self.now = timezone.now()
+
+    def _status(self, days_ago, mood, *activities):
+        status = Status.objects.create(
+            user=self.user, mood=mood, timestamp=self.now - timedelta(days=days_ago)
+        )
+        for activity in activities:
+            StatusActivity.objects.create(status=status, activity=activity)
+
+    def test_values(self):
+        self._status(0, self.good, self.walk, self.read)
+        self._status(1, self.good, self.walk)
+        self._status(1, self.bad)
+        self._status(30, self.bad, self.read)
+
+        stats = dashboard_stats(self.user)
+
+        self.assertEqual(stats["total"], 4)
+        self.assertEqual((stats["current_streak"], stats["longest_streak"]), (2, 2))
+        self.assertEqual(stats["average_weekly"], 3.5)
+        self.assertEqual(stats["closest_mood"], self.good)
+        self.assertEqual(stats["most_common_activity_weekly"], (self.walk, 2))
+
+    def test_queries(self):
+        self._status(0, self.good, self.walk)
+        request = RequestFactory().get("/")
+        context = Context({"user": self.user, "request": request})
+
+        with self.assertNumQueries(5):
+            total_moods(context)
+
+        # Memoised on the request
+        with self.assertNumQueries(0):
+            self.assertEqual(current_streak(context), 1)
+            mood = average_mood_weekly(context)
+            self.assertEqual(closest_mood(context, mood), self.good)
+            self.assertEqual(most_common_activity_weekly(context), (self.walk, 1))
+
+        # Cached across requests
+        with self.assertNumQueries(1):
+            self.assertEqual(total_moods(Context({"user": self.user})), 1)
+
+    def test_invalidation(self):
+        self._status(0, self.good, self.walk)
+        context = Context({"user": self.user})
+        self.assertEqual(most_common_activity_weekly(context), (self.walk, 1))
+
+        self.walk.name = "Run"
+        self.walk.save()
+        self.assertEqual(most_common_activity_weekly(context)[0].name, "Run")
+
+        self._status(0, self.bad)
+        self.assertEqual(total_moods(context), 2)
+
+    def test_dashboard_renders(self):
+        self._status(0, self.good, self.walk)
+        self.client.force_login(self.user)
+
+        response = self.client.get(
+            reverse("frontend:dashboard"), HTTP_HOST=settings.ALLOWED_HOSTS[0]
+        )
+
+        self.assertContains(response, "Walk")
+
+
+class MoodSeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="series-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.bad = Mood.objects.create(user=self.user, name="Bad", value=2)
+        self.now = timezone.now()
+
+    def _status(self, days_ago, mood):
+        return Status.objects.create(
+            user=self.user, mood=mood, timestamp=self.now - timedelta(days=days_ago)
+        )
+
+    def test_series_is_cached_and_sliced(self):
+        for days_ago in (9, 5, 3, 1):
+            self._status(days_ago, self.good if days_ago % 2 else self.bad)
+        Status.objects.create(user=self.user)
+
+        series = get_series(self.user)
+        self.assertEqual(len(series), 4)
+        self.assertEqual(list(series.values), [4, 4, 4, 4])
+
+        with self.assertNumQueries(1):
+            window = get_series(self.user).window(
+                self.now - timedelta(days=6), self.now - timedelta(days=2)
+            )
+
+        self.assertEqual(len(window), 2)
+
+    def test_new_status_is_appended(self):
+        self._status(2, self.good)
+        get_series(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            status = self._status(0, self.bad)
+
+        with self.assertNumQueries(1):
+            series = get_series(self.user)
+
+        self.assertEqual(series.ids[-1], status.pk)
+        self.assertEqual(list(series.values), [4, 2])
+        self.assertEqual(series.mood_ids[series.codes[-1]], self.bad.pk)
+
+    def test_changes_invalidate_series(self):
+        status = self._status(2, self.good)
+        self.assertEqual(len(get_series(self.user)), 1)
+
+        status.mood = self.bad
+        status.save()
+        self.assertEqual(list(get_series(self.user).values), [2])
+
+        self.bad.value = 1
+        self.bad.save()
+        self.assertEqual(list(get_series(self.user).values), [1])
+
+        status.delete()
+        self.assertEqual(len(get_series(self.user)), 0)
+
+    def test_activity_and_csv_use_series(self):
+        walk = Activity.objects.create(user=self.user, name="Walk")
+        StatusActivity.objects.create(status=self._status(1, self.good), activity=walk)
+        self._status(2, self.bad)
+
+        self.assertEqual(len(get_series(self.user).only([])), 0)
+
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("mood:statistics_csv"), HTTP_HOST=settings.ALLOWED_HOSTS[0]
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "date,value")
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["2", "4"])
+
+        for url in (
+            reverse("mood:statistics_plot"),
+            reverse("mood:statistics_activity_plot", args=[walk.pk]),
+        ):
+            response = self.client.get(url, HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            self.assertEqual(response.status_code, 200)
+
+
+class PieDataTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="pie-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.bad = Mood.objects.create(user=self.user, name="Bad", value=2)
+        self.walk = Activity.objects.create(user=self.user, name="Walk")
+
+    def _status(self, days_ago, mood, *activities):
+        status = Status.objects.create(
+            user=self.user,
+            mood=mood,
+            timestamp=timezone.now() - timedelta(days=days_ago),
+        )
+        for activity in activities:
+            StatusActivity.objects.create(status=status, activity=activity)
+
+    def test_window_counts(self):
+        self._status(1, self.good, self.walk)
+        self._status(2, self.bad)
+        self._status(20, self.good)
+        self._status(200, self.good, self.walk)
+        self._status(-2, self.good)
+
+        with self.assertNumQueries(1):
+            counts = {
+                mood.name: (mood.weekly, mood.monthly, mood.yearly)
+                for mood in piedata(self.user)
+            }
+
+        self.assertEqual(counts, {"Good": (1, 2, 3), "Bad": (1, 1, 1)})
+
+        with self.assertNumQueries(1):
+            counts = {
+                mood.name: (mood.weekly, mood.monthly, mood.yearly)
+                for mood in piedata(self.user, self.walk)
+            }
+
+        self.assertEqual(counts, {"Good": (1, 1, 2), "Bad": (0, 0, 0)})
+
+    def test_pies_views(self):
+        self._status(1, self.good, self.walk)
+        self.client.force_login(self.user)
+
+        for url in (
+            reverse("mood:statistics_pies"),
+            reverse("mood:statistics_activity_pies", args=[self.walk.pk]),
+        ):
+            response = self.client.get(url, HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            self.assertEqual(response.status_code, 200)
+
+
+class AggregationTests(TestCase):
+    def test_lttb_keeps_extremes(self):
+        x = np.arange(1000)
+        y = np.zeros(1000)
+        y[437] = 10
+
+        selected = lttb(x, y, 10)
+
+        self.assertEqual(len(selected), 10)
+        self.assertEqual((selected[0], selected[-1]), (0, 999))
+        self.assertIn(437, selected)
+        self.assertTrue((np.diff(selected) > 0).all())
+        self.assertEqual(len(lttb(x[:5], y[:5], 10)), 5)
+
+    def test_day_buckets_follow_dst(self):
+        tz = ZoneInfo("Europe/Vienna")
+        edges = bucket_edges(
+            datetime(2024, 10, 26, 12, tzinfo=tz),
+            datetime(2024, 10, 27, 12, tzinfo=tz),
+            "day",
+            tz,
+        )
+
+        self.assertEqual(
+            [(b.timestamp() - a.timestamp()) / 3600 for a, b in zip(edges, edges[1:])],
+            [24, 25],
+        )
+
+    def test_statistics_range(self):
+        user = get_user_model().objects.create_user(username="range", password="x")
+        self.client.force_login(user)
+
+        response = self.client.get(
+            reverse("mood:statistics"),
+            {"start": "2024-01-01", "end": "2024-02-01"},
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+        )
+        self.assertContains(
+            response, 'data-chart="plot/json/?start=2024-01-01&amp;end=2024-02-01"'
+        )
+
+        response = self.client.get(
+            reverse("mood:statistics_plot_json"),
+            {"start": "2024-01-01", "end": "2024-02-01"},
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class CSVExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="csv-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.walk = Activity.objects.create(user=self.user, name="Walk")
+        self.read = Activity.objects.create(user=self.user, name="Read, a book")
+        self.now = timezone.now()
+        self.client.force_login(self.user)
+
+    def _status(self, days_ago, *activities):
+        status = Status.objects.create(
+            user=self.user,
+            mood=self.good,
+            timestamp=self.now - timedelta(days=days_ago),
+        )
+        for activity in activities:
+            StatusActivity.objects.create(status=status, activity=activity)
+        return status
+
+    def _export(self, **params):
+        response = self.client.get(
+            reverse("mood:statistics_csv"), params, HTTP_HOST=settings.ALLOWED_HOSTS[0]
+        )
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content)
+
+        if "gzip" in params:
+            self.assertEqual(response["Content-Type"], "application/gzip")
+            content = gzip.decompress(content)
+
+        return content.decode().splitlines()
+
+    def _day(self, days_ago):
+        return timezone.localdate(self.now - timedelta(days=days_ago)).isoformat()
+
+    def test_ranges(self):
+        for days_ago in (3, 30, 3000):
+            self._status(days_ago)
+
+        self.assertEqual(len(self._export()), 2)
+        self.assertEqual(len(self._export(all=1)), 4)
+        self.assertEqual(len(self._export(start=self._day(30))), 3)
+        self.assertEqual(len(self._export(end=self._day(30))), 3)
+        self.assertEqual(
+            len(self._export(start=self._day(3000), end=self._day(3000))), 2
+        )
+
+    def test_activities_and_gzip(self):
+        self._status(2, self.walk, self.read)
+        self._status(1)
+
+        lines = self._export(activities=1, gzip=1)
+
+        self.assertEqual(lines[0], "date,value,activities")
+        self.assertEqual(lines[1].split(",", 2)[1:], ["4", '"Read, a book|Walk"'])
+        self.assertEqual(lines[2].split(",", 2)[1:], ["4", ""])
+
+    def test_queries_per_chunk(self):
+        for days_ago in range(30):
+            self._status(days_ago / 10, self.walk)
+
+        # Session, user, entries and one activity lookup per chunk
+        with mock.patch.object(export, "CHUNK_SIZE", 10), self.assertNumQueries(6):
+            lines = self._export(all=1, activities=1)
+
+        self.assertEqual(len(lines), 31)
+
+
+class StatusListTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="list-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.walk = Activity.objects.create(user=self.user, name="Walk")
+        self.client.force_login(self.user)
+        self.url = reverse("mood:status_list")
+
+    def _get(self, url, **params):
+        return self.client.get(url, params, HTTP_HOST=settings.ALLOWED_HOSTS[0])
+
+    def _create(self, count):
+        now = timezone.now()
+        # Pairs of entries share a timestamp, so the id has to break the tie
+        statuses = [
+            Status.objects.create(
+                user=self.user,
+                mood=self.good,
+                timestamp=now - timedelta(hours=index // 2),
+                text="x" * 200,
+            )
+            for index in range(count)
+        ]
+        for status in statuses:
+            StatusActivity.objects.create(status=status, activity=self.walk)
+        return statuses
+
+    def test_walks_all_pages(self):
+        statuses = self._create(120)
+        expected = [
+            status.pk
+            for status in sorted(statuses, key=lambda s: (s.timestamp, s.pk))[::-1]
+        ]
+
+        seen = []
+        pages = []
+        url = self.url
+
+        while url:
+            # Session, user, page, prefetched activities - at any depth
+            with self.assertNumQueries(4):
+                response = self._get(url)
+            pages.append(response.context["object_list"])
+            seen += [status.pk for status in pages[-1]]
+            url = response.context.get("next_url") and (
+                self.url + response.context["next_url"]
+            )
+
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(page) for page in pages], [50, 50, 20])
+
+        response = self._get(self.url + response.context["previous_url"])
+        self.assertEqual(list(response.context["object_list"]), list(pages[1]))
+        self.assertIn("next_url", response.context)
+
+        self.assertEqual(self._get(self.url, after="nonsense").status_code, 404)
+
+    def test_text_projection(self):
+        Status.objects.create(
+            user=self.user, text="-----BEGIN PGP MESSAGE-----\nsecret"
+        )
+        Status.objects.create(user=self.user, text="plain " + "y" * 100)
+
+        response = self._get(self.url)
+
+        self.assertNotContains(response, "secret")
+        self.assertContains(response, "ph-lock-simple")
+        self.assertContains(response, "plain " + "y" * 58 + "\n")
+        self.assertNotContains(response, "y" * 59)
+
+
+class ChartCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="chart-user",
+            password="secret",
+        )
+        self.good = Mood.objects.create(user=self.user, name="Good", value=4)
+        self.walk = Activity.objects.create(user=self.user, name="Walk")
+        self.client.force_login(self.user)
+
+    def _get(self, url, **headers):
+        return self.client.get(url, HTTP_HOST=settings.ALLOWED_HOSTS[0], **headers)
+
+    def test_revalidation(self):
+        Status.objects.create(user=self.user, mood=self.good)
+        url = reverse("mood:statistics_pies")
+
+        response = self._get(url)
+        etag = response["ETag"]
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        response = self._get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        self.assertNotEqual(self._get(reverse("mood:statistics_plot"))["ETag"], etag)
+
+        Status.objects.create(user=self.user, mood=self.good)
+
+        response = self._get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_render_is_cached(self):
+        Status.objects.create(user=self.user, mood=self.good)
+        url = reverse("mood:statistics_activity_pies", args=[self.walk.pk])
+
+        content = self._get(url).content
+
+        # Session, user, activity and version token - no rendering queries
+        with self.assertNumQueries(4):
+            self.assertEqual(self._get(url).content, content)
+
+    def test_writes_change_etag(self):
+        status = Status.objects.create(user=self.user, mood=self.good)
+        url = reverse("mood:statistics_activity_plot", args=[self.walk.pk])
+        etags = [self._get(url)["ETag"]]
+
+        for change in (
+            lambda: StatusActivity.objects.create(status=status, activity=self.walk),
+            lambda: StatusActivity.objects.filter(status=status).delete(),
+            lambda: Mood.objects.filter(pk=self.good.pk).first().save(),
+            lambda: status.delete(),
+        ):
+            change()
+            etags.append(self._get(url)["ETag"])
+
+        self.assertEqual(len(set(etags)), len(etags))
+
+    def test_foreign_activity(self):
+        other = get_user_model().objects.create_user(username="other", password="x")
+        foreign = Activity.objects.create(user=other, name="Walk")
+
+        response = self._get(
+            reverse("mood:statistics_activity_plot", args=[foreign.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_json_items(self):
+        Status.objects.create(user=self.user, mood=self.good)
+        StatusActivity.objects.create(
+            status=Status.objects.create(user=self.user, mood=self.good),
+            activity=self.walk,
+        )
+
+        for name, args in (
+            ("mood:statistics_plot_json", []),
+            ("mood:statistics_pies_json", []),
+            ("mood:statistics_activity_plot_json", [self.walk.pk]),
+            ("mood:statistics_activity_pies_json", [self.walk.pk]),
+        ):
+            response = self._get(reverse(name, args=args))
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertIn("doc", response.json())
+            self.assertNotIn(b"<script", response.content)
+
+        html = self._get(reverse("mood:statistics_plot"))
+        self.assertNotEqual(html["ETag"], response["ETag"])
+
+    def test_statistics_page_loads_bokehjs(self):
+        response = self._get(reverse("mood:statistics"))
+
+        self.assertContains(response, "bokeh/js/bokeh.min.js")
+        self.assertContains(response, 'data-chart="plot/json/"')
+
+
+class EncryptionJobTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="encrypt-user",
+            password="secret",
+        )
+        self.user.userprofile.pgp_key = ALICE_KEY
+        self.user.userprofile.save()
+        self.addCleanup(keyrings.clear)
+
+        self.statuses = [
+            Status.objects.create(user=self.user, text=f"Entry {index}")
+            for index in range(5)
+        ]
+        Status.objects.create(user=self.user, text="")
+        self.dream = Dream.objects.create(
+            user=self.user, title="Flying", content="Over the sea", type=0
+        )
+
+        self.client.force_login(self.user)
+        self.url = reverse("mood:encryptor")
+
+    def _encrypted(self):
+        return Status.objects.filter(user=self.user, is_encrypted=True).count()
+
+    def test_is_encrypted_follows_text(self):
+        status = self.statuses[0]
+        self.assertFalse(status.is_encrypted)
+
+        status.text = "-----BEGIN PGP MESSAGE-----\nsecret"
+        status.save(update_fields=["text"])
+        status.refresh_from_db()
+        self.assertTrue(status.is_encrypted)
+
+    def test_encrypts_in_chunks(self):
+        job = encryption.start(self.user)
+        self.assertEqual(job.total, 6)
+
+        with (
+            mock.patch.object(encryption, "CHUNK_SIZE", 2),
+            mock.patch.object(
+                Status.objects, "bulk_update", wraps=Status.objects.bulk_update
+            ) as bulk_update,
+        ):
+            self.assertTrue(encryption.run(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, EncryptionJob.States.DONE)
+        self.assertEqual(job.done, 6)
+        self.assertEqual(bulk_update.call_count, 3)
+
+        self.assertEqual(self._encrypted(), 5)
+        for status in Status.objects.filter(user=self.user, is_encrypted=True):
+            self.assertTrue(status.text.startswith("-----BEGIN PGP MESSAGE"))
+        self.dream.refresh_from_db()
+        self.assertTrue(self.dream.is_encrypted)
+
+    def test_job_resumes_after_deadline(self):
+        job = encryption.start(self.user)
+
+        with mock.patch.object(encryption, "CHUNK_SIZE", 2):
+            encryption.run(job, deadline=timezone.now())
+            job.refresh_from_db()
+            self.assertEqual(job.state, EncryptionJob.States.PENDING)
+            self.assertEqual(self._encrypted(), 0)
+
+            encryption.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, EncryptionJob.States.DONE)
+        self.assertEqual(self._encrypted(), 5)
+
+    def test_running_job_is_not_claimed_twice(self):
+        job = encryption.start(self.user)
+        EncryptionJob.objects.filter(pk=job.pk).update(
+            state=EncryptionJob.States.RUNNING
+        )
+
+        self.assertFalse(encryption.run(job))
+        self.assertEqual(self._encrypted(), 0)
+
+    def test_edited_entry_is_left_alone(self):
+        status = self.statuses[0]
+        encrypt_chunk = encryption._encrypt_chunk
+
+        def edited(*args):
+            # Edited after the chunk was read, before it is written back
+            Status.objects.filter(pk=status.pk).update(text="Edited")
+            return encrypt_chunk(*args)
+
+        job = encryption.start(self.user)
+        with mock.patch.object(encryption, "_encrypt_chunk", side_effect=edited):
+            encryption.run(job)
+
+        status.refresh_from_db()
+        self.assertEqual(status.text, "Edited")
+        self.assertEqual(self._encrypted(), 4)
+
+    def test_invalid_key_fails_job(self):
+        self.user.userprofile.pgp_key = "not a key"
+        self.user.userprofile.save()
+
+        job = encryption.start(self.user)
+        encryption.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, EncryptionJob.States.FAILED)
+        self.assertIn("Could not import", job.error)
+        self.assertEqual(self._encrypted(), 0)
+
+    def test_encryptor_view_reports_progress(self):
+        host = settings.ALLOWED_HOSTS[0]
+
+        response = self.client.get(self.url, HTTP_HOST=host)
+        self.assertContains(response, "<strong>6</strong> unencrypted")
+
+        with mock.patch.object(encryption, "REQUEST_BUDGET", timedelta(0)):
+            response = self.client.post(self.url, HTTP_HOST=host)
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+
+        response = self.client.get(self.url, HTTP_HOST=host)
+        self.assertContains(
+            response, "<strong>0</strong>\n        of <strong>6</strong>"
+        )
+
+        call_command("encryptentries", stdout=StringIO())
+
+        response = self.client.get(self.url, HTTP_HOST=host)
+        self.assertContains(response, "Successfully encrypted 6 entries.")
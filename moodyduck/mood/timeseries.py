@@ -0,0 +1,156 @@
+"""
+Columnar per-user mood time series.
+
+All mood entries of a user are kept as NumPy arrays sorted by time, built once
+from a single query and cached under the user's "mood-series" version token.
+Newly created entries are appended to the cached series instead of rebuilding
+it; any other change just invalidates it. Chart builders slice the arrays with
+``searchsorted`` instead of querying the database again.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from django.core.cache import cache
+from django.db import transaction
+
+from moodyduck.common.versioning import bump_version, get_version, swap_version
+
+from .models import Mood, Status
+
+SCOPE = "mood-series"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def epoch(timestamp) -> int:
+    """Convert an aware datetime to the microseconds used in the series."""
+    return (timestamp - EPOCH) // MICROSECOND
+
+
+@dataclass
+class MoodSeries:
+    #: Status primary keys, int64
+    ids: np.ndarray
+    #: Timestamps in microseconds since the epoch, int64, sorted ascending
+    timestamps: np.ndarray
+    #: Mood values, uint8
+    values: np.ndarray
+    #: Indices into ``mood_ids``, uint16
+    codes: np.ndarray
+    #: Primary keys of the moods referenced by ``codes``
+    mood_ids: list[int]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def build(cls, user) -> MoodSeries:
+        rows = list(
+            Status.objects.filter(user=user, mood__isnull=False)
+            .order_by("timestamp", "id")
+            .values_list("id", "timestamp", "mood_id", "mood__value")
+        )
+
+        mood_ids = sorted({row[2] for row in rows})
+        lookup = {mood_id: code for code, mood_id in enumerate(mood_ids)}
+
+        return cls(
+            ids=np.fromiter((row[0] for row in rows), np.int64, len(rows)),
+            timestamps=np.fromiter(
+                (epoch(row[1]) for row in rows), np.int64, len(rows)
+            ),
+            values=np.fromiter((row[3] for row in rows), np.uint8, len(rows)),
+            codes=np.fromiter((lookup[row[2]] for row in rows), np.uint16, len(rows)),
+            mood_ids=mood_ids,
+        )
+
+    def can_append(self, status) -> bool:
+        return not len(self) or epoch(status.timestamp) >= self.timestamps[-1]
+
+    def append(self, status, value: int) -> MoodSeries:
+        """Return a new series with the given (newest) status added."""
+        mood_ids = self.mood_ids
+
+        if status.mood_id not in mood_ids:
+            mood_ids = mood_ids + [status.mood_id]
+
+        return MoodSeries(
+            ids=np.append(self.ids, np.int64(status.pk)),
+            timestamps=np.append(self.timestamps, np.int64(epoch(status.timestamp))),
+            values=np.append(self.values, np.uint8(value)),
+            codes=np.append(self.codes, np.uint16(mood_ids.index(status.mood_id))),
+            mood_ids=mood_ids,
+        )
+
+    def window(self, start=None, end=None) -> MoodSeries:
+        """Return the entries with start <= timestamp <= end (both optional)."""
+        lower = 0 if start is None else np.searchsorted(self.timestamps, epoch(start))
+        upper = (
+            len(self)
+            if end is None
+            else np.searchsorted(self.timestamps, epoch(end), side="right")
+        )
+        return self[lower:upper]
+
+    def only(self, status_ids) -> MoodSeries:
+        """Return the entries belonging to the given statuses."""
+        return self[np.isin(self.ids, np.fromiter(status_ids, np.int64))]
+
+    def __getitem__(self, key) -> MoodSeries:
+        return MoodSeries(
+            ids=self.ids[key],
+            timestamps=self.timestamps[key],
+            values=self.values[key],
+            codes=self.codes[key],
+            mood_ids=self.mood_ids,
+        )
+
+
+def _cache_key(user_id, version):
+    return f"mood:series:{user_id}:{version}"
+
+
+def get_series(user) -> MoodSeries:
+    """Return the cached mood series of a user, building it if necessary."""
+    version = get_version(user, SCOPE)
+    key = _cache_key(user.pk, version)
+
+    series = cache.get(key)
+    if series is None:
+        series = MoodSeries.build(user)
+        cache.set(key, series, CACHE_TIMEOUT)
+
+    return series
+
+
+def status_created(status) -> None:
+    """Append a new status to the cached series, or invalidate it."""
+    if status.mood_id is None:
+        return
+
+    version = get_version(status.user_id, SCOPE)
+    new_version = swap_version(status.user_id, SCOPE, version)
+    if new_version is None:
+        return
+
+    def update_cache():
+        series = cache.get(_cache_key(status.user_id, version))
+        if series is not None and series.can_append(status):
+            cache.set(
+                _cache_key(status.user_id, new_version),
+                series.append(status, status.mood.value),
+                CACHE_TIMEOUT,
+            )
+
+    transaction.on_commit(update_cache)
+
+
+def invalidate(user) -> None:
+    bump_version(user, SCOPE)
@@ -85,6 +85,16 @@ urlpatterns = [
     ),
     path("statistics/plot/", MoodPlotView.as_view(), name="statistics_plot"),
     path("statistics/pies/", MoodPiesView.as_view(), name="statistics_pies"),
+    path(
+        "statistics/plot/json/",
+        MoodPlotView.as_view(output="json"),
+        name="statistics_plot_json",
+    ),
+    path(
+        "statistics/pies/json/",
+        MoodPiesView.as_view(output="json"),
+        name="statistics_pies_json",
+    ),
     path(
         "statistics/activity/<int:id>/",
         ActivityStatisticsView.as_view(),
@@ -100,4 +110,14 @@ urlpatterns = [
         ActivityPiesView.as_view(),
         name="statistics_activity_pies",
     ),
+    path(
+        "statistics/activity/<int:id>/plot/json/",
+        ActivityPlotView.as_view(output="json"),
+        name="statistics_activity_plot_json",
+    ),
+    path(
+        "statistics/activity/<int:id>/pies/json/",
+        ActivityPiesView.as_view(output="json"),
+        name="statistics_activity_pies_json",
+    ),
 ]
@@ -10,36 +10,52 @@ from django.views.generic import (
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, StreamingHttpResponse
 from django.http import Http404
 from django.utils import timezone
 from django.views.decorators.clickjacking import xframe_options_sameorigin
 from django.utils.decorators import method_decorator
 from django.templatetags.static import static
 from django.utils.translation import gettext_lazy as _
-
-from .models import Status, Activity, Mood, StatusMedia, StatusActivity
+from django.db.models import Prefetch
+from django.db.models.functions import Substr
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .models import (
+    EncryptionJob,
+    Status,
+    Activity,
+    Mood,
+    StatusMedia,
+    StatusActivity,
+    DailyMoodRollup,
+)
 from .forms import StatusForm
 from .statistics import moodstats, activitystats, moodpies, activitymood, activitypies
+from .charts import cached_chart, chart_etag, chart_key
+from .export import csv_rows, gzip_stream
+from . import encryption
 
 from moodyduck.common.helpers import get_upload_path
-from moodyduck.common.templatetags.images import hvhtml, bkhtml
+from moodyduck.common.keyring import KeyImportError, keyrings
+from moodyduck.common.pagination import KeysetPaginator
+from moodyduck.common.templatetags.images import bkhtml, bkjson, hvmodel
 from moodyduck.msgio.models import NotificationDailySchedule, Notification
 
 from dateutil import relativedelta
 
 from datetime import datetime
+from urllib.parse import urlencode
+from importlib.metadata import version
 
 import json
-import tempfile
 import logging
 
-import gnupg
-
 
 class StatusListView(LoginRequiredMixin, ListView):
     template_name = "mood/status_list.html"
     model = Status
+    paginate_by = 50
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -48,19 +64,58 @@ class StatusListView(LoginRequiredMixin, ListView):
         context["buttons"] = [
             (reverse_lazy("mood:status_create"), _("New Status"), "plus")
         ]
+
+        page = context["page_obj"]
+        if page.has_next:
+            context["next_url"] = self._page_url(after=page.next_cursor)
+        if page.has_previous:
+            context["previous_url"] = self._page_url(before=page.previous_cursor)
+
         return context
 
+    def _page_url(self, **cursor):
+        params = self.request.GET.copy()
+        params.pop("after", None)
+        params.pop("before", None)
+        params.update(cursor)
+        return "?" + params.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = KeysetPaginator(queryset, page_size).page(
+                after=self.request.GET.get("after"),
+                before=self.request.GET.get("before"),
+            )
+        except ValueError:
+            raise Http404(_("Invalid page cursor"))
+
+        return None, page, page.object_list, page.has_next or page.has_previous
+
     def get_queryset(self):
-        status_list = Status.objects.filter(user=self.request.user).order_by(
-            "timestamp"
+        status_list = (
+            Status.objects.filter(user=self.request.user)
+            .select_related("mood")
+            .prefetch_related(
+                Prefetch(
+                    "statusactivity_set",
+                    queryset=StatusActivity.objects.select_related("activity"),
+                )
+            )
+            # Only a prefix of the (possibly PGP armoured) text is needed
+            .defer("text")
+            .annotate(text_prefix=Substr("text", 1, 64))
         )
 
         if "from" in self.request.GET:
-            from_timestamp = datetime.strptime(self.request.GET["from"], "%Y-%m-%d")
+            from_timestamp = timezone.make_aware(
+                datetime.strptime(self.request.GET["from"], "%Y-%m-%d")
+            )
             status_list = status_list.filter(timestamp__gte=from_timestamp)
 
         if "to" in self.request.GET:
-            to_timestamp = datetime.strptime(self.request.GET["to"], "%Y-%m-%d")
+            to_timestamp = timezone.make_aware(
+                datetime.strptime(self.request.GET["to"], "%Y-%m-%d")
+            )
             to_timestamp = to_timestamp.replace(hour=23, minute=59, second=59)
             status_list = status_list.filter(timestamp__lte=to_timestamp)
 
@@ -137,39 +192,26 @@ class StatusCreateView(LoginRequiredMixin, CreateView):
             and self.request.user.userprofile.pgp_key
             and form.instance.text
         ):
-            with tempfile.TemporaryDirectory() as gnupghome:
-                gpg = gnupg.GPG(gnupghome=gnupghome)
-                gpg.encoding = "utf-8"
-
-                if form.instance.is_encrypted:
-                    logging.info("Content is already encrypted, skipping encryption.")
+            if form.instance.is_encrypted:
+                logging.info("Content is already encrypted, skipping encryption.")
+            else:
+                try:
+                    with keyrings.keyring(
+                        self.request.user.userprofile.pgp_key, user=self.request.user
+                    ) as keyring:
+                        encrypted = keyring.encrypt(form.instance.text)
+                except KeyImportError:
+                    logging.error("No public keys imported")
+                    form.add_error(None, "Invalid PGP Key: No keys imported")
+                    return super().form_invalid(form)
+
+                if encrypted.ok:
+                    form.instance.text = str(encrypted)
+                    form.instance.save()
                 else:
-                    # Import the user's public key
-                    import_result = gpg.import_keys(
-                        self.request.user.userprofile.pgp_key
-                    )
-
-                    if import_result.count == 0:
-                        logging.error("No public keys imported")
-                        form.add_error(None, "Invalid PGP Key: No keys imported")
-                        return super().form_invalid(form)
-
-                    # Use the first imported key's fingerprint as recipient
-                    recipient_fingerprint = import_result.fingerprints[0]
-
-                    encrypted = gpg.encrypt(
-                        form.instance.text,
-                        recipients=[recipient_fingerprint],
-                        always_trust=True,
-                    )
-
-                    if encrypted.ok:
-                        form.instance.text = str(encrypted)
-                        form.instance.save()
-                    else:
-                        logging.error(f"Error encrypting: {encrypted.status}")
-                        form.add_error(None, f"Error encrypting: {encrypted.status}")
-                        return super().form_invalid(form)
+                    logging.error(f"Error encrypting: {encrypted.status}")
+                    form.add_error(None, f"Error encrypting: {encrypted.status}")
+                    return super().form_invalid(form)
 
         return ret
 
@@ -473,94 +515,162 @@ class NotificationDeleteView(LoginRequiredMixin, DeleteView):
         return reverse_lazy("mood:notification_list")
 
 
+def date_range(params):
+    """Parse the optional ``start`` and ``end`` dates (YYYY-MM-DD) of a request.
+
+    Returns aware datetimes for the start of the first and the end of the last
+    day, either of which may be None.
+    """
+    mindate = maxdate = None
+
+    if params.get("start"):
+        mindate = timezone.make_aware(datetime.strptime(params["start"], "%Y-%m-%d"))
+
+    if params.get("end"):
+        maxdate = timezone.make_aware(
+            datetime.strptime(params["end"], "%Y-%m-%d")
+        ) + relativedelta.relativedelta(days=1)
+
+    return mindate, maxdate
+
+
+def chart_scripts():
+    """Scripts needed to embed the json_item charts on a page."""
+    return [
+        static("bokeh/js/bokeh.min.js") + "?v=" + version("bokeh"),
+        static("mood/charts.js"),
+    ]
+
+
 class MoodStatisticsView(LoginRequiredMixin, TemplateView):
     template_name = "mood/statistics.html"
 
     def get_context_data(self, **kwargs):
-        startdate = self.request.GET.get("start")
-        enddate = self.request.GET.get("end")
-
-        if enddate:
-            maxdate = datetime.strptime(enddate, "%Y-%m-%d")
-        else:
-            maxdate = timezone.now()
-
-        if startdate:
-            mindate = datetime.strptime(startdate, "%Y-%m-%d")
-        else:
-            mindate = maxdate - relativedelta.relativedelta(weeks=1)  # noqa: F841
-            # TODO: Do something with this...?
+        mindate, maxdate = date_range(self.request.GET)
 
         context = super().get_context_data(**kwargs)
         context["title"] = _("Statistics")
         context["activities"] = activitystats(self.request.user)
+        context["scripts"] = chart_scripts()
+
+        if mindate or maxdate:
+            context["chart_query"] = "?" + urlencode(
+                {
+                    key: self.request.GET[key]
+                    for key in ("start", "end")
+                    if key in self.request.GET
+                }
+            )
+
         return context
 
 
 class MoodCSVView(LoginRequiredMixin, View):
-    def get(self, request, *args, **kwargs):
-        res = HttpResponse(content_type="text/csv")
-        res["content-disposition"] = 'filename="mood.csv"'
+    """Streams the user's mood entries as CSV.
 
-        startdate = request.GET.get("start")
-        enddate = request.GET.get("end")
+    Query parameters:
 
-        maxdate = None
-        mindate = None
+    - ``start``, ``end``: dates (YYYY-MM-DD, both inclusive), each optional.
+      Without either, the last week is exported.
+    - ``all``: export the full history, ignoring ``start`` and ``end``.
+    - ``activities``: add a column with the names of each entry's activities.
+    - ``gzip``: return a gzip compressed file.
+    """
 
-        if enddate:
-            maxdate = datetime.strptime(enddate, "%Y-%m-%d")
+    def get(self, request, *args, **kwargs):
+        if "all" in request.GET:
+            mindate = maxdate = None
+        else:
+            mindate, maxdate = date_range(request.GET)
 
-            if not startdate:
+            if not (mindate or maxdate):
+                maxdate = timezone.now()
                 mindate = maxdate - relativedelta.relativedelta(weeks=1)
 
-        if startdate:
-            mindate = datetime.strptime(startdate, "%Y-%m-%d")
+        rows = csv_rows(request.user, mindate, maxdate, "activities" in request.GET)
 
-            if not enddate:
-                maxdate = mindate + relativedelta.relativedelta(weeks=1)
+        if "gzip" in request.GET:
+            res = StreamingHttpResponse(
+                gzip_stream(rows), content_type="application/gzip"
+            )
+            res["content-disposition"] = 'attachment; filename="mood.csv.gz"'
+        else:
+            res = StreamingHttpResponse(rows, content_type="text/csv")
+            res["content-disposition"] = 'filename="mood.csv"'
 
-        if not maxdate:
-            maxdate = timezone.now()
-            mindate = maxdate - relativedelta.relativedelta(weeks=1)
+        return res
 
-        output = "date,value"
 
-        for status in Status.objects.filter(
-            user=request.user, timestamp__gte=mindate, timestamp__lte=maxdate
-        ):
-            if status.mood:
-                date = status.timestamp.strftime("%Y-%m-%d %H:%M")
-                output += f"\n{date},{status.mood.value}"
+class ChartView(LoginRequiredMixin, View):
+    """Serves a rendered chart from the render cache.
 
-        res.write(output)
-        return res
+    Subclasses set ``chart_name`` and implement ``build_chart()``, returning a
+    Bokeh object. With ``output = "html"`` the chart is delivered as a
+    standalone document for an iframe, with ``output = "json"`` as a
+    ``json_item`` payload for ``Bokeh.embed.embed_item()`` on a page that loads
+    BokehJS itself. The output is cached per user, chart and parameters, and
+    comes with a strong ETag so that it can be revalidated with a 304 instead
+    of re-rendered.
+    """
 
+    chart_name = None
+    output = "html"
 
-class MoodPlotView(LoginRequiredMixin, View):
     @method_decorator(xframe_options_sameorigin)
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
 
-    def get(self, request, *args, **kwargs):
-        res = HttpResponse(content_type="text/html")
+    def get_chart_params(self):
+        return ()
 
-        res.write(hvhtml(moodstats(request.user)))
-        return res
+    def build_chart(self):
+        raise NotImplementedError
 
+    def render_chart(self):
+        if self.output == "json":
+            return bkjson(self.build_chart())
 
-class MoodPiesView(LoginRequiredMixin, View):
-    @method_decorator(xframe_options_sameorigin)
-    def dispatch(self, *args, **kwargs):
-        return super().dispatch(*args, **kwargs)
+        return bkhtml(self.build_chart())
 
     def get(self, request, *args, **kwargs):
-        res = HttpResponse(content_type="text/html")
+        key = chart_key(
+            request.user, self.chart_name, self.output, *self.get_chart_params()
+        )
+        etag = chart_etag(key)
+
+        res = get_conditional_response(request, etag=etag)
 
-        res.write(bkhtml(moodpies(request.user)))
+        if res is None:
+            res = HttpResponse(
+                cached_chart(key, self.render_chart),
+                content_type=(
+                    "application/json" if self.output == "json" else "text/html"
+                ),
+            )
+
+        res["ETag"] = etag
+        patch_cache_control(res, private=True, no_cache=True)
         return res
 
 
+class MoodPlotView(ChartView):
+    chart_name = "plot"
+
+    def get_chart_params(self):
+        self.range = date_range(self.request.GET)
+        return tuple(date.isoformat() if date else "" for date in self.range)
+
+    def build_chart(self):
+        return hvmodel(moodstats(self.request.user, *self.range))
+
+
+class MoodPiesView(ChartView):
+    chart_name = "pies"
+
+    def build_chart(self):
+        return moodpies(self.request.user)
+
+
 class ActivityStatisticsView(LoginRequiredMixin, TemplateView):
     template_name = "mood/statistics_activity.html"
 
@@ -568,43 +678,30 @@ class ActivityStatisticsView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         activity = get_object_or_404(Activity, user=self.request.user, id=kwargs["id"])
         context["title"] = _("Activity Statistics for %s") % activity.name
+        context["scripts"] = chart_scripts()
         return context
 
 
-class ActivityPlotView(LoginRequiredMixin, View):
-    @method_decorator(xframe_options_sameorigin)
-    def dispatch(self, *args, **kwargs):
-        return super().dispatch(*args, **kwargs)
+class ActivityChartView(ChartView):
+    def get_chart_params(self):
+        self.activity = get_object_or_404(
+            Activity, user=self.request.user, id=self.kwargs["id"]
+        )
+        return (self.activity.pk,)
 
-    def get(self, request, *args, **kwargs):
-        res = HttpResponse(content_type="text/html")
 
-        res.write(
-            hvhtml(
-                activitymood(
-                    get_object_or_404(Activity, user=request.user, id=kwargs["id"])
-                )
-            )
-        )
-        return res
+class ActivityPlotView(ActivityChartView):
+    chart_name = "activity-plot"
 
+    def build_chart(self):
+        return hvmodel(activitymood(self.activity))
 
-class ActivityPiesView(LoginRequiredMixin, View):
-    @method_decorator(xframe_options_sameorigin)
-    def dispatch(self, *args, **kwargs):
-        return super().dispatch(*args, **kwargs)
 
-    def get(self, request, *args, **kwargs):
-        res = HttpResponse(content_type="text/html")
+class ActivityPiesView(ActivityChartView):
+    chart_name = "activity-pies"
 
-        res.write(
-            bkhtml(
-                activitypies(
-                    get_object_or_404(Activity, user=request.user, id=kwargs["id"])
-                )
-            )
-        )
-        return res
+    def build_chart(self):
+        return activitypies(self.activity)
 
 
 class MoodCountHeatmapJSONView(LoginRequiredMixin, View):
@@ -621,45 +718,26 @@ class MoodCountHeatmapJSONView(LoginRequiredMixin, View):
         end = request.GET.get("end")
 
         if end:
-            maxdate = datetime.strptime(end, "%Y-%m-%d")
-            maxdate = maxdate.replace(hour=23, minute=59, second=59)
+            maxdate = datetime.strptime(end, "%Y-%m-%d").date()
         else:
-            maxdate = timezone.now()
+            maxdate = timezone.localdate()
 
         if start:
-            mindate = datetime.strptime(start, "%Y-%m-%d")
+            mindate = datetime.strptime(start, "%Y-%m-%d").date()
         else:
             mindate = maxdate - relativedelta.relativedelta(years=1)
 
-        data = Status.objects.filter(
-            user=request.user, timestamp__gte=mindate, timestamp__lte=maxdate
+        data = DailyMoodRollup.objects.filter(
+            user=request.user, date__gte=mindate, date__lte=maxdate
         )
 
-        output = {}
-
-        for entry in data:
-            date = entry.timestamp.strftime("%Y-%m-%d")
-
-            if date not in output:
-                output[date] = {"count": 0, "total": 0, "moodcount": 0}
-
-            if entry.mood:
-                output[date]["total"] += entry.mood.value
-                output[date]["moodcount"] += 1
-
-            output[date]["count"] += 1
-
         output = [
             {
-                "date": key,
-                "count": value["count"],
-                "average": (
-                    (value["total"] / value["moodcount"])
-                    if value["moodcount"] > 0
-                    else 0
-                ),
+                "date": rollup.date.strftime("%Y-%m-%d"),
+                "count": rollup.count,
+                "average": rollup.average or 0,
             }
-            for key, value in output.items()
+            for rollup in data
         ]
 
         res.write(json.dumps(output))
@@ -689,11 +767,13 @@ class MoodHeatmapValuesJSONView(LoginRequiredMixin, View):
 
 
 class EncryptorView(LoginRequiredMixin, View):
-    """Bulk-encrypt existing mood entries using the user's stored PGP public key.
+    """Bulk-encrypt existing entries using the user's stored PGP public key.
 
     Requires the user to have a PGP key saved in their profile. If not, they
     are redirected to profile settings. On GET, shows a confirmation page with
-    the count of unencrypted entries. On POST, encrypts them all.
+    the count of unencrypted entries, or the progress of a running job. On
+    POST, starts an encryption job, which continues in the background (see
+    ``moodyduck.mood.encryption``) if it does not finish right away.
     """
 
     template_name = "mood/encryptor.html"
@@ -704,96 +784,44 @@ class EncryptorView(LoginRequiredMixin, View):
         except Exception:
             return None
 
-    def get(self, request, *args, **kwargs):
-        from django.shortcuts import render, redirect
+    def _missing_key(self, request):
+        from django.shortcuts import redirect
         from django.contrib import messages
 
-        pgp_key = self._get_pgp_key()
-        if not pgp_key:
-            messages.warning(
-                request,
-                "You need to add a PGP public key to your profile before you can encrypt entries.",
-            )
-            return redirect("profiles:profile_edit")
-
-        unencrypted_count = (
-            Status.objects.filter(user=request.user)
-            .exclude(text__startswith="-----BEGIN PGP MESSAGE-----")
-            .filter(text__isnull=False)
-            .exclude(text="")
-            .count()
+        messages.warning(
+            request,
+            "You need to add a PGP public key to your profile before you can encrypt entries.",
         )
+        return redirect("profiles:profile_edit")
+
+    def get(self, request, *args, **kwargs):
+        from django.shortcuts import render
+
+        if not self._get_pgp_key():
+            return self._missing_key(request)
+
+        job = EncryptionJob.objects.filter(user=request.user).first()
 
         return render(
-            request, self.template_name, {"unencrypted_count": unencrypted_count}
+            request,
+            self.template_name,
+            {
+                "unencrypted_count": encryption.unencrypted_count(request.user),
+                "job": job,
+            },
         )
 
     def post(self, request, *args, **kwargs):
-        from django.shortcuts import render, redirect
-        from django.contrib import messages
+        from django.shortcuts import redirect
 
-        pgp_key = self._get_pgp_key()
-        if not pgp_key:
-            messages.warning(
-                request,
-                "You need to add a PGP public key to your profile before you can encrypt entries.",
-            )
-            return redirect("profiles:profile_edit")
+        if not self._get_pgp_key():
+            return self._missing_key(request)
 
-        encrypted_count = 0
-        error = None
+        job = EncryptionJob.objects.filter(user=request.user).first()
+        if not (job and job.active):
+            job = encryption.start(request.user)
 
-        with tempfile.TemporaryDirectory() as tempdir:
-            gpg = gnupg.GPG(gnupghome=tempdir)
-            gpg.encoding = "utf-8"
+        # Small diaries are done right away, the rest is left to cron
+        encryption.run(job, timezone.now() + encryption.REQUEST_BUDGET)
 
-            try:
-                imported_keys = gpg.import_keys(pgp_key)
-            except Exception as e:
-                error = str(e)
-            else:
-                if not imported_keys.count:
-                    error = "Could not import your stored PGP key. Please check the key in your profile settings."
-                else:
-                    for status in Status.objects.filter(user=request.user):
-                        if not status.is_encrypted and status.text:
-                            encrypted = gpg.encrypt(
-                                status.text,
-                                imported_keys.fingerprints,
-                                always_trust=True,
-                            )
-                            if encrypted.ok:
-                                status.text = encrypted.data.decode()
-                                status.save()
-                                encrypted_count += 1
-                            else:
-                                logging.error(
-                                    f"Error encrypting entry {status.id}: {encrypted.status}"
-                                )
-                                if encrypted.status == "invalid recipient":
-                                    logging.error(encrypted.status_detail)
-                                error = f"Error encrypting entry: {encrypted.status}"
-                                break
-
-        if error:
-            unencrypted_count = (
-                Status.objects.filter(user=request.user)
-                .exclude(text__startswith="-----BEGIN PGP MESSAGE-----")
-                .filter(text__isnull=False)
-                .exclude(text="")
-                .count()
-            )
-            return render(
-                request,
-                self.template_name,
-                {
-                    "unencrypted_count": unencrypted_count,
-                    "error": error,
-                },
-            )
-
-        messages.success(
-            request,
-            f"Successfully encrypted {encrypted_count} entr{'y' if encrypted_count == 1 else 'ies'}.",
-        )
-        return redirect("mood:status_list")
+        return redirect("mood:encryptor")
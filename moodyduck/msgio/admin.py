@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Count, Q
+from django.utils import timezone
 
 from .models import (
     GatewayUser,
@@ -7,6 +9,7 @@ from .models import (
     NotificationDailySchedule,
     NotificationDatetimeSchedule,
     NotificationDispatcher,
+    OutboundMessage,
     TelegramPairingToken,
 )
 
@@ -80,14 +83,14 @@ class NotificationDispatcherAdmin(admin.ModelAdmin):
 
 @admin.register(NotificationDatetimeSchedule)
 class NotificationDatetimeScheduleAdmin(admin.ModelAdmin):
-    list_display = ("notification", "datetime", "sent")
+    list_display = ("notification", "datetime", "sent", "next_fire_at")
     list_filter = ("sent",)
     raw_id_fields = ("notification",)
 
 
 @admin.register(NotificationDailySchedule)
 class NotificationDailyScheduleAdmin(admin.ModelAdmin):
-    list_display = ("notification", "time", "last_sent")
+    list_display = ("notification", "time", "last_sent", "next_fire_at")
     raw_id_fields = ("notification",)
 
 
@@ -100,3 +103,51 @@ class TelegramPairingTokenAdmin(admin.ModelAdmin):
 
     def has_add_permission(self, request):
         return False
+
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        "gateway",
+        "recipient_id",
+        "state",
+        "attempts",
+        "next_attempt_at",
+        "short_error",
+    )
+    list_filter = ("state", "gateway")
+    search_fields = ("key", "recipient_id", "text", "last_error")
+    readonly_fields = ("key", "attempts", "created_at", "updated_at")
+    raw_id_fields = ("notification",)
+    actions = ("retry",)
+
+    @admin.display(description="Last error")
+    def short_error(self, obj):
+        return obj.last_error[:80] + ("…" if len(obj.last_error) > 80 else "")
+
+    @admin.action(description="Retry selected dead messages")
+    def retry(self, request, queryset):
+        # Messages still being sent, or sent already, are never queued again
+        updated = queryset.filter(state=OutboundMessage.States.DEAD).update(
+            state=OutboundMessage.States.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f"{updated} message(s) queued for retry.")
+
+    def changelist_view(self, request, extra_context=None):
+        states = OutboundMessage.States
+        # Queue depth and failures per gateway
+        queues = (
+            OutboundMessage.objects.exclude(state=states.SENT)
+            .values("gateway")
+            .annotate(
+                pending=Count("pk", filter=Q(state=states.PENDING)),
+                retrying=Count("pk", filter=Q(state=states.PENDING, attempts__gt=0)),
+                sending=Count("pk", filter=Q(state=states.SENDING)),
+                dead=Count("pk", filter=Q(state=states.DEAD)),
+            )
+            .order_by("gateway")
+        )
+        extra_context = {**(extra_context or {}), "queues": queues}
+        return super().changelist_view(request, extra_context)
@@ -1,3 +1,5 @@
+import atexit
+
 from django.apps import AppConfig
 
 
@@ -6,9 +8,10 @@ class MsgioConfig(AppConfig):
 
     def ready(self):
         # Build the gateway registry from entry points
-        from .registry import build_registry
+        from .registry import build_registry, close_all
 
         build_registry()
+        atexit.register(close_all)
 
         # Register the unified outbound signal handler
         from . import handler  # noqa: F401
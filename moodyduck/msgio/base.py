@@ -13,6 +13,15 @@ The class must subclass BaseGateway and implement at minimum:
     gateway-specific recipient address (e.g. "chat_id", "room_id")
   - ``send_message_to(recipient_id, text)``: deliver a plain-text message
 
+Scheduled notifications are delivered concurrently (see ``msgio.delivery``)
+through ``asend_message_to``, which runs ``send_message_to`` in a worker
+thread unless a gateway overrides it with a native coroutine. ``timeout``,
+``max_concurrency`` and ``rate_limit`` bound each delivery, the number of
+deliveries in flight and the number started per second per gateway.
+
+Gateways holding connections or sessions open release them in ``close``,
+which is called for all registered gateways when the process exits.
+
 For gateways that support inbound bot commands, also register a webhook view
 in the project's URL config and call ``msgio.commands.dispatch()`` from it.
 """
@@ -20,6 +29,13 @@ in the project's URL config and call ``msgio.commands.dispatch()`` from it.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+# Runs blocking send_message_to calls during concurrent delivery. Not tied to
+# an event loop, so a send that timed out does not hold up closing the loop.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gateway")
 
 
 class BaseGateway(ABC):
@@ -31,10 +47,32 @@ class BaseGateway(ABC):
     #: Key in GatewayUserSetting that stores the per-user recipient address
     recipient_id_key: str
 
+    #: Seconds a single delivery may take during concurrent delivery
+    timeout: float = 30
+
+    #: Deliveries in flight at once during concurrent delivery
+    max_concurrency: int = 10
+
+    #: Deliveries started per second during concurrent delivery, None for no limit
+    rate_limit: float | None = None
+
     @abstractmethod
     def send_message_to(self, recipient_id: str, text: str) -> None:
         """Send a plain-text message to the given gateway-specific recipient."""
 
+    async def asend_message_to(self, recipient_id: str, text: str) -> None:
+        """
+        Async variant of send_message_to, used for concurrent delivery.
+        Defaults to running send_message_to in a worker thread; override for
+        gateways with an asynchronous client.
+        """
+        await sync_to_async(
+            self.send_message_to, thread_sensitive=False, executor=_executor
+        )(recipient_id, text)
+
+    def close(self) -> None:
+        """Release clients kept open between sends. Called on shutdown."""
+
     def send_reply(self, sender_id: str, text: str) -> None:
         """
         Send a reply to an inbound message originator.
@@ -42,19 +80,19 @@ class BaseGateway(ABC):
         """
         self.send_message_to(sender_id, text)
 
-    def send_notification(self, notification) -> None:
-        """
-        Deliver a Notification object to its recipient on this gateway.
-        Looks up the recipient's gateway address from GatewayUserSetting.
-        """
+    def recipient_for(self, notification) -> str:
+        """Look up the recipient's gateway address from GatewayUserSetting."""
         from .models import GatewayUser
-        from .helpers import run_filters
 
         settings = GatewayUser.objects.get(
             user=notification.recipient, gateway=self.name
         )
-        recipient_id = settings.gatewayusersetting_set.get(
-            key=self.recipient_id_key
-        ).value
+        return settings.gatewayusersetting_set.get(key=self.recipient_id_key).value
+
+    def send_notification(self, notification) -> None:
+        """Deliver a Notification object to its recipient on this gateway."""
+        from .helpers import run_filters
+
+        recipient_id = self.recipient_for(notification)
         text = run_filters(notification)
         self.send_message_to(recipient_id, text)
@@ -0,0 +1,72 @@
+"""
+A home for gateways' long-lived async clients.
+
+Async HTTP clients are bound to the event loop they were created on, while
+gateways are called from many threads and from short-lived loops, like the one
+``async_to_sync`` sets up for every call. A ``ClientLoop`` runs one event loop
+in a daemon thread; coroutines submitted to it from anywhere run on that
+loop, so the clients they use can be kept open between calls.
+
+The thread is only started on first use, and ``close`` runs the gateway's
+clean-up coroutine before stopping it.
+"""
+
+import asyncio
+import threading
+
+# Seconds to wait for clients to be closed on shutdown
+CLOSE_TIMEOUT = 10
+
+
+class ClientLoop:
+    def __init__(self, name: str):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _running_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name=f"{self.name}-clients",
+                    daemon=True,
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop; return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._running_loop())
+
+    def run(self, coro):
+        """Run ``coro`` on the loop and wait for its result."""
+        return self.submit(coro).result()
+
+    async def arun(self, coro):
+        """Await ``coro`` run on the loop. Cancelling this cancels it there, too."""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def close(self, coro=None):
+        """Run the clean-up coroutine ``coro``, then stop the loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+
+        if loop is None:
+            if coro is not None:
+                # Never started, so there is nothing to clean up
+                coro.close()
+            return
+
+        try:
+            if coro is not None:
+                asyncio.run_coroutine_threadsafe(coro, loop).result(CLOSE_TIMEOUT)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
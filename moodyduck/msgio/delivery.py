@@ -0,0 +1,159 @@
+"""
+Concurrent delivery of notifications.
+
+``prepare`` resolves a notification into deliveries - one per gateway it goes
+out through, with the recipient's address and the filtered text - which
+needs the database and so happens synchronously. ``deliver`` then sends a
+whole batch of them at once on an event loop, through each gateway's
+``asend_message_to``. At most ``max_concurrency`` deliveries are in flight per
+gateway, no more than ``rate_limit`` are started per second, each is given up
+after the gateway's ``timeout``, and a slow or failing gateway holds up
+neither the others nor the rest of the batch.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import async_to_sync
+
+from .base import BaseGateway
+from .helpers import run_filters
+from .registry import get_all_gateways
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Delivery:
+    gateway: BaseGateway
+    recipient_id: str
+    text: str
+    notification_id: int | None
+
+
+class RateLimit:
+    """Spaces out the start of deliveries to ``rate`` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        # Reserve the next free slot, then sleep until it comes
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+# Shared by all batches, so the limit also holds across them
+_rate_limits: dict[str, RateLimit] = {}
+_rate_limits_lock = threading.Lock()
+
+
+def _rate_limit(gateway):
+    if not gateway.rate_limit:
+        return None
+
+    with _rate_limits_lock:
+        limit = _rate_limits.get(gateway.name)
+        if limit is None or limit.interval != 1 / gateway.rate_limit:
+            limit = _rate_limits[gateway.name] = RateLimit(gateway.rate_limit)
+        return limit
+
+
+def prepare(notification, dispatchers=None):
+    """Return the deliveries that send ``notification``.
+
+    Through the gateways named in ``dispatchers``, or else through those of
+    ``notification.dispatchers()``. Gateways that are not installed, or not
+    set up for the recipient, are logged and skipped.
+    """
+    gateways = get_all_gateways()
+    deliveries = []
+    text = None
+
+    for name in dispatchers or notification.dispatchers():
+        gateway = gateways.get(name)
+        if gateway is None:
+            logger.warning("No gateway registered for %r", name)
+            continue
+
+        try:
+            recipient_id = gateway.recipient_for(notification)
+        except Exception:
+            logger.exception(
+                "Error looking up recipient of notification %d via gateway %r",
+                notification.pk,
+                name,
+            )
+            continue
+
+        if text is None:
+            text = run_filters(notification)
+
+        deliveries.append(Delivery(gateway, recipient_id, text, notification.pk))
+
+    return deliveries
+
+
+async def _send(delivery, semaphore):
+    gateway = delivery.gateway
+    limit = _rate_limit(gateway)
+    if limit is not None:
+        await limit.wait()
+
+    async with semaphore:
+        await asyncio.wait_for(
+            gateway.asend_message_to(delivery.recipient_id, delivery.text),
+            gateway.timeout,
+        )
+
+
+async def adeliver(deliveries):
+    """Send ``deliveries`` concurrently; return the exceptions, or None, in order."""
+    # Created here, as they are bound to the running loop
+    semaphores = {
+        gateway.name: asyncio.Semaphore(gateway.max_concurrency)
+        for gateway in {delivery.gateway for delivery in deliveries}
+    }
+
+    results = await asyncio.gather(
+        *(
+            _send(delivery, semaphores[delivery.gateway.name])
+            for delivery in deliveries
+        ),
+        return_exceptions=True,
+    )
+
+    for delivery, result in zip(deliveries, results):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.error(
+                "Timed out sending notification %s via gateway %r",
+                delivery.notification_id,
+                delivery.gateway.name,
+            )
+        elif isinstance(result, BaseException):
+            logger.error(
+                "Error sending notification %s via gateway %r",
+                delivery.notification_id,
+                delivery.gateway.name,
+                exc_info=result,
+            )
+
+    return results
+
+
+def deliver(deliveries):
+    """Send ``deliveries`` concurrently, from synchronous code."""
+    if not deliveries:
+        return []
+
+    return async_to_sync(adeliver)(deliveries)
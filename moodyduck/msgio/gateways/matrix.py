@@ -1,8 +1,15 @@
-from asgiref.sync import async_to_sync
-from nio import AsyncClient
+import asyncio
+
+from asgiref.sync import sync_to_async
+from nio import AsyncClient, JoinError, LoginError, RoomSendError
 from dbsettings.functions import dbsettings
 
 from ..base import BaseGateway
+from ..clients import ClientLoop
+
+
+class MatrixError(Exception):
+    """Raised if the homeserver rejects a login, join or message."""
 
 
 class MatrixGateway(BaseGateway):
@@ -13,6 +20,13 @@ class MatrixGateway(BaseGateway):
         self._username = username
         self._password = password
         self._homeserver = homeserver
+        self._clients = ClientLoop(self.name)
+        # Logged in once and reused, along with its access token and device
+        self._client = None
+        self._credentials = None
+        self._client_lock = asyncio.Lock()
+        # Rooms joined with the current client, joined lazily on first send
+        self._joined = set()
 
     @property
     def username(self):
@@ -26,16 +40,74 @@ class MatrixGateway(BaseGateway):
     def homeserver(self):
         return self._homeserver or dbsettings.MATRIX_HOMESERVER
 
-    async def _send_async(self, room_id: str, text: str) -> None:
-        client = AsyncClient(self.homeserver, self.username)
-        await client.login(self.password)
-        await client.join(room_id)
-        await client.room_send(
-            room_id=room_id,
-            message_type="m.room.message",
-            content={"msgtype": "m.text", "body": text},
-        )
-        await client.close()
+    async def _get_client(self, credentials) -> AsyncClient:
+        async with self._client_lock:
+            if self._client is not None and self._credentials != credentials:
+                await self._close_client()
+
+            if self._client is None:
+                homeserver, username, password = credentials
+                client = AsyncClient(homeserver, username)
+                response = await client.login(password, device_name="MoodyDuck")
+                if isinstance(response, LoginError):
+                    await client.close()
+                    raise MatrixError(str(response))
+
+                self._client, self._credentials = client, credentials
+
+            return self._client
+
+    async def _close_client(self) -> None:
+        client, self._client = self._client, None
+        self._credentials = None
+        self._joined.clear()
+        if client is not None:
+            await client.close()
+
+    async def _send(self, credentials, room_id: str, text: str) -> None:
+        # One retry, after logging in again or rejoining the room
+        for retry in (True, False):
+            client = await self._get_client(credentials)
+
+            if room_id not in self._joined:
+                response = await client.join(room_id)
+                if isinstance(response, JoinError):
+                    raise MatrixError(str(response))
+                self._joined.add(room_id)
+
+            response = await client.room_send(
+                room_id=room_id,
+                message_type="m.room.message",
+                content={"msgtype": "m.text", "body": text},
+            )
+            if not isinstance(response, RoomSendError):
+                return
+
+            if not retry:
+                raise MatrixError(str(response))
+
+            if response.status_code == "M_UNKNOWN_TOKEN":
+                async with self._client_lock:
+                    if self._client is client:
+                        await self._close_client()
+            elif response.status_code == "M_FORBIDDEN":
+                # Kicked or left since
+                self._joined.discard(room_id)
+            else:
+                raise MatrixError(str(response))
+
+    async def asend_message_to(self, recipient_id: str, text: str) -> None:
+        # dbsettings are loaded from the database on first use
+        credentials = await sync_to_async(
+            lambda: (self.homeserver, self.username, self.password)
+        )()
+        await self._clients.arun(self._send(credentials, recipient_id, text))
 
     def send_message_to(self, recipient_id: str, text: str) -> None:
-        async_to_sync(self._send_async)(recipient_id, text)
+        credentials = (self.homeserver, self.username, self.password)
+        self._clients.run(self._send(credentials, recipient_id, text))
+
+    def close(self) -> None:
+        self._clients.close(self._close_client())
+        # Bound to the loop just closed
+        self._client_lock = asyncio.Lock()
@@ -1,4 +1,7 @@
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from ..base import BaseGateway
 
@@ -7,9 +10,26 @@ class NtfyGateway(BaseGateway):
     name = "ntfy"
     recipient_id_key = "topic_url"
 
+    def __init__(self):
+        # Keeps connections to ntfy servers alive between messages
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.max_concurrency)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+
+            return self._session
+
     def send_message_to(self, recipient_id: str, text: str) -> None:
         """recipient_id is the full ntfy topic URL."""
-        requests.post(
+        self.session.post(
             recipient_id,
             data=text.encode("utf-8"),
             headers={
@@ -18,3 +38,10 @@ class NtfyGateway(BaseGateway):
             },
             timeout=10,
         )
+
+    def close(self) -> None:
+        with self._session_lock:
+            session, self._session = self._session, None
+
+        if session is not None:
+            session.close()
@@ -1,24 +1,64 @@
-from asgiref.sync import async_to_sync
+import asyncio
+
+from asgiref.sync import sync_to_async
 import telegram
+from telegram.request import HTTPXRequest
 from dbsettings.functions import dbsettings
 
 from ..base import BaseGateway
+from ..clients import ClientLoop
 
 
 class TelegramGateway(BaseGateway):
     name = "telegram"
     recipient_id_key = "chat_id"
+    # Telegram allows bots about 30 messages per second
+    rate_limit = 30
 
     def __init__(self, token=None):
         self._token = token
+        self._clients = ClientLoop(self.name)
+        # Initialized once and reused, along with its connection pool
+        self._bot = None
+        self._bot_lock = asyncio.Lock()
 
     @property
     def token(self):
         return self._token or dbsettings.TELEGRAM_TOKEN
 
-    async def _send_async(self, recipient_id: str, text: str) -> None:
-        async with telegram.Bot(token=self.token) as bot:
-            await bot.send_message(chat_id=recipient_id, text=text)
+    async def _get_bot(self, token: str) -> telegram.Bot:
+        async with self._bot_lock:
+            if self._bot is not None and self._bot.token != token:
+                await self._close_bot()
+
+            if self._bot is None:
+                bot = telegram.Bot(
+                    token=token,
+                    request=HTTPXRequest(connection_pool_size=self.max_concurrency),
+                )
+                await bot.initialize()
+                self._bot = bot
+
+            return self._bot
+
+    async def _close_bot(self) -> None:
+        bot, self._bot = self._bot, None
+        if bot is not None:
+            await bot.shutdown()
+
+    async def _send(self, token: str, recipient_id: str, text: str) -> None:
+        bot = await self._get_bot(token)
+        await bot.send_message(chat_id=recipient_id, text=text)
+
+    async def asend_message_to(self, recipient_id: str, text: str) -> None:
+        # dbsettings are loaded from the database on first use
+        token = await sync_to_async(lambda: self.token)()
+        await self._clients.arun(self._send(token, recipient_id, text))
 
     def send_message_to(self, recipient_id: str, text: str) -> None:
-        async_to_sync(self._send_async)(recipient_id, text)
+        self._clients.run(self._send(self.token, recipient_id, text))
+
+    def close(self) -> None:
+        self._clients.close(self._close_bot())
+        # Bound to the loop just closed
+        self._bot_lock = asyncio.Lock()
@@ -1,59 +1,114 @@
 import logging
+import uuid
 
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.utils.timezone import localtime, now
+from django.utils import timezone
 
+from moodyduck.common.helpers import user_timezone
 from moodyduck.cronhandler.signals import cron
+from moodyduck.profiles.models import UserProfile
 
-from .models import Notification
-from .registry import get_all_gateways
+from . import outbox
+from .models import NotificationDailySchedule, NotificationDatetimeSchedule
 from .signals import send_message
 
 logger = logging.getLogger(__name__)
 
+# Schedules queued per transaction
+BATCH_SIZE = 100
+
 
 @receiver(send_message)
 def outbound_dispatch(sender, **kwargs):
-    """Route outbound notifications to the appropriate gateway via registry."""
-    gateway_name = kwargs.get("dispatcher")
+    """Queue outbound notifications in the outbox of the given gateway."""
     notification = kwargs.get("notification")
 
-    gateways = get_all_gateways()
-    gateway = gateways.get(gateway_name)
-    if gateway is None:
-        logger.warning("outbound_dispatch: no gateway registered for %r", gateway_name)
-        return
+    outbox.enqueue(
+        notification,
+        f"notification:{notification.pk}:{uuid.uuid4().hex}",
+        [kwargs.get("dispatcher")],
+    )
 
-    try:
-        gateway.send_notification(notification)
-    except Exception:
-        logger.exception("Error dispatching notification via gateway %r", gateway_name)
 
+def _send_due(model, fields, now):
+    queued = []
+    failed = []
 
-@receiver(cron)
-def send_notifications(sender, **kwargs):
-    returns = []
-    for notification in Notification.objects.all():
-        for schedule in notification.notificationdatetimeschedule_set.all():
-            if not schedule.sent and schedule.datetime <= localtime(now()):
-                try:
-                    returns.append(notification.send())
-                    schedule.sent = True
-                    schedule.save()
-                except Exception:
-                    logger.exception(
-                        "Failed to send scheduled notification %d", notification.pk
-                    )
-        for daily in notification.notificationdailyschedule_set.all():
-            if (
-                (not daily.last_sent) or daily.last_sent < localtime(now()).date()
-            ) and daily.time <= localtime(now()).time():
+    while True:
+        with transaction.atomic():
+            # Rows locked by another scheduler process are left to it
+            schedules = list(
+                model.objects.select_for_update(skip_locked=True)
+                .filter(next_fire_at__lte=now)
+                .exclude(pk__in=failed)
+                .order_by("next_fire_at", "pk")[:BATCH_SIZE]
+            )
+            if not schedules:
+                return queued
+
+            # Loaded separately, so only the schedules are locked
+            prefetch_related_objects(
+                schedules,
+                "notification__recipient__userprofile",
+                "notification__notificationdispatcher_set",
+            )
+
+            fired = []
+            for schedule in schedules:
+                # Identifies this firing, so it is only queued once
+                fire = schedule.next_fire_at.isoformat()
+                key = f"{model._meta.label_lower}:{schedule.pk}:{fire}"
                 try:
-                    returns.append(notification.send())
-                    daily.last_sent = localtime(now()).date()
-                    daily.save()
+                    queued += outbox.enqueue(schedule.notification, key)
                 except Exception:
                     logger.exception(
-                        "Failed to send daily notification %d", notification.pk
+                        "Failed to queue scheduled notification %d",
+                        schedule.notification_id,
                     )
-    return returns
+                    # Retried on the next run
+                    failed.append(schedule.pk)
+                    continue
+
+                schedule.fired(now)
+                fired.append(schedule)
+
+            model.objects.bulk_update(fired, fields)
+
+
+@receiver(cron)
+def send_notifications(sender, **kwargs):
+    """Queue the notifications that are due, in batches, and send the outbox.
+
+    Only schedules whose ``next_fire_at`` has passed are looked at, and several
+    processes can run this side by side without sending anything twice.
+    """
+    now = timezone.now()
+
+    queued = _send_due(
+        NotificationDatetimeSchedule, ["sent", "next_fire_at"], now
+    ) + _send_due(NotificationDailySchedule, ["last_sent", "next_fire_at"], now)
+
+    outbox.drain()
+    return queued
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    # Daily notifications follow the recipient's time zone
+    tz = user_timezone(instance.user)
+    changed = []
+    for daily in NotificationDailySchedule.objects.filter(
+        notification__recipient_id=instance.user_id
+    ):
+        previous = daily.next_fire_at
+        daily.schedule(tz=tz)
+        if daily.next_fire_at != previous:
+            changed.append(daily)
+
+    NotificationDailySchedule.objects.bulk_update(changed, ["next_fire_at"])
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:28
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule(apps, schema_editor):
+    NotificationDatetimeSchedule = apps.get_model(
+        "msgio", "NotificationDatetimeSchedule"
+    )
+    NotificationDailySchedule = apps.get_model("msgio", "NotificationDailySchedule")
+    UserProfile = apps.get_model("profiles", "UserProfile")
+
+    for once in NotificationDatetimeSchedule.objects.filter(sent=False):
+        once.next_fire_at = once.datetime
+        once.save(update_fields=["next_fire_at"])
+
+    timezones = dict(UserProfile.objects.values_list("user_id", "timezone"))
+    now = timezone.now()
+
+    for daily in NotificationDailySchedule.objects.select_related("notification"):
+        try:
+            tz = ZoneInfo(timezones.get(daily.notification.recipient_id) or "")
+        except (ZoneInfoNotFoundError, ValueError):
+            tz = timezone.get_default_timezone()
+
+        day = now.astimezone(tz).date()
+        if daily.last_sent is not None and daily.last_sent >= day:
+            day = daily.last_sent + timedelta(days=1)
+
+        daily.next_fire_at = datetime.combine(day, daily.time, tzinfo=tz)
+        daily.save(update_fields=["next_fire_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("msgio", "0002_telegrampairingtoken"),
+        ("profiles", "0002_userprofile_address_userprofile_date_of_birth_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationdailyschedule",
+            name="next_fire_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationdatetimeschedule",
+            name="next_fire_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(schedule, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,35 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from datetime import datetime, timedelta
 
 import uuid
 
+from moodyduck.common.helpers import user_timezone
+
 from .signals import send_message
 
+
+def next_daily_fire(time, tz, last_sent, now):
+    """Return when a daily notification at ``time`` in ``tz`` is due next.
+
+    That is today - even if the time has passed already - unless it has been
+    sent today.
+    """
+    day = now.astimezone(tz).date()
+    if last_sent is not None and last_sent >= day:
+        day = last_sent + timedelta(days=1)
+
+    return datetime.combine(day, time, tzinfo=tz)
+
+
+def _with_next_fire_at(kwargs, *fields):
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and set(fields) & set(update_fields):
+        kwargs["update_fields"] = {*update_fields, "next_fire_at"}
+
+
 # Create your models here.
 
 
@@ -14,28 +39,25 @@ class Notification(models.Model):
     app = models.CharField(max_length=64, null=True, blank=True)
     data = models.CharField(max_length=128, null=True, blank=True)
 
+    def dispatchers(self):
+        """Names of the gateways this notification is sent through.
+
+        Those explicitly chosen for it, or else all gateways set up for the
+        recipient.
+        """
+        dispatchers = [d.dispatcher for d in self.notificationdispatcher_set.all()]
+        return dispatchers or [
+            gateway_user.gateway
+            for gateway_user in GatewayUser.objects.filter(user=self.recipient)
+        ]
+
     def send(self):
-        dispatchers = self.notificationdispatcher_set.all()
-        response = []
-
-        if dispatchers:
-            for dispatcher in dispatchers:
-                response.append(
-                    send_message.send_robust(
-                        self.__class__,
-                        dispatcher=dispatcher.dispatcher,
-                        notification=self,
-                    )
-                )
-        else:
-            for dispatcher in GatewayUser.objects.filter(user=self.recipient):
-                response.append(
-                    send_message.send_robust(
-                        self.__class__, dispatcher=dispatcher.gateway, notification=self
-                    )
-                )
-
-        return response
+        return [
+            send_message.send_robust(
+                self.__class__, dispatcher=dispatcher, notification=self
+            )
+            for dispatcher in self.dispatchers()
+        ]
 
 
 class NotificationDispatcher(models.Model):
@@ -47,12 +69,51 @@ class NotificationDatetimeSchedule(models.Model):
     notification = models.ForeignKey(Notification, models.CASCADE)
     datetime = models.DateTimeField()
     sent = models.BooleanField(default=False)
+    # When the notification is due, None once sent - kept up to date by save()
+    next_fire_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False
+    )
+
+    def schedule(self):
+        self.next_fire_at = None if self.sent else self.datetime
+
+    def fired(self, now):
+        self.sent = True
+        self.schedule()
+
+    def save(self, *args, **kwargs):
+        self.schedule()
+        _with_next_fire_at(kwargs, "datetime", "sent")
+        super().save(*args, **kwargs)
 
 
 class NotificationDailySchedule(models.Model):
     notification = models.ForeignKey(Notification, models.CASCADE)
     time = models.TimeField()
     last_sent = models.DateField(null=True, blank=True)
+    # When the notification is due next, in the recipient's time zone - kept
+    # up to date by save() and on time zone changes
+    next_fire_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False
+    )
+
+    def schedule(self, now=None, tz=None):
+        self.next_fire_at = next_daily_fire(
+            self.time,
+            tz or user_timezone(self.notification.recipient),
+            self.last_sent,
+            now or timezone.now(),
+        )
+
+    def fired(self, now):
+        tz = user_timezone(self.notification.recipient)
+        self.last_sent = now.astimezone(tz).date()
+        self.schedule(now, tz)
+
+    def save(self, *args, **kwargs):
+        self.schedule()
+        _with_next_fire_at(kwargs, "time", "last_sent")
+        super().save(*args, **kwargs)
 
 
 class GatewayUser(models.Model):
@@ -82,3 +143,44 @@ class TelegramPairingToken(models.Model):
 
     def __str__(self):
         return f"Telegram pairing token for {self.user}"
+
+
+class OutboundMessage(models.Model):
+    """A message waiting to be sent through a gateway, or the record of it.
+
+    Written when a notification fires and sent by ``moodyduck.msgio.outbox``,
+    which retries failed messages with backoff until ``MAX_ATTEMPTS``.
+    ``key`` identifies what the message was sent for - e.g. one firing of a
+    schedule on one gateway - so it is only ever queued once.
+    """
+
+    class States(models.IntegerChoices):
+        PENDING = 0
+        SENDING = 1
+        SENT = 2
+        DEAD = 3
+
+    key = models.CharField(max_length=255, unique=True)
+    notification = models.ForeignKey(
+        Notification, models.SET_NULL, null=True, blank=True
+    )
+    gateway = models.CharField(max_length=64)
+    recipient_id = models.CharField(max_length=256)
+    text = models.TextField()
+    state = models.IntegerField(choices=States.choices, default=States.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["state", "next_attempt_at"],
+                name="msgio_outbound_queue_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway}: {self.recipient_id}"
@@ -0,0 +1,155 @@
+"""
+Durable outbox for outbound messages.
+
+When a notification fires, ``enqueue`` writes an ``OutboundMessage`` per
+gateway in the same transaction that marks its schedule as fired, so a
+message is neither lost nor - thanks to its unique ``key`` - queued twice.
+
+``drain`` sends the messages that are due in batches of ``BATCH_SIZE``
+through ``msgio.delivery``. A batch is claimed and committed as ``SENDING``
+before it goes out; failed messages are retried with exponential backoff and
+jitter and given up on after ``MAX_ATTEMPTS``. Messages still ``SENDING``
+after ``SENDING_TIMEOUT`` were interrupted, by a crash say, after they may
+have been sent, so they are given up on rather than sent a second time.
+"""
+
+import logging
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import delivery
+from .models import OutboundMessage
+from .registry import get_all_gateways
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+
+# Retries wait BACKOFF_BASE, twice that, four times that... up to BACKOFF_MAX
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=6)
+
+SENDING_TIMEOUT = timedelta(minutes=10)
+
+# How long sent messages are kept
+RETENTION = timedelta(days=7)
+
+logger = logging.getLogger(__name__)
+
+
+def backoff(attempts):
+    """Return how long to wait after ``attempts`` failed attempts."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** min(attempts - 1, 16))
+    # Jitter, so messages that failed together are not retried together
+    return delay * random.uniform(0.5, 1)
+
+
+def enqueue(notification, key, dispatchers=None):
+    """Queue ``notification`` for sending, once per ``key`` and gateway.
+
+    ``dispatchers`` are the names of the gateways to send through, by default
+    those of ``notification.dispatchers()``.
+    """
+    messages = [
+        OutboundMessage(
+            key=f"{key}:{d.gateway.name}",
+            notification=notification,
+            gateway=d.gateway.name,
+            recipient_id=d.recipient_id,
+            text=d.text,
+        )
+        for d in delivery.prepare(notification, dispatchers)
+    ]
+    OutboundMessage.objects.bulk_create(messages, ignore_conflicts=True)
+    return messages
+
+
+def _failed(message, error, now):
+    message.last_error = error
+    if message.attempts >= MAX_ATTEMPTS:
+        logger.error("Giving up on outbound message %d: %s", message.pk, error)
+        message.state = OutboundMessage.States.DEAD
+    else:
+        message.state = OutboundMessage.States.PENDING
+        message.next_attempt_at = now + backoff(message.attempts)
+
+
+def _claim(now):
+    with transaction.atomic():
+        # Rows locked by another worker are left to it
+        messages = list(
+            OutboundMessage.objects.select_for_update(skip_locked=True)
+            .filter(state=OutboundMessage.States.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:BATCH_SIZE]
+        )
+        for message in messages:
+            message.state = OutboundMessage.States.SENDING
+            message.attempts += 1
+            message.updated_at = timezone.now()
+
+        OutboundMessage.objects.bulk_update(
+            messages, ["state", "attempts", "updated_at"]
+        )
+
+    return messages
+
+
+def _send(messages, now):
+    gateways = get_all_gateways()
+    deliveries, sending = [], []
+
+    for message in messages:
+        gateway = gateways.get(message.gateway)
+        if gateway is None:
+            _failed(message, f"No gateway registered for {message.gateway!r}", now)
+            continue
+
+        deliveries.append(
+            delivery.Delivery(
+                gateway, message.recipient_id, message.text, message.notification_id
+            )
+        )
+        sending.append(message)
+
+    for message, result in zip(sending, delivery.deliver(deliveries)):
+        if result is None:
+            message.state = OutboundMessage.States.SENT
+            message.last_error = ""
+        else:
+            _failed(message, str(result) or result.__class__.__name__, now)
+
+    for message in messages:
+        message.updated_at = timezone.now()
+
+    OutboundMessage.objects.bulk_update(
+        messages, ["state", "next_attempt_at", "last_error", "updated_at"]
+    )
+    return sum(m.state == OutboundMessage.States.SENT for m in messages)
+
+
+def drain(now=None):
+    """Send the messages that are due; return how many were sent."""
+    now = now or timezone.now()
+
+    # Interrupted while sending, and possibly sent already
+    OutboundMessage.objects.filter(
+        state=OutboundMessage.States.SENDING,
+        updated_at__lt=now - SENDING_TIMEOUT,
+    ).update(
+        state=OutboundMessage.States.DEAD,
+        last_error="Interrupted while sending, not retried in case it was sent.",
+        updated_at=now,
+    )
+
+    sent = 0
+    while messages := _claim(now):
+        # Outside of a transaction, so a crash leaves them claimed
+        sent += _send(messages, now)
+
+    OutboundMessage.objects.filter(
+        state=OutboundMessage.States.SENT, updated_at__lt=now - RETENTION
+    ).delete()
+
+    return sent
@@ -46,6 +46,15 @@ def get_all_gateways() -> dict[str, BaseGateway]:
     return dict(_registry)
 
 
+def close_all() -> None:
+    """Close the clients held by all gateways. Registered to run at exit."""
+    for gateway in _registry.values():
+        try:
+            gateway.close()
+        except Exception:
+            logger.exception("Failed to close gateway %r", gateway.name)
+
+
 def send_via_gateway(gateway: str, sender_id: str, text: str) -> None:
     """Send a plain-text message through the named gateway."""
     try:
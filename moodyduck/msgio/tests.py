@@ -1 +1,572 @@
-# Create your tests here.
+import asyncio
+import time as clock
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import delivery, outbox, registry
+from .base import BaseGateway
+from .clients import ClientLoop
+from .gateways import matrix
+from .gateways.matrix import MatrixGateway
+from .gateways.ntfy import NtfyGateway
+from .gateways.telegram import TelegramGateway
+from .handler import send_notifications
+from .models import (
+    GatewayUser,
+    GatewayUserSetting,
+    Notification,
+    NotificationDailySchedule,
+    NotificationDatetimeSchedule,
+    OutboundMessage,
+    next_daily_fire,
+)
+
+VIENNA = ZoneInfo("Europe/Vienna")
+
+
+class NotificationSchedulerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="notify-user",
+            password="secret",
+        )
+        self.user.userprofile.timezone = "Europe/Vienna"
+        self.user.userprofile.save()
+
+        patcher = mock.patch.object(delivery, "prepare", autospec=True, return_value=[])
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _notification(self):
+        return Notification.objects.create(content="Hi", recipient=self.user)
+
+    def _tick(self, now):
+        with mock.patch.object(timezone, "now", return_value=now):
+            send_notifications(None)
+
+    def test_next_daily_fire(self):
+        now = datetime(2026, 3, 28, 22, 0, tzinfo=VIENNA)
+
+        self.assertEqual(
+            next_daily_fire(time(8), VIENNA, None, now),
+            datetime(2026, 3, 28, 8, 0, tzinfo=VIENNA),
+        )
+        # Across the switch to summer time, still at 8 local time
+        self.assertEqual(
+            next_daily_fire(time(8), VIENNA, date(2026, 3, 28), now),
+            datetime(2026, 3, 29, 6, 0, tzinfo=ZoneInfo("UTC")),
+        )
+
+    def test_daily_schedule_uses_recipient_timezone(self):
+        with mock.patch.object(
+            timezone, "now", return_value=datetime(2026, 6, 1, 5, tzinfo=VIENNA)
+        ):
+            daily = NotificationDailySchedule.objects.create(
+                notification=self._notification(), time=time(20)
+            )
+
+        self.assertEqual(
+            daily.next_fire_at, datetime(2026, 6, 1, 18, tzinfo=ZoneInfo("UTC"))
+        )
+
+        self.user.userprofile.timezone = "UTC"
+        self.user.userprofile.save()
+
+        daily.refresh_from_db()
+        self.assertEqual(daily.next_fire_at.hour, 20)
+
+    def test_daily_notification_is_sent_once_a_day(self):
+        with mock.patch.object(
+            timezone, "now", return_value=datetime(2026, 6, 1, 5, tzinfo=VIENNA)
+        ):
+            daily = NotificationDailySchedule.objects.create(
+                notification=self._notification(), time=time(20)
+            )
+
+        self._tick(datetime(2026, 6, 1, 19, 59, tzinfo=VIENNA))
+        self.send.assert_not_called()
+
+        self._tick(datetime(2026, 6, 1, 20, 1, tzinfo=VIENNA))
+        self._tick(datetime(2026, 6, 1, 23, 0, tzinfo=VIENNA))
+        self.assertEqual(self.send.call_count, 1)
+
+        daily.refresh_from_db()
+        self.assertEqual(daily.last_sent, date(2026, 6, 1))
+        self.assertEqual(daily.next_fire_at, datetime(2026, 6, 2, 20, tzinfo=VIENNA))
+
+    def test_one_off_notification(self):
+        due = timezone.now() - timedelta(minutes=1)
+        once = NotificationDatetimeSchedule.objects.create(
+            notification=self._notification(), datetime=due
+        )
+        NotificationDatetimeSchedule.objects.create(
+            notification=self._notification(), datetime=due + timedelta(days=1)
+        )
+
+        self._tick(timezone.now())
+        self._tick(timezone.now())
+
+        self.send.assert_called_once_with(once.notification, mock.ANY)
+        once.refresh_from_db()
+        self.assertTrue(once.sent)
+        self.assertIsNone(once.next_fire_at)
+
+    def test_tick_only_looks_at_due_schedules(self):
+        later = timezone.now() + timedelta(days=1)
+        for _ in range(20):
+            NotificationDatetimeSchedule.objects.create(
+                notification=self._notification(), datetime=later
+            )
+            NotificationDatetimeSchedule.objects.create(
+                notification=self._notification(), datetime=later, sent=True
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            send_notifications(None)
+
+        # One empty batch per schedule type, and one of the outbox
+        selects = [q for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 3)
+
+    def test_failed_notification_is_retried(self):
+        once = NotificationDatetimeSchedule.objects.create(
+            notification=self._notification(),
+            datetime=timezone.now() - timedelta(minutes=1),
+        )
+        self.send.side_effect = RuntimeError
+
+        with self.assertLogs("moodyduck.msgio.handler", "ERROR"):
+            self._tick(timezone.now())
+
+        once.refresh_from_db()
+        self.assertFalse(once.sent)
+
+        self.send.side_effect = None
+        self._tick(timezone.now())
+
+        once.refresh_from_db()
+        self.assertTrue(once.sent)
+
+
+class FakeGateway(BaseGateway):
+    recipient_id_key = "address"
+
+    def __init__(self, name, delay=0, max_concurrency=10, timeout=30):
+        self.name = name
+        self.delay = delay
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.sent = []
+        self.error = None
+        self.in_flight = self.most_in_flight = 0
+
+    async def asend_message_to(self, recipient_id, text):
+        if self.error:
+            raise self.error
+
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        self.sent.append((recipient_id, text))
+
+    def send_message_to(self, recipient_id, text):
+        raise NotImplementedError
+
+
+class BlockingGateway(FakeGateway):
+    """Only implements the synchronous interface, like third-party gateways."""
+
+    asend_message_to = BaseGateway.asend_message_to
+
+    def send_message_to(self, recipient_id, text):
+        clock.sleep(self.delay)
+        self.sent.append((recipient_id, text))
+
+
+class DeliveryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="delivery-user",
+            password="secret",
+        )
+
+    def _deliveries(self, gateway, count):
+        return [delivery.Delivery(gateway, f"to-{i}", "Hi", i) for i in range(count)]
+
+    def _timed(self, deliveries):
+        start = clock.perf_counter()
+        results = delivery.deliver(deliveries)
+        return results, clock.perf_counter() - start
+
+    def test_gateways_are_sent_to_concurrently(self):
+        gateways = [FakeGateway("slow", 0.3), FakeGateway("fast", 0.1)]
+        blocking = BlockingGateway("blocking", 0.3)
+
+        results, elapsed = self._timed(
+            self._deliveries(gateways[0], 5)
+            + self._deliveries(gateways[1], 5)
+            + self._deliveries(blocking, 3)
+        )
+
+        self.assertEqual(results, [None] * 13)
+        self.assertEqual(len(gateways[0].sent), 5)
+        self.assertEqual(len(blocking.sent), 3)
+        # About the slowest delivery, not the sum of all of them
+        self.assertLess(elapsed, 1)
+
+    def test_concurrency_is_limited_per_gateway(self):
+        limited = FakeGateway("limited", 0.05, max_concurrency=2)
+        other = FakeGateway("other", 0.05)
+
+        delivery.deliver(self._deliveries(limited, 6) + self._deliveries(other, 6))
+
+        self.assertEqual(limited.most_in_flight, 2)
+        self.assertEqual(other.most_in_flight, 6)
+
+    def test_deliveries_are_rate_limited(self):
+        limited = FakeGateway("rate-limited")
+        limited.rate_limit = 20
+
+        results, elapsed = self._timed(self._deliveries(limited, 5))
+
+        self.assertEqual(len(limited.sent), 5)
+        # Started 1/20 s apart
+        self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_slow_delivery_times_out(self):
+        stuck = FakeGateway("stuck", 5, timeout=0.1)
+        working = FakeGateway("working")
+
+        with self.assertLogs("moodyduck.msgio.delivery", "ERROR") as logs:
+            results, elapsed = self._timed(
+                self._deliveries(stuck, 1) + self._deliveries(working, 1)
+            )
+
+        self.assertIsInstance(results[0], asyncio.TimeoutError)
+        self.assertIsNone(results[1])
+        self.assertEqual(working.sent, [("to-0", "Hi")])
+        self.assertIn("Timed out", logs.output[0])
+        self.assertLess(elapsed, 1)
+
+    def test_scheduled_notifications_are_delivered(self):
+        gateway = FakeGateway("fake")
+        gateway_user = GatewayUser.objects.create(user=self.user, gateway="fake")
+        GatewayUserSetting.objects.create(
+            gatewayuser=gateway_user, key="address", value="duck"
+        )
+        for content in ("One", "Two"):
+            NotificationDatetimeSchedule.objects.create(
+                notification=Notification.objects.create(
+                    content=content, recipient=self.user
+                ),
+                datetime=timezone.now() - timedelta(minutes=1),
+            )
+
+        with mock.patch.dict(registry._registry, {"fake": gateway}):
+            send_notifications(None)
+
+        self.assertCountEqual(gateway.sent, [("duck", "One"), ("duck", "Two")])
+        self.assertFalse(
+            NotificationDatetimeSchedule.objects.filter(sent=False).exists()
+        )
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="outbox-user",
+            password="secret",
+        )
+        gateway_user = GatewayUser.objects.create(user=self.user, gateway="fake")
+        GatewayUserSetting.objects.create(
+            gatewayuser=gateway_user, key="address", value="duck"
+        )
+        self.notification = Notification.objects.create(
+            content="Hi", recipient=self.user
+        )
+
+        self.gateway = FakeGateway("fake")
+        patcher = mock.patch.dict(registry._registry, {"fake": self.gateway})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_message_is_queued_once_per_key(self):
+        outbox.enqueue(self.notification, "firing")
+        outbox.enqueue(self.notification, "firing")
+        outbox.enqueue(self.notification, "other firing")
+
+        self.assertEqual(OutboundMessage.objects.count(), 2)
+        self.assertEqual(outbox.drain(), 2)
+        self.assertEqual(self.gateway.sent, [("duck", "Hi"), ("duck", "Hi")])
+
+    def test_notification_send_goes_through_outbox(self):
+        self.notification.send()
+
+        message = OutboundMessage.objects.get()
+        self.assertEqual(message.gateway, "fake")
+        self.assertEqual(self.gateway.sent, [])
+
+        outbox.drain()
+        message.refresh_from_db()
+        self.assertEqual(message.state, OutboundMessage.States.SENT)
+        self.assertEqual(self.gateway.sent, [("duck", "Hi")])
+
+    def test_failed_message_is_retried_with_backoff(self):
+        outbox.enqueue(self.notification, "firing")
+        self.gateway.error = ConnectionError("Unreachable")
+        now = timezone.now()
+
+        with self.assertLogs("moodyduck.msgio.delivery", "ERROR"):
+            self.assertEqual(outbox.drain(now), 0)
+
+        message = OutboundMessage.objects.get()
+        self.assertEqual(message.state, OutboundMessage.States.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, "Unreachable")
+        self.assertGreaterEqual(message.next_attempt_at, now + outbox.BACKOFF_BASE / 2)
+        self.assertLessEqual(message.next_attempt_at, now + outbox.BACKOFF_BASE)
+
+        # Not yet due again
+        self.gateway.error = None
+        self.assertEqual(outbox.drain(now + timedelta(seconds=1)), 0)
+
+        self.assertEqual(outbox.drain(now + outbox.BACKOFF_BASE), 1)
+        message.refresh_from_db()
+        self.assertEqual(message.state, OutboundMessage.States.SENT)
+        self.assertEqual(message.attempts, 2)
+
+    def test_backoff_grows_up_to_maximum(self):
+        self.assertLessEqual(outbox.backoff(3), outbox.BACKOFF_BASE * 4)
+        self.assertGreaterEqual(outbox.backoff(3), outbox.BACKOFF_BASE * 2)
+        self.assertLessEqual(outbox.backoff(50), outbox.BACKOFF_MAX)
+
+    def test_message_is_given_up_after_max_attempts(self):
+        outbox.enqueue(self.notification, "firing")
+        OutboundMessage.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        self.gateway.error = ConnectionError("Unreachable")
+
+        with self.assertLogs("moodyduck.msgio.outbox", "ERROR"):
+            with self.assertLogs("moodyduck.msgio.delivery", "ERROR"):
+                outbox.drain()
+
+        message = OutboundMessage.objects.get()
+        self.assertEqual(message.state, OutboundMessage.States.DEAD)
+        self.assertEqual(message.attempts, outbox.MAX_ATTEMPTS)
+
+    def test_interrupted_message_is_not_sent_again(self):
+        outbox.enqueue(self.notification, "firing")
+        now = timezone.now()
+        OutboundMessage.objects.update(
+            state=OutboundMessage.States.SENDING,
+            attempts=1,
+            updated_at=now - outbox.SENDING_TIMEOUT - timedelta(seconds=1),
+        )
+
+        outbox.drain(now)
+
+        message = OutboundMessage.objects.get()
+        self.assertEqual(message.state, OutboundMessage.States.DEAD)
+        self.assertEqual(self.gateway.sent, [])
+
+    def test_admin_shows_queue_depth(self):
+        outbox.enqueue(self.notification, "firing")
+        outbox.enqueue(self.notification, "dead")
+        OutboundMessage.objects.filter(key="dead:fake").update(
+            state=OutboundMessage.States.DEAD, attempts=outbox.MAX_ATTEMPTS
+        )
+        admin = get_user_model().objects.create_superuser(
+            username="outbox-admin", password="secret"
+        )
+        self.client.force_login(admin)
+
+        response = self.client.get(
+            "/admin/msgio/outboundmessage/", HTTP_HOST=settings.ALLOWED_HOSTS[0]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        [queue] = response.context["queues"]
+        self.assertEqual(
+            queue,
+            {"gateway": "fake", "pending": 1, "retrying": 0, "sending": 0, "dead": 1},
+        )
+
+    def test_admin_retries_only_dead_messages(self):
+        for key in ("dead", "sending", "sent"):
+            outbox.enqueue(self.notification, key)
+        for state in ("dead", "sending", "sent"):
+            OutboundMessage.objects.filter(key=f"{state}:fake").update(
+                state=OutboundMessage.States[state.upper()], attempts=1
+            )
+        admin = get_user_model().objects.create_superuser(
+            username="outbox-admin", password="secret"
+        )
+        self.client.force_login(admin)
+
+        self.client.post(
+            "/admin/msgio/outboundmessage/",
+            {
+                "action": "retry",
+                "_selected_action": list(
+                    OutboundMessage.objects.values_list("pk", flat=True)
+                ),
+            },
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+        )
+
+        self.assertEqual(
+            dict(OutboundMessage.objects.values_list("key", "state")),
+            {
+                "dead:fake": OutboundMessage.States.PENDING,
+                "sending:fake": OutboundMessage.States.SENDING,
+                "sent:fake": OutboundMessage.States.SENT,
+            },
+        )
+
+
+class FakeBot:
+    instances = []
+
+    def __init__(self, token, request=None):
+        self.token = token
+        self.sent = []
+        self.initialized = self.shut_down = False
+        self.instances.append(self)
+
+    async def initialize(self):
+        self.initialized = True
+
+    async def shutdown(self):
+        self.shut_down = True
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+class FakeMatrixClient:
+    instances = []
+
+    def __init__(self, homeserver, user):
+        self.logins = 0
+        self.joins = []
+        self.sent = []
+        self.errors = []
+        self.closed = False
+        self.instances.append(self)
+
+    async def login(self, password, device_name=None):
+        self.logins += 1
+
+    async def join(self, room_id):
+        self.joins.append(room_id)
+
+    async def room_send(self, room_id, message_type, content):
+        if self.errors:
+            return matrix.RoomSendError("Rejected", self.errors.pop(0))
+        self.sent.append((room_id, content["body"]))
+
+    async def close(self):
+        self.closed = True
+
+
+class GatewaySessionTests(TestCase):
+    def test_client_loop_is_shared_by_sync_and_async_callers(self):
+        clients = ClientLoop("test")
+        closed = []
+
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        async def from_async():
+            return await clients.arun(running_loop())
+
+        async def cleanup():
+            closed.append(asyncio.get_running_loop())
+
+        first = clients.run(running_loop())
+        self.assertIs(async_to_sync(from_async)(), first)
+        self.assertIs(clients.run(running_loop()), first)
+
+        clients.close(cleanup())
+        self.assertEqual(closed, [first])
+        self.assertTrue(first.is_closed())
+
+    def test_telegram_bot_is_reused(self):
+        FakeBot.instances = []
+        gateway = TelegramGateway(token="token")
+
+        with mock.patch("telegram.Bot", FakeBot):
+            gateway.send_message_to("1", "One")
+            delivery.deliver([delivery.Delivery(gateway, "2", "Two", 1)])
+            gateway.send_message_to("1", "Three")
+            gateway.close()
+
+        [bot] = FakeBot.instances
+        self.assertTrue(bot.initialized)
+        self.assertEqual(bot.sent, [("1", "One"), ("2", "Two"), ("1", "Three")])
+        self.assertTrue(bot.shut_down)
+
+    def test_matrix_logs_in_and_joins_once(self):
+        FakeMatrixClient.instances = []
+        gateway = MatrixGateway("duck", "secret", "https://matrix.example")
+        self.addCleanup(gateway.close)
+
+        with mock.patch.object(matrix, "AsyncClient", FakeMatrixClient):
+            for text in ("One", "Two", "Three"):
+                gateway.send_message_to("!room", text)
+
+        [client] = FakeMatrixClient.instances
+        self.assertEqual(client.logins, 1)
+        self.assertEqual(client.joins, ["!room"])
+        self.assertEqual(len(client.sent), 3)
+
+    def test_matrix_rejoins_and_logs_in_again(self):
+        FakeMatrixClient.instances = []
+        gateway = MatrixGateway("duck", "secret", "https://matrix.example")
+        self.addCleanup(gateway.close)
+
+        with mock.patch.object(matrix, "AsyncClient", FakeMatrixClient):
+            gateway.send_message_to("!room", "One")
+            [client] = FakeMatrixClient.instances
+
+            client.errors = ["M_FORBIDDEN"]
+            gateway.send_message_to("!room", "Two")
+            self.assertEqual(client.joins, ["!room", "!room"])
+
+            client.errors = ["M_UNKNOWN_TOKEN"]
+            gateway.send_message_to("!room", "Three")
+
+            FakeMatrixClient.instances[-1].errors = ["M_LIMIT_EXCEEDED"]
+            with self.assertRaises(matrix.MatrixError):
+                gateway.send_message_to("!room", "Four")
+
+        first, second = FakeMatrixClient.instances
+        self.assertTrue(first.closed)
+        self.assertEqual(first.sent, [("!room", "One"), ("!room", "Two")])
+        self.assertEqual(second.sent, [("!room", "Three")])
+
+    def test_ntfy_session_is_reused(self):
+        gateway = NtfyGateway()
+
+        with mock.patch.object(requests.Session, "post", autospec=True) as post:
+            gateway.send_message_to("https://ntfy.example/duck", "One")
+            gateway.send_message_to("https://ntfy.example/duck", "Two")
+
+        first, second = post.call_args_list
+        self.assertIs(first.args[0], second.args[0])
+
+        with mock.patch.object(requests.Session, "close", autospec=True) as close:
+            gateway.close()
+        close.assert_called_once_with(first.args[0])
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProfilesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "moodyduck.profiles"
+
+    def ready(self):
+        # Evict cached PGP keyrings when a profile key changes
+        from . import handler  # noqa: F401
@@ -0,0 +1,19 @@
+"""Signal handlers for profile changes affecting cached data."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from moodyduck.common.keyring import keyrings
+
+from .models import UserProfile
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, **kwargs):
+    # Drop the imported copy of a replaced PGP key right away
+    keyrings.forget(instance.user_id, instance.pgp_key)
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    keyrings.forget(instance.user_id)
@@ -3,6 +3,7 @@
 
 # If you make any changes in here, you may have trouble updating your MoodyDuck installation.
 
+from importlib.util import find_spec
 from pathlib import Path
 
 from autosecretkey import AutoSecretKey
@@ -122,6 +123,22 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+if "Cache" in CONFIG_FILE.config:
+    CACHES = {
+        "default": {
+            "BACKEND": CONFIG_FILE.config.get(
+                "Cache",
+                "Backend",
+                fallback="django.core.cache.backends.redis.RedisCache",
+            ),
+            "LOCATION": CONFIG_FILE.config.get("Cache", "Location"),
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -181,6 +198,15 @@ STATIC_ROOT = CONFIG_FILE.config.get(
     "MOODYDUCK", "StaticRoot", fallback="static"
 )
 
+# Serve BokehJS from the installed bokeh package, so that the browser can cache
+# it and the client library always matches the server-side version
+STATICFILES_DIRS = [
+    (
+        "bokeh",
+        Path(find_spec("bokeh").submodule_search_locations[0]) / "server" / "static",
+    ),
+]
+
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
@@ -237,7 +263,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "moodyduck.api.pagination.ApiPagination",
     "PAGE_SIZE": 50,
 }
 